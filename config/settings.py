@@ -12,6 +12,10 @@ https://docs.djangoproject.com/en/6.0/ref/settings/
 
 from pathlib import Path
 import os
+import sys
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -47,9 +51,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.metrics.MetricsMiddleware',
+    'core.audit.AuditFlushMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'core.ratelimit.RateLimitMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
@@ -78,13 +85,66 @@ WSGI_APPLICATION = 'config.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/6.0/ref/settings/#databases
-
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+#
+# DJANGO_DB_PROFILE selects the database:
+#
+# * sqlite (default): one file, tuned per connection by core.database (WAL,
+#   synchronous=NORMAL, busy timeout, mmap) with BEGIN IMMEDIATE
+#   transactions, and connections kept open for DJANGO_DB_CONN_MAX_AGE
+#   seconds instead of one per request.
+# * postgres: for several app servers or heavy write load. Connections come
+#   from psycopg's pool (pip install "psycopg[binary,pool]"); set
+#   DJANGO_DB_POOL=False to use persistent connections instead, e.g. behind
+#   PgBouncer.
+
+DB_PROFILE = os.getenv('DJANGO_DB_PROFILE', 'sqlite').strip().lower()
+DB_CONN_MAX_AGE = int(os.getenv('DJANGO_DB_CONN_MAX_AGE', '600'))
+
+if DB_PROFILE == 'postgres':
+    DB_POOL = os.getenv('DJANGO_DB_POOL', 'True').strip().lower() in ('1', 'true', 'yes', 'on')
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.postgresql',
+            'NAME': os.getenv('DJANGO_DB_NAME', 'ifmis'),
+            'USER': os.getenv('DJANGO_DB_USER', 'ifmis'),
+            'PASSWORD': os.getenv('DJANGO_DB_PASSWORD', ''),
+            'HOST': os.getenv('DJANGO_DB_HOST', 'localhost'),
+            'PORT': os.getenv('DJANGO_DB_PORT', '5432'),
+            # Pooled connections are returned after each request.
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': not DB_POOL,
+            'OPTIONS': {
+                'pool': {
+                    'min_size': int(os.getenv('DJANGO_DB_POOL_MIN_SIZE', '2')),
+                    'max_size': int(os.getenv('DJANGO_DB_POOL_MAX_SIZE', '20')),
+                    'timeout': float(os.getenv('DJANGO_DB_POOL_TIMEOUT', '10')),
+                },
+            } if DB_POOL else {},
+        }
     }
-}
+elif DB_PROFILE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': Path(os.getenv('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3')),
+            'CONN_MAX_AGE': DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'transaction_mode': 'IMMEDIATE',
+            },
+            # A file, not :memory:, so tests run with the same WAL setup.
+            'TEST': {
+                'NAME': BASE_DIR / 'test_db.sqlite3',
+            },
+        }
+    }
+else:
+    raise ImproperlyConfigured(f'Unknown DJANGO_DB_PROFILE {DB_PROFILE!r}; use sqlite or postgres.')
+
+SQLITE_JOURNAL_MODE = os.getenv('DJANGO_SQLITE_JOURNAL_MODE', 'WAL')
+SQLITE_SYNCHRONOUS = os.getenv('DJANGO_SQLITE_SYNCHRONOUS', 'NORMAL')
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv('DJANGO_SQLITE_BUSY_TIMEOUT_MS', '5000'))
+SQLITE_MMAP_SIZE = int(os.getenv('DJANGO_SQLITE_MMAP_SIZE', str(256 * 1024 * 1024)))
 
 
 # Password validation
@@ -125,6 +185,8 @@ STATIC_URL = 'static/'
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [BASE_DIR / 'core' / 'static']
 LOGIN_URL = '/staff/login/'
+# Seconds a session may reuse its cached IFMIS_ADMIN check (core.roles).
+ROLE_CACHE_TTL = int(os.getenv('DJANGO_ROLE_CACHE_TTL', '300'))
 LOGIN_REDIRECT_URL = '/staff/dashboard/'
 LOGOUT_REDIRECT_URL = '/staff/login/'
 
@@ -134,18 +196,36 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # ADD THESE TO YOUR EXISTING settings.py
 # ─────────────────────────────────────────────────────────────────
 
-# #1 — Rate limiting uses Django's cache. Default LocMemCache works
-# in development. For production switch to RedisCache or DatabaseCache.
+# #1 — Rate limiting (core.ratelimit). Counters are shared by all worker
+# processes: the 'database' backend uses atomic UPDATEs on RateLimitCounter;
+# 'cache' needs a shared cache with atomic incr (Redis/Memcached).
+# Policies are '<count>/<s|m|h|d>' and apply to POSTs of the decorated views.
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+RATE_LIMIT_BACKEND = os.getenv('DJANGO_RATE_LIMIT_BACKEND', 'database')
+RATE_LIMITS = {
+    'submit': os.getenv('DJANGO_RATE_LIMIT_SUBMIT', '5/h'),
+    'track': os.getenv('DJANGO_RATE_LIMIT_TRACK', '30/h'),
+}
+
+# Public track page cache (core.trackcache). Entries are invalidated on change;
+# the TTL only bounds staleness across workers when the cache is per-process.
+TRACK_CACHE_TTL = int(os.getenv('DJANGO_TRACK_CACHE_TTL', '60'))
 
 # #2 — Remove Django's automatic media file serving so files go
 # through your protected view instead. (Remove the static() line
 # from urls.py for MEDIA — it's handled by the new URL pattern.)
 
+# Protected uploads are streamed by Django by default. Behind nginx set
+# DJANGO_PROTECTED_MEDIA_OFFLOAD=x-accel-redirect and map an `internal`
+# location at PROTECTED_MEDIA_INTERNAL_URL to MEDIA_ROOT; for Apache/lighttpd
+# use x-sendfile. Django still performs the permission check either way.
+PROTECTED_MEDIA_OFFLOAD = os.getenv('DJANGO_PROTECTED_MEDIA_OFFLOAD', '').strip().lower()
+PROTECTED_MEDIA_INTERNAL_URL = os.getenv('DJANGO_PROTECTED_MEDIA_INTERNAL_URL', '/protected-media/')
+
 # #5 — Email configuration
 EMAIL_BACKEND = os.getenv('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
 EMAIL_HOST = os.getenv('DJANGO_EMAIL_HOST', '')
@@ -156,7 +236,88 @@ EMAIL_HOST_PASSWORD = os.getenv('DJANGO_EMAIL_HOST_PASSWORD', '')
 
 DEFAULT_FROM_EMAIL = os.getenv('DJANGO_DEFAULT_FROM_EMAIL', 'IFMIS Help Desk <noreply@mof.gov.sl>')
 
+# Notification emails go through the OutboundEmail outbox (core.outbox) and
+# are delivered by `manage.py send_queued_mail --loop`. With the console or
+# locmem backend they are sent eagerly after commit so no worker is needed.
+EMAIL_OUTBOX_EAGER = os.getenv(
+    'DJANGO_EMAIL_OUTBOX_EAGER',
+    str(EMAIL_BACKEND.endswith(('console.EmailBackend', 'locmem.EmailBackend'))),
+).strip().lower() in ('1', 'true', 'yes', 'on')
+EMAIL_OUTBOX_BATCH_SIZE = int(os.getenv('DJANGO_EMAIL_OUTBOX_BATCH_SIZE', '50'))
+EMAIL_OUTBOX_MAX_ATTEMPTS = int(os.getenv('DJANGO_EMAIL_OUTBOX_MAX_ATTEMPTS', '8'))
+EMAIL_OUTBOX_RETRY_BASE = 60        # seconds before the first retry
+EMAIL_OUTBOX_RETRY_MAX = 6 * 3600   # cap on the backoff delay
+
 # Used in email links so users can click through to the right URL
 SITE_URL = os.getenv('DJANGO_SITE_URL', 'http://127.0.0.1:8000')
 
 LOGOUT_REDIRECT_URL = '/staff/login/'
+
+# Staff dashboard paging. Keyset (cursor) mode seeks on (submitted_at, id) and
+# skips the COUNT(*), so it stays fast on very large tables. Any request can
+# opt in with ?cursor= even when this is off.
+DASHBOARD_KEYSET_PAGINATION = os.getenv('DJANGO_DASHBOARD_KEYSET_PAGINATION', 'False').strip().lower() in ('1', 'true', 'yes', 'on')
+
+# Rows fetched per database round trip by the streaming CSV/XLSX export.
+EXPORT_CHUNK_SIZE = int(os.getenv('DJANGO_EXPORT_CHUNK_SIZE', '2000'))
+
+# Audit entries are buffered per process and written with one bulk INSERT at
+# the end of each request, or earlier once AUDIT_BUFFER_SIZE entries have
+# accumulated or the oldest has waited AUDIT_BUFFER_MAX_AGE seconds (checked
+# when the next entry arrives; there is no timer thread). Deletions are
+# always written synchronously. Set AUDIT_BUFFER_SIZE to 1 to disable
+# buffering.
+AUDIT_BUFFER_SIZE = int(os.getenv('DJANGO_AUDIT_BUFFER_SIZE', '50'))
+AUDIT_BUFFER_MAX_AGE = float(os.getenv('DJANGO_AUDIT_BUFFER_MAX_AGE', '2.0'))
+AUDIT_FLUSH_ON_REQUEST_END = True
+
+# Audit entries older than AUDIT_ARCHIVE_AFTER_DAYS are moved to gzip JSONL
+# segments by `manage.py archive_audit_log` (run it nightly). The audit log
+# page can still search them with source=archive.
+AUDIT_ARCHIVE_DIR = Path(os.getenv('DJANGO_AUDIT_ARCHIVE_DIR', BASE_DIR / 'audit_archive'))
+AUDIT_ARCHIVE_AFTER_DAYS = int(os.getenv('DJANGO_AUDIT_ARCHIVE_AFTER_DAYS', '180'))
+AUDIT_ARCHIVE_SEARCH_LIMIT = 5000
+
+# Bulk deletes run as background jobs (core.bulkdelete): rows are deleted in
+# chunks of BULK_DELETE_CHUNK_SIZE per transaction and files are unlinked on
+# a pool of BULK_DELETE_FILE_WORKERS threads. Interrupted jobs are resumed by
+# `manage.py run_bulk_delete_jobs`.
+BULK_DELETE_CHUNK_SIZE = int(os.getenv('DJANGO_BULK_DELETE_CHUNK_SIZE', '100'))
+BULK_DELETE_FILE_WORKERS = int(os.getenv('DJANGO_BULK_DELETE_FILE_WORKERS', '4'))
+
+# `manage.py purge_requests` (run it nightly) deletes requests processed more
+# than REQUEST_RETENTION_DAYS ago, with their messages and uploads, using the
+# bulk delete chunking above. Pending requests are never purged.
+REQUEST_RETENTION_DAYS = int(os.getenv('DJANGO_REQUEST_RETENTION_DAYS', '365'))
+
+# First-page previews of uploads (core.previews), rendered by a small worker
+# pool with Pillow (images) and poppler's pdftoppm (PDFs) when installed.
+# The disk cache is trimmed to PREVIEW_CACHE_MAX_BYTES, least recently used
+# first.
+PREVIEW_CACHE_DIR = Path(os.getenv('DJANGO_PREVIEW_CACHE_DIR', BASE_DIR / 'preview_cache'))
+PREVIEW_CACHE_MAX_BYTES = int(os.getenv('DJANGO_PREVIEW_CACHE_MAX_BYTES', str(200 * 1024 * 1024)))
+PREVIEW_SIZE = int(os.getenv('DJANGO_PREVIEW_SIZE', '480'))
+PREVIEW_WORKERS = int(os.getenv('DJANGO_PREVIEW_WORKERS', '2'))
+PREVIEW_RENDER_TIMEOUT = int(os.getenv('DJANGO_PREVIEW_RENDER_TIMEOUT', '30'))
+
+# Per-view latency, query, rate limiter, track cache and email metrics
+# (core.metrics). Each process writes its totals to its own file in
+# METRICS_DIR at most every METRICS_FLUSH_INTERVAL seconds; the staff-only
+# /staff/metrics/ endpoint sums them in Prometheus text format. METRICS_DIR
+# lives outside the source tree and must be shared by the web workers and the
+# send_queued_mail worker (mind systemd's PrivateTmp). Off under
+# `manage.py test`.
+METRICS_ENABLED = os.getenv(
+    'DJANGO_METRICS_ENABLED', str(sys.argv[1:2] != ['test']),
+).strip().lower() in ('1', 'true', 'yes', 'on')
+METRICS_DIR = Path(os.getenv('DJANGO_METRICS_DIR', Path(tempfile.gettempdir()) / 'ifmis-metrics'))
+METRICS_FLUSH_INTERVAL = float(os.getenv('DJANGO_METRICS_FLUSH_INTERVAL', '10'))
+
+# Read-only JSON API for integrations (core.api, /api/v1/). Besides IFMIS_ADMIN
+# sessions it accepts `Authorization: Bearer <token>` for any of the
+# comma-separated DJANGO_API_SERVICE_TOKENS.
+API_SERVICE_TOKENS = [
+    token.strip() for token in os.getenv('DJANGO_API_SERVICE_TOKENS', '').split(',') if token.strip()
+]
+API_PAGE_SIZE = int(os.getenv('DJANGO_API_PAGE_SIZE', '100'))
+API_MAX_PAGE_SIZE = int(os.getenv('DJANGO_API_MAX_PAGE_SIZE', '1000'))
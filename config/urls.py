@@ -1,17 +1,27 @@
 from django.contrib.auth import views as auth_views
 from django.contrib import admin
 from django.urls import path
+from core import api
 from core.views import (
     upload_request,
     track_request,
     dashboard_requests,
+    dashboard_fragment,
     process_request,
     delete_request,
     bulk_delete_requests,
+    bulk_delete_status,
+    bulk_status_requests,
+    export_requests,
     admin_request_detail,
     serve_uploaded_file,
+    serve_upload_preview,
     staff_logout,
     audit_log_view,
+    metrics_view,
+    analytics_view,
+    live_events,
+    live_poll,
 )
 
 urlpatterns = [
@@ -21,8 +31,13 @@ urlpatterns = [
     path('', upload_request, name='upload_request'),
     path('track/', track_request, name='track_request'),
 
+    # Live conversation updates (SSE over ASGI, JSON polling fallback)
+    path('live/<str:ref_code>/events/', live_events, name='live_events'),
+    path('live/<str:ref_code>/poll/', live_poll, name='live_poll'),
+
     # Protected file serving
     path('uploads/<str:filename>', serve_uploaded_file, name='serve_uploaded_file'),
+    path('previews/<str:filename>', serve_upload_preview, name='serve_upload_preview'),
 
     # Staff auth
     path('staff/login/', auth_views.LoginView.as_view(template_name='staff/login.html'), name='staff_login'),
@@ -30,9 +45,20 @@ urlpatterns = [
 
     # Staff portal
     path('staff/dashboard/', dashboard_requests, name='dashboard_requests'),
+    path('staff/dashboard/fragment/', dashboard_fragment, name='dashboard_fragment'),
     path('staff/request/<str:ref_code>/', admin_request_detail, name='admin_request_detail'),
     path('staff/process/<int:pk>/', process_request, name='process_request'),
     path('staff/delete/<int:pk>/', delete_request, name='delete_request'),
     path('staff/bulk-delete/', bulk_delete_requests, name='bulk_delete_requests'),
+    path('staff/bulk-delete/<int:job_id>/', bulk_delete_status, name='bulk_delete_status'),
+    path('staff/bulk-status/', bulk_status_requests, name='bulk_status_requests'),
+    path('staff/export/', export_requests, name='export_requests'),
     path('staff/audit/', audit_log_view, name='audit_log'),
+    path('staff/metrics/', metrics_view, name='metrics'),
+    path('staff/analytics/', analytics_view, name='analytics'),
+
+    # Read-only JSON API
+    path('api/v1/requests/', api.requests_list, name='api_requests'),
+    path('api/v1/messages/', api.messages_list, name='api_messages'),
+    path('api/v1/audit/', api.audit_list, name='api_audit'),
 ]
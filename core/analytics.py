@@ -0,0 +1,243 @@
+"""
+Turnaround (submission to processed) analytics.
+
+``rollup_day`` computes, for the requests processed on one local day, the
+exact p50/p90/p99 turnaround per department and per admin, and stores them in
+``TurnaroundRollup`` together with a histogram over ``BUCKET_EDGES``. It is
+run nightly by ``manage.py rollup_turnaround``. The staff analytics page only
+reads rollups: longer periods are answered by merging the daily histograms,
+so reporting never scans the requests table.
+
+``backfill_processed_at`` fills ``processed_at``/``processed_by`` for requests
+processed before those columns existed, from ``ACTION_MARK_PROCESSED`` audit
+entries (live and, optionally, archived).
+"""
+import bisect
+import math
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AuditLog, IFMISResetRequest, TurnaroundRollup
+
+
+# Upper bounds of the histogram buckets, in seconds; the last bucket is open.
+BUCKET_EDGES = [
+    5 * 60, 15 * 60, 30 * 60, 3600, 2 * 3600, 4 * 3600, 8 * 3600, 12 * 3600,
+    86400, 2 * 86400, 3 * 86400, 5 * 86400, 7 * 86400, 14 * 86400, 30 * 86400,
+]
+
+
+def percentile(sorted_values, q):
+    """Linear-interpolated ``q`` quantile (0-1) of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    position = (len(sorted_values) - 1) * q
+    low = math.floor(position)
+    high = math.ceil(position)
+    fraction = position - low
+    return sorted_values[low] + (sorted_values[high] - sorted_values[low]) * fraction
+
+
+def histogram(values):
+    buckets = [0] * (len(BUCKET_EDGES) + 1)
+    for value in values:
+        buckets[bisect.bisect_left(BUCKET_EDGES, value)] += 1
+    return buckets
+
+
+def histogram_percentile(buckets, q):
+    """Estimate the ``q`` quantile from merged bucket counts."""
+    total = sum(buckets)
+    if not total:
+        return 0.0
+    target = q * total
+    seen = 0
+    for i, count in enumerate(buckets):
+        if count and seen + count >= target:
+            lower = BUCKET_EDGES[i - 1] if i else 0
+            # The open-ended last bucket is reported at its lower bound.
+            upper = BUCKET_EDGES[i] if i < len(BUCKET_EDGES) else lower
+            return lower + (upper - lower) * (target - seen) / count
+        seen += count
+    return float(BUCKET_EDGES[-1])
+
+
+def day_bounds(day):
+    tz = timezone.get_current_timezone()
+    start = timezone.make_aware(datetime.combine(day, time.min), tz)
+    return start, start + timedelta(days=1)
+
+
+def format_duration(seconds):
+    """Short human form of a duration, e.g. ``45m``, ``3h 20m``, ``2d 4h``."""
+    minutes = int(round(seconds / 60))
+    if minutes < 60:
+        return f"{minutes}m"
+    hours, minutes = divmod(minutes, 60)
+    if hours < 24:
+        return f"{hours}h {minutes}m" if minutes else f"{hours}h"
+    days, hours = divmod(hours, 24)
+    return f"{days}d {hours}h" if hours else f"{days}d"
+
+
+# ── Nightly rollup ────────────────────────────────────────────────────────────
+
+def rollup_day(day):
+    """(Re)compute the rollups for requests processed on ``day``; returns rows written."""
+    start, end = day_bounds(day)
+    processed = (
+        IFMISResetRequest.objects
+        .filter(processed=True, processed_at__gte=start, processed_at__lt=end)
+        .values_list('department', 'processed_by_id', 'processed_by__username', 'submitted_at', 'processed_at')
+    )
+
+    groups = defaultdict(list)
+    labels = {}
+    for department, admin_id, username, submitted_at, processed_at in processed.iterator(chunk_size=2000):
+        seconds = max((processed_at - submitted_at).total_seconds(), 0.0)
+        dept_key = (TurnaroundRollup.DIMENSION_DEPARTMENT, department)
+        admin_key = (TurnaroundRollup.DIMENSION_ADMIN, str(admin_id or ''))
+        groups[dept_key].append(seconds)
+        groups[admin_key].append(seconds)
+        labels[dept_key] = department
+        labels[admin_key] = username or 'Unknown'
+
+    rows = []
+    for (dimension, key), values in groups.items():
+        values.sort()
+        rows.append(TurnaroundRollup(
+            day=day, dimension=dimension, key=key, label=labels[(dimension, key)],
+            count=len(values),
+            p50_seconds=percentile(values, 0.50),
+            p90_seconds=percentile(values, 0.90),
+            p99_seconds=percentile(values, 0.99),
+            histogram=histogram(values),
+        ))
+
+    with transaction.atomic():
+        TurnaroundRollup.objects.filter(day=day).delete()
+        TurnaroundRollup.objects.bulk_create(rows)
+    return len(rows)
+
+
+# ── Reporting (rollups only) ──────────────────────────────────────────────────
+
+def summary(start_day, end_day):
+    """
+    Turnaround per department and per admin over ``start_day..end_day``
+    (inclusive), merged from the daily rollups. Returns
+    ``{dimension: [row, ...]}`` with rows sorted by volume.
+    """
+    merged = {}
+    rollups = TurnaroundRollup.objects.filter(day__gte=start_day, day__lte=end_day).order_by('day')
+    for rollup in rollups:
+        entry = merged.setdefault((rollup.dimension, rollup.key), {
+            'label': rollup.label,
+            'count': 0,
+            'days': 0,
+            'histogram': [0] * (len(BUCKET_EDGES) + 1),
+            'exact': rollup,
+        })
+        entry['label'] = rollup.label
+        entry['count'] += rollup.count
+        entry['days'] += 1
+        entry['histogram'] = [a + b for a, b in zip(entry['histogram'], rollup.histogram)]
+
+    result = {TurnaroundRollup.DIMENSION_DEPARTMENT: [], TurnaroundRollup.DIMENSION_ADMIN: []}
+    for (dimension, _), entry in merged.items():
+        if entry['days'] == 1:
+            # A single day: the stored exact values.
+            exact = entry['exact']
+            p50, p90, p99 = exact.p50_seconds, exact.p90_seconds, exact.p99_seconds
+        else:
+            p50, p90, p99 = (histogram_percentile(entry['histogram'], q) for q in (0.50, 0.90, 0.99))
+        result[dimension].append({
+            'label': entry['label'],
+            'count': entry['count'],
+            'p50': p50,
+            'p90': p90,
+            'p99': p99,
+            'approximate': entry['days'] > 1,
+        })
+    for rows in result.values():
+        rows.sort(key=lambda row: (-row['count'], row['label']))
+    return result
+
+
+# ── Backfill ──────────────────────────────────────────────────────────────────
+
+STATUS_ACTIONS = (AuditLog.ACTION_MARK_PROCESSED, AuditLog.ACTION_MARK_PENDING)
+
+
+def processed_events(include_archive=False):
+    """
+    (timestamp, admin id) of the MARK_PROCESSED entry that completed each
+    reference code: the earliest one after its last MARK_PENDING. Later
+    duplicates (a repeated click, a bulk action over an already processed
+    row) do not move it.
+    """
+    processed = {}
+
+    def consider(ref_code, action, timestamp, admin_id):
+        # Entries must arrive in time order.
+        if not ref_code:
+            return
+        if action == AuditLog.ACTION_MARK_PENDING:
+            processed.pop(ref_code, None)
+        else:
+            processed.setdefault(ref_code, (timestamp, admin_id))
+
+    if include_archive:
+        from . import audit_archive
+
+        for month in sorted(audit_archive.load_index()['segments']):
+            records = [
+                (parse_datetime(record['timestamp']), record['id'], record)
+                for record in audit_archive.read_segment(month)
+                if record['action'] in STATUS_ACTIONS
+            ]
+            for timestamp, _, record in sorted(records, key=lambda item: item[:2]):
+                consider(record['ref_code'], record['action'], timestamp, record['admin_id'])
+
+    live = (
+        AuditLog.objects.filter(action__in=STATUS_ACTIONS)
+        .order_by('timestamp', 'id')
+        .values_list('ref_code', 'action', 'timestamp', 'admin_id')
+    )
+    for ref_code, action, timestamp, admin_id in live.iterator(chunk_size=2000):
+        consider(ref_code, action, timestamp, admin_id)
+    return processed
+
+
+def backfill_processed_at(include_archive=False, batch_size=500):
+    """
+    Set ``processed_at``/``processed_by`` on processed requests that lack them.
+    Uses ``QuerySet.update`` so counters and caches are untouched (the
+    status does not change), bumping ``updated_at`` by hand so API clients
+    polling ``updated_since`` see the change. Returns how many requests
+    were filled in.
+    """
+    events = processed_events(include_archive)
+    user_model = IFMISResetRequest._meta.get_field('processed_by').related_model
+    known_admins = set(user_model.objects.values_list('pk', flat=True))
+    missing = (
+        IFMISResetRequest.objects.filter(processed=True, processed_at__isnull=True)
+        .values_list('pk', 'reference_code')
+    )
+    filled = 0
+    for pk, ref_code in missing.iterator(chunk_size=batch_size):
+        event = events.get(ref_code)
+        if event is None:
+            continue
+        timestamp, admin_id = event
+        if admin_id not in known_admins:
+            admin_id = None
+        IFMISResetRequest.objects.filter(pk=pk).update(
+            processed_at=timestamp, processed_by_id=admin_id, updated_at=timezone.now(),
+        )
+        filled += 1
+    return filled
@@ -0,0 +1,245 @@
+"""
+Read-only JSON API for integrations (``/api/v1/``).
+
+Callers authenticate either with a staff session that passes the
+``IFMIS_ADMIN`` check or with ``Authorization: Bearer <token>`` for a token
+listed in ``API_SERVICE_TOKENS``.
+
+Every list is paged with an opaque keyset cursor (``core.pagination``), so
+deep pages cost the same as the first and no COUNT(*) is run: requests on
+``(submitted_at, id)``, messages and audit entries on ``(timestamp, id)``.
+``updated_since`` (ISO 8601) returns only rows changed at or after that time;
+for requests this pages on ``(updated_at, id)``, so a client can store the
+``updated_at`` of the last row it saw and poll from there. Deleted requests
+do not appear; their deletion is recorded in the audit entries.
+
+Messages and audit entries are append-only and are polled with
+``after_id=<id>`` instead, paging on ``id``: their timestamp is when the row
+was created, which can be well before it is committed (audit entries wait in
+``core.audit``'s buffer), so a timestamp cursor would skip rows that land
+late. A client stores the ``id`` of the last row it saw.
+
+``fields=a,b,c`` limits the response to those fields, and only the matching
+columns are selected. Responses are gzipped when the client accepts it.
+"""
+import hmac
+from functools import wraps
+
+from django.conf import settings
+from django.http import JsonResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.gzip import gzip_page
+from django.views.decorators.http import require_GET
+
+from .models import AuditLog, IFMISRequestMessage, IFMISResetRequest
+from .pagination import InvalidCursor, KeysetPaginator
+from .roles import has_admin_role
+
+
+class APIError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def _timestamp(value):
+    return value.isoformat() if value else None
+
+
+def _upload_url(req):
+    if not req.uploaded_file:
+        return None
+    return f"{settings.SITE_URL}/uploads/{req.uploaded_file.name.split('/')[-1]}"
+
+
+# API field -> (model column(s) to select, value getter).
+REQUEST_FIELDS = {
+    'id':             (['id'], lambda r: r.pk),
+    'reference_code': (['reference_code'], lambda r: r.reference_code),
+    'full_name':      (['full_name'], lambda r: r.full_name),
+    'department':     (['department'], lambda r: r.department),
+    'email':          (['email'], lambda r: r.email),
+    'uploaded_file':  (['uploaded_file'], _upload_url),
+    'sha256':         (['sha256'], lambda r: r.sha256 or None),
+    'submitted_at':   (['submitted_at'], lambda r: _timestamp(r.submitted_at)),
+    'updated_at':     (['updated_at'], lambda r: _timestamp(r.updated_at)),
+    'processed':      (['processed'], lambda r: r.processed),
+    'processed_at':   (['processed_at'], lambda r: _timestamp(r.processed_at)),
+    'processed_by':   (['processed_by__username'],
+                       lambda r: r.processed_by.username if r.processed_by_id else None),
+}
+
+MESSAGE_FIELDS = {
+    'id':             (['id'], lambda m: m.pk),
+    'reference_code': (['request__reference_code'], lambda m: m.request.reference_code),
+    'sender':         (['sender'], lambda m: m.sender),
+    'content':        (['content'], lambda m: m.content),
+    'timestamp':      (['timestamp'], lambda m: _timestamp(m.timestamp)),
+}
+
+AUDIT_FIELDS = {
+    'id':         (['id'], lambda a: a.pk),
+    'admin':      (['admin__username'], lambda a: a.admin.username if a.admin_id else None),
+    'action':     (['action'], lambda a: a.action),
+    'ref_code':   (['ref_code'], lambda a: a.ref_code),
+    'detail':     (['detail'], lambda a: a.detail),
+    'ip_address': (['ip_address'], lambda a: a.ip_address),
+    'timestamp':  (['timestamp'], lambda a: _timestamp(a.timestamp)),
+}
+
+
+# ── Authentication ────────────────────────────────────────────────────────────
+
+def has_service_token(request):
+    header = request.headers.get('Authorization', '')
+    scheme, _, token = header.partition(' ')
+    if scheme.lower() != 'bearer' or not token.strip():
+        return False
+    token = token.strip().encode()
+    # Compare against every token so timing does not reveal which one matched.
+    matches = [hmac.compare_digest(token, known.encode()) for known in settings.API_SERVICE_TOKENS]
+    return any(matches)
+
+
+def api_auth_required(view_func):
+    @wraps(view_func)
+    def wrapped_view(request, *args, **kwargs):
+        if not (has_service_token(request) or has_admin_role(request)):
+            response = JsonResponse({'error': 'Authentication required.'}, status=401)
+            response['WWW-Authenticate'] = 'Bearer'
+            return response
+        try:
+            return view_func(request, *args, **kwargs)
+        except APIError as exc:
+            return JsonResponse({'error': str(exc)}, status=exc.status)
+    return wrapped_view
+
+
+# ── Listing ───────────────────────────────────────────────────────────────────
+
+def _selected_fields(request, spec):
+    raw = request.GET.get('fields', '').strip()
+    if not raw:
+        return list(spec)
+    fields = [f.strip() for f in raw.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in spec]
+    if unknown:
+        raise APIError(f"Unknown field(s): {', '.join(unknown)}. Available: {', '.join(spec)}.")
+    return fields
+
+
+def _updated_since(request):
+    raw = request.GET.get('updated_since', '').strip()
+    if not raw:
+        return None
+    value = parse_datetime(raw)
+    if value is None:
+        raise APIError('updated_since must be an ISO 8601 date and time.')
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def _after_id(request):
+    raw = request.GET.get('after_id', '').strip()
+    if not raw:
+        return None
+    if not raw.isdigit():
+        raise APIError('after_id must be a non-negative integer.')
+    return int(raw)
+
+
+def _page_size(request):
+    raw = request.GET.get('limit', '')
+    if not raw:
+        return settings.API_PAGE_SIZE
+    if not raw.isdigit() or int(raw) < 1:
+        raise APIError('limit must be a positive integer.')
+    return min(int(raw), settings.API_MAX_PAGE_SIZE)
+
+
+def paginated_response(request, queryset, spec, ordering):
+    fields = _selected_fields(request, spec)
+    columns = {column for field in fields for column in spec[field][0]}
+    columns.update(term.lstrip('-') for term in ordering)
+    related = {column.split('__')[0] for column in columns if '__' in column}
+    queryset = queryset.select_related(*related).only(*columns)
+
+    paginator = KeysetPaginator(queryset, _page_size(request), ordering=ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor') or None)
+    except InvalidCursor:
+        raise APIError('Invalid cursor.')
+
+    next_url = None
+    if page.next_cursor:
+        params = request.GET.copy()
+        params['cursor'] = page.next_cursor
+        next_url = request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+    return JsonResponse({
+        'results': [{field: spec[field][1](obj) for field in fields} for obj in page],
+        'next_cursor': page.next_cursor,
+        'next': next_url,
+    })
+
+
+# ── Endpoints ─────────────────────────────────────────────────────────────────
+
+@require_GET
+@gzip_page
+@api_auth_required
+def requests_list(request):
+    qs = IFMISResetRequest.objects.all()
+    status = request.GET.get('status', '')
+    if status == 'pending':
+        qs = qs.filter(processed=False)
+    elif status == 'processed':
+        qs = qs.filter(processed=True)
+    elif status:
+        raise APIError('status must be pending or processed.')
+
+    since = _updated_since(request)
+    if since is not None:
+        return paginated_response(request, qs.filter(updated_at__gte=since), REQUEST_FIELDS, ('updated_at', 'id'))
+    return paginated_response(request, qs, REQUEST_FIELDS, ('submitted_at', 'id'))
+
+
+@require_GET
+@gzip_page
+@api_auth_required
+def messages_list(request):
+    qs = IFMISRequestMessage.objects.all()
+    ref = request.GET.get('reference_code', '').strip().upper()
+    if ref:
+        qs = qs.filter(request__reference_code=ref)
+    since = _updated_since(request)
+    if since is not None:
+        # Messages are never edited; new ones are the only changes.
+        qs = qs.filter(timestamp__gte=since)
+    after_id = _after_id(request)
+    if after_id is not None:
+        return paginated_response(request, qs.filter(id__gt=after_id), MESSAGE_FIELDS, ('id',))
+    return paginated_response(request, qs, MESSAGE_FIELDS, ('timestamp', 'id'))
+
+
+@require_GET
+@gzip_page
+@api_auth_required
+def audit_list(request):
+    qs = AuditLog.objects.all()
+    action = request.GET.get('action', '').strip()
+    if action:
+        qs = qs.filter(action=action)
+    ref = request.GET.get('ref_code', '').strip().upper()
+    if ref:
+        qs = qs.filter(ref_code=ref)
+    since = _updated_since(request)
+    if since is not None:
+        # Audit entries are append-only; buffered ones arrive with an
+        # earlier timestamp, which after_id does not miss.
+        qs = qs.filter(timestamp__gte=since)
+    after_id = _after_id(request)
+    if after_id is not None:
+        return paginated_response(request, qs.filter(id__gt=after_id), AUDIT_FIELDS, ('id',))
+    return paginated_response(request, qs, AUDIT_FIELDS, ('timestamp', 'id'))
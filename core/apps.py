@@ -5,4 +5,5 @@ class CoreConfig(AppConfig):
     name = 'core'
 
     def ready(self):
+        import core.database  # noqa: F401
         import core.signals  # noqa: F401
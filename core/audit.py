@@ -0,0 +1,134 @@
+"""
+Buffered audit log writer.
+
+``record`` queues ``AuditLog`` entries in a per-process buffer that is written
+with a single ``bulk_create`` when it reaches ``AUDIT_BUFFER_SIZE`` entries,
+when an entry arrives after the oldest one has waited ``AUDIT_BUFFER_MAX_AGE``
+seconds, at the end of every request (``AuditFlushMiddleware``) and at exit.
+This turns the one-INSERT-per-action pattern into one short write per
+request or batch, which matters on SQLite where every write takes the
+database lock. Every flush runs on the caller's thread and connection; a
+failed one keeps the entries for the next attempt and is logged. A flush
+requested inside a transaction waits for it to commit: the buffer holds
+other requests' entries, and writing them into a transaction that is later
+rolled back would lose them.
+
+Destructive actions are written in strict mode: any buffered entries are
+flushed first (to keep ordering; after commit inside a transaction) and the
+entry is saved synchronously, so it is on disk before the data it describes
+disappears.
+"""
+import atexit
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils.deprecation import MiddlewareMixin
+
+from .models import AuditLog
+
+
+logger = logging.getLogger(__name__)
+
+STRICT_ACTIONS = frozenset({
+    AuditLog.ACTION_DELETE_REQUEST,
+    AuditLog.ACTION_BULK_DELETE,
+    AuditLog.ACTION_PURGE_REQUESTS,
+})
+
+
+class AuditBuffer:
+    def __init__(self, max_entries, max_age):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._entries = []
+        self._oldest = None
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def add(self, entry):
+        with self._lock:
+            if not self._entries:
+                self._oldest = time.monotonic()
+            self._entries.append(entry)
+            due = (len(self._entries) >= self.max_entries
+                   or time.monotonic() - self._oldest >= self.max_age)
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            entries, self._entries = self._entries, []
+        if not entries:
+            return 0
+        try:
+            AuditLog.bulk_append(entries)
+        except Exception:
+            # Keep the entries for the next flush rather than lose them.
+            with self._lock:
+                self._entries[:0] = entries
+                self._oldest = time.monotonic()
+            raise
+        return len(entries)
+
+
+_buffer = AuditBuffer(settings.AUDIT_BUFFER_SIZE, settings.AUDIT_BUFFER_MAX_AGE)
+
+
+def record(entry, strict=False):
+    """Queue an unsaved ``AuditLog`` entry; ``strict`` writes it immediately."""
+    if entry.pk:
+        raise ValueError("AuditLog entries are immutable and cannot be updated.")
+    if strict or entry.action in STRICT_ACTIONS or settings.AUDIT_BUFFER_SIZE <= 1:
+        flush()
+        entry.save()
+    else:
+        _buffer.add(entry)
+
+
+def flush():
+    """
+    Write all buffered entries now; returns how many were written. Inside a
+    transaction the write is deferred until it commits and 0 is returned.
+    """
+    if _in_transaction():
+        transaction.on_commit(_flush_logged)
+        return 0
+    return _buffer.flush()
+
+
+def _in_transaction():
+    # The atomic block a TestCase wraps each test in does not count, the same
+    # exception Django makes for durable blocks.
+    return any(not getattr(block, '_from_testcase', False) for block in connection.atomic_blocks)
+
+
+def _flush_logged():
+    try:
+        flush()
+    except Exception:
+        # The entries stay buffered for a retry.
+        logger.exception('Could not write %s audit entries; keeping them for the next flush.',
+                         len(_buffer))
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush()
+    except Exception:
+        logger.exception('Lost %s audit entries at exit.', len(_buffer))
+
+
+class AuditFlushMiddleware(MiddlewareMixin):
+    """Flush buffered audit entries once the response has been produced."""
+
+    def process_response(self, request, response):
+        if settings.AUDIT_FLUSH_ON_REQUEST_END:
+            # The response stands even if the write fails.
+            _flush_logged()
+        return response
@@ -0,0 +1,274 @@
+"""
+Audit log archival.
+
+Entries older than ``AUDIT_ARCHIVE_AFTER_DAYS`` are moved out of the hot
+``AuditLog`` table into append-only, gzip-compressed JSON Lines segments, one
+per month (``audit-YYYY-MM.jsonl.gz``) under ``AUDIT_ARCHIVE_DIR``. Each
+archival chunk is appended as a new gzip member, so existing bytes are never
+rewritten. ``index.json`` records the entry count and time span of every
+segment, which lets searches skip segments that cannot match.
+
+Crash safety: the ids of a chunk, and the segment's size before it, are
+journalled in the index before the chunk is written, and cleared once the
+rows are gone from the database. A rerun first finishes any journalled chunk:
+a member cut short by the crash is truncated away, then whatever ids are
+missing from the segment are archived, so entries are neither lost nor
+duplicated. Until then, readers stop at the truncated member.
+"""
+import gzip
+import json
+import os
+import zlib
+from datetime import timedelta
+from types import SimpleNamespace
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import REFERENCE_CODE_LENGTH, AuditLog
+
+
+INDEX_NAME = 'index.json'
+
+
+def archive_dir():
+    # Created by archive(); readers treat a missing directory as empty.
+    return str(settings.AUDIT_ARCHIVE_DIR)
+
+
+def segment_name(month):
+    return f'audit-{month}.jsonl.gz'
+
+
+def segment_path(month):
+    return os.path.join(archive_dir(), segment_name(month))
+
+
+def load_index():
+    path = os.path.join(archive_dir(), INDEX_NAME)
+    if not os.path.exists(path):
+        return {'segments': {}, 'pending': None}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_index(index):
+    path = os.path.join(archive_dir(), INDEX_NAME)
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(index, f, indent=1, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def archived_count():
+    return sum(seg['count'] for seg in load_index()['segments'].values())
+
+
+def serialize(entry):
+    return {
+        'id': entry.pk,
+        'timestamp': entry.timestamp.isoformat(),
+        'admin_id': entry.admin_id,
+        'admin': entry.admin.username if entry.admin_id else None,
+        'action': entry.action,
+        'ref_code': entry.ref_code,
+        'detail': entry.detail,
+        'ip_address': entry.ip_address,
+    }
+
+
+def _append_member(month, records):
+    """Append ``records`` as one gzip member and fsync the segment."""
+    with open(segment_path(month), 'ab') as raw:
+        with gzip.GzipFile(fileobj=raw, mode='ab') as gz:
+            for record in records:
+                gz.write(json.dumps(record, separators=(',', ':')).encode() + b'\n')
+        raw.flush()
+        os.fsync(raw.fileno())
+
+
+def read_segment(month):
+    path = segment_path(month)
+    if not os.path.exists(path):
+        return
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        except EOFError:
+            # A trailing member cut short by a crash; recover() removes it.
+            return
+
+
+def _segment_size(month):
+    path = segment_path(month)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+
+def _drop_partial_member(month, offset):
+    """Truncate the segment to ``offset`` if what follows is not whole gzip."""
+    path = segment_path(month)
+    if _segment_size(month) <= offset:
+        return
+    with open(path, 'r+b') as raw:
+        raw.seek(offset)
+        try:
+            with gzip.GzipFile(fileobj=raw, mode='rb') as gz:
+                while gz.read(1 << 16):
+                    pass
+            return
+        except (EOFError, gzip.BadGzipFile, zlib.error):
+            raw.truncate(offset)
+            raw.flush()
+            os.fsync(raw.fileno())
+
+
+def _update_segment(index, month, records):
+    seg = index['segments'].setdefault(month, {
+        'file': segment_name(month), 'count': 0, 'first': None, 'last': None,
+    })
+    seg['count'] += len(records)
+    stamps = [r['timestamp'] for r in records]
+    seg['first'] = min([s for s in (seg['first'], min(stamps)) if s])
+    seg['last'] = max([s for s in (seg['last'], max(stamps)) if s])
+
+
+def _delete_rows(ids):
+    # AuditLog.delete() refuses instance deletes on purpose; archival is the
+    # one sanctioned path that removes rows, and only after they are on disk.
+    with transaction.atomic():
+        AuditLog.objects.filter(pk__in=ids).delete()
+
+
+def _archive_chunk(index, month, entries):
+    ids = [e.pk for e in entries]
+    index['pending'] = {'month': month, 'ids': ids, 'offset': _segment_size(month)}
+    save_index(index)
+
+    records = [serialize(e) for e in entries]
+    _append_member(month, records)
+    _update_segment(index, month, records)
+    save_index(index)
+
+    _delete_rows(ids)
+    index['pending'] = None
+    save_index(index)
+
+
+def recover(index):
+    """Finish a chunk interrupted by a crash; returns entries recovered."""
+    pending = index.get('pending')
+    if not pending:
+        return 0
+    month, ids = pending['month'], set(pending['ids'])
+    if pending.get('offset') is not None:
+        # The rows are only deleted after a complete member is on disk, so
+        # anything dropped here is still in the database.
+        _drop_partial_member(month, pending['offset'])
+    on_disk = {r['id'] for r in read_segment(month) if r['id'] in ids}
+    missing = list(
+        AuditLog.objects.select_related('admin')
+        .filter(pk__in=ids - on_disk).order_by('timestamp', 'id')
+    )
+    if missing:
+        _append_member(month, [serialize(e) for e in missing])
+    # The crash may have come between the append and the index update, so
+    # recompute this segment's entry in the index from disk.
+    index['segments'].pop(month, None)
+    _update_segment(index, month, list(read_segment(month)))
+    save_index(index)
+    _delete_rows(list(ids))
+    index['pending'] = None
+    save_index(index)
+    return len(ids)
+
+
+def archive(older_than_days=None, chunk_size=1000, dry_run=False):
+    """
+    Move entries older than the cutoff into monthly segments.
+    Returns the number of entries archived (or that would be, on dry run).
+    """
+    days = settings.AUDIT_ARCHIVE_AFTER_DAYS if older_than_days is None else older_than_days
+    cutoff = timezone.now() - timedelta(days=days)
+    old = AuditLog.objects.filter(timestamp__lt=cutoff)
+    if dry_run:
+        return old.count()
+
+    os.makedirs(archive_dir(), exist_ok=True)
+    index = load_index()
+    recover(index)
+
+    total = 0
+    while True:
+        chunk = list(old.select_related('admin').order_by('timestamp', 'id')[:chunk_size])
+        if not chunk:
+            break
+        by_month = {}
+        for entry in chunk:
+            by_month.setdefault(entry.timestamp.strftime('%Y-%m'), []).append(entry)
+        for month, entries in sorted(by_month.items()):
+            _archive_chunk(index, month, entries)
+        total += len(chunk)
+    return total
+
+
+# ── Querying ──────────────────────────────────────────────────────────────────
+
+def _as_entry(record):
+    """Present an archived record with the attributes templates expect."""
+    return SimpleNamespace(
+        pk=record['id'],
+        timestamp=parse_datetime(record['timestamp']),
+        admin=SimpleNamespace(username=record['admin']) if record['admin'] else None,
+        action=record['action'],
+        ref_code=record['ref_code'],
+        detail=record['detail'],
+        ip_address=record['ip_address'],
+        archived=True,
+    )
+
+
+def search(admin=None, action=None, ref=None, date=None, limit=None):
+    """
+    Return archived entries matching the same filters as ``audit_log_view``,
+    newest first. With a ``date``, only segments whose first..last span in
+    the index covers that day are opened.
+    """
+    limit = limit or settings.AUDIT_ARCHIVE_SEARCH_LIMIT
+    segments = load_index()['segments']
+    months = sorted(segments, reverse=True)
+    day = date.isoformat() if date is not None else None
+    if day is not None:
+        months = [
+            m for m in months
+            if segments[m]['first'] and segments[m]['first'][:10] <= day <= segments[m]['last'][:10]
+        ]
+
+    admin = (admin or '').lower()
+    ref = (ref or '').upper()
+    # A full code matches exactly, anything shorter as a prefix.
+    exact_ref = len(ref) == REFERENCE_CODE_LENGTH
+
+    results = []
+    for month in months:
+        for record in read_segment(month):
+            if action and record['action'] != action:
+                continue
+            if ref and not (record['ref_code'] == ref if exact_ref
+                            else (record['ref_code'] or '').upper().startswith(ref)):
+                continue
+            if admin and admin not in (record['admin'] or '').lower():
+                continue
+            if day and not record['timestamp'].startswith(day):
+                continue
+            results.append(record)
+        if len(results) >= limit:
+            break
+
+    results.sort(key=lambda r: (r['timestamp'], r['id']), reverse=True)
+    return [_as_entry(r) for r in results[:limit]]
@@ -0,0 +1,318 @@
+"""
+Seeded benchmark of the public and staff request paths.
+
+``seed`` fills the database with a deterministic synthetic data set: one
+``IFMISResetRequest``, one ``IFMISRequestMessage`` and one ``AuditLog`` row per
+index, spread one minute apart from ``SEED_EPOCH``. Rows are written with
+``bulk_create``, so the signal-maintained structures (counters, search index,
+upload reference counts) are rebuilt or adjusted explicitly afterwards.
+Seeded requests carry reference codes starting with ``SEED_PREFIX``; seeding
+an already seeded database only adds the missing rows.
+
+``run_scenarios`` drives the views through the Django test client and
+returns, per scenario, latency percentiles, the number and time of database
+queries per request, and the peak Python memory allocated while serving one
+request (measured in a separate ``tracemalloc`` pass so tracing does not
+distort the latencies). ``manage.py benchmark`` runs all of this against a
+throwaway test database and writes a JSON baseline that ``compare`` diffs.
+"""
+import random
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.contrib.auth.models import Group, User
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import connection, transaction
+from django.test import Client
+
+from . import counters, search
+from .analytics import percentile
+from .metrics import QueryTimer
+from .models import AuditLog, IFMISRequestMessage, IFMISResetRequest
+from .roles import ADMIN_GROUP
+from .storage import upload_storage
+
+
+SEED_PREFIX = 'BN'
+SEED_EPOCH = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+SEED_BATCH_SIZE = 5000
+SAMPLE_FILE_COUNT = 8
+STAFF_USERNAME = 'benchmark-admin'
+
+DEPARTMENTS = [
+    'Ministry of Finance',
+    "Accountant General's Department",
+    'National Revenue Authority',
+    'Ministry of Health and Sanitation',
+    'Ministry of Basic and Senior Secondary Education',
+    'Ministry of Agriculture and Food Security',
+    'Ministry of Works and Public Assets',
+    'Audit Service Sierra Leone',
+]
+FIRST_NAMES = ['Aminata', 'Mohamed', 'Fatmata', 'Ibrahim', 'Isatu', 'Abu', 'Mariama', 'Alusine', 'Hawa', 'Sahr']
+LAST_NAMES = ['Kamara', 'Sesay', 'Conteh', 'Bangura', 'Koroma', 'Turay', 'Jalloh', 'Kargbo', 'Mansaray', 'Fofanah']
+MESSAGES = [
+    'I still cannot log in after the reset.',
+    'Please confirm when my password has been reset.',
+    'Your request is being processed by the Help Desk.',
+    'A new password has been sent to your official email.',
+]
+AUDIT_ACTIONS = [AuditLog.ACTION_VIEW_REQUEST, AuditLog.ACTION_MARK_PROCESSED, AuditLog.ACTION_SEND_REPLY]
+
+
+def seed_reference(index):
+    return f'{SEED_PREFIX}{index:010d}'
+
+
+def sample_pdf(index):
+    return f'%PDF-1.4\n% IFMIS password reset form {index}\n%%EOF\n'.encode()
+
+
+# ── Seeding ───────────────────────────────────────────────────────────────────
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """Let ``bulk_create`` keep the given values of ``auto_now_add`` fields."""
+    saved = [(field, field.auto_now_add) for field in fields]
+    for field, _ in saved:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, value in saved:
+            field.auto_now_add = value
+
+
+def staff_user():
+    user, _ = User.objects.get_or_create(username=STAFF_USERNAME, defaults={'is_staff': True})
+    user.groups.add(Group.objects.get_or_create(name=ADMIN_GROUP)[0])
+    return user
+
+
+def sample_files():
+    """Store the sample uploads (if missing) and return their storage names."""
+    storage = upload_storage()
+    names = []
+    for i in range(SAMPLE_FILE_COUNT):
+        name = storage.save('uploads/form.pdf', ContentFile(sample_pdf(i)))
+        # save() took a reference; seeded rows take their own below.
+        storage.release([name])
+        names.append(name)
+    return names
+
+
+def seeded_count():
+    return IFMISResetRequest.objects.filter(reference_code__startswith=SEED_PREFIX).count()
+
+
+def seed(size, seed_value=0, batch_size=SEED_BATCH_SIZE, progress=None):
+    """
+    Make sure ``size`` synthetic requests (each with one message and one
+    audit entry) exist. Returns the number of requests added.
+    """
+    start = seeded_count()
+    if start >= size:
+        return 0
+
+    admin = staff_user()
+    files = sample_files()
+    storage = upload_storage()
+    rng = random.Random(f'{seed_value}:{start}')
+    timestamp_fields = (
+        IFMISResetRequest._meta.get_field('submitted_at'),
+        IFMISRequestMessage._meta.get_field('timestamp'),
+    )
+
+    for batch_start in range(start, size, batch_size):
+        batch_end = min(batch_start + batch_size, size)
+        requests, audit_entries, file_uses = [], [], {}
+        for i in range(batch_start, batch_end):
+            submitted_at = SEED_EPOCH + timedelta(minutes=i, seconds=rng.randrange(60))
+            processed = rng.random() < 0.7
+            file_name = files[i % len(files)]
+            file_uses[file_name] = file_uses.get(file_name, 0) + 1
+            requests.append(IFMISResetRequest(
+                full_name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+                department=rng.choice(DEPARTMENTS),
+                email=f'user{i}@example.gov.sl',
+                uploaded_file=file_name,
+                sha256=file_name.rsplit('/', 1)[-1].split('.')[0],
+                reference_code=seed_reference(i),
+                submitted_at=submitted_at,
+                processed=processed,
+                processed_at=submitted_at + timedelta(seconds=rng.randrange(300, 5 * 86400)) if processed else None,
+                processed_by=admin if processed else None,
+            ))
+            audit_entries.append(AuditLog(
+                admin=admin,
+                action=rng.choice(AUDIT_ACTIONS),
+                ref_code=seed_reference(i),
+                ip_address='10.0.0.1',
+                timestamp=submitted_at + timedelta(hours=1),
+            ))
+
+        with transaction.atomic(), _explicit_timestamps(*timestamp_fields):
+            IFMISResetRequest.objects.bulk_create(requests)
+            # bulk_create only sets primary keys on some backends.
+            ids = dict(IFMISResetRequest.objects.filter(
+                reference_code__in=[r.reference_code for r in requests]
+            ).values_list('reference_code', 'pk'))
+            IFMISRequestMessage.objects.bulk_create([
+                IFMISRequestMessage(
+                    request_id=ids[r.reference_code],
+                    sender='admin' if n % 2 else 'user',
+                    content=MESSAGES[n % len(MESSAGES)],
+                    timestamp=r.submitted_at + timedelta(minutes=30),
+                )
+                for n, r in enumerate(requests, batch_start)
+            ])
+            AuditLog.bulk_append(audit_entries)
+            for name, count in file_uses.items():
+                storage.acquire(name, count)
+        if progress:
+            progress(batch_end)
+
+    counters.rebuild()
+    search.rebuild_index()
+    return size - start
+
+
+# ── Scenarios ─────────────────────────────────────────────────────────────────
+
+def _client_ip(i):
+    # A distinct address per iteration keeps the public rate limits out of the way.
+    return f'10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}'
+
+
+def scenarios(size):
+    """``{name: (client_kind, callable(client, i, rng) -> response)}`` for a seeded ``size``."""
+    files = sample_files()
+    last_page = max(size // 2 // 15, 1)
+
+    def random_ref(rng):
+        return seed_reference(rng.randrange(size))
+
+    def upload_submit(client, i, rng):
+        upload = SimpleUploadedFile('IFMIS_FORM.pdf', sample_pdf(i % SAMPLE_FILE_COUNT), 'application/pdf')
+        return client.post('/', {
+            'full_name': 'Benchmark User',
+            'department': DEPARTMENTS[i % len(DEPARTMENTS)],
+            'email': 'benchmark@example.gov.sl',
+            'uploaded_file': upload,
+        }, REMOTE_ADDR=_client_ip(i))
+
+    return {
+        'upload_form': ('public', lambda client, i, rng: client.get('/')),
+        'upload_submit': ('public', upload_submit),
+        'track_request': ('public', lambda client, i, rng: client.get(
+            '/track/', {'ref': random_ref(rng)}, REMOTE_ADDR=_client_ip(i))),
+        'dashboard': ('staff', lambda client, i, rng: client.get('/staff/dashboard/')),
+        'dashboard_deep_page': ('staff', lambda client, i, rng: client.get(
+            '/staff/dashboard/', {'page': last_page})),
+        'dashboard_search': ('staff', lambda client, i, rng: client.get(
+            '/staff/dashboard/', {'q': rng.choice(LAST_NAMES)})),
+        'dashboard_month': ('staff', lambda client, i, rng: client.get(
+            '/staff/dashboard/', {'month': rng.randrange(1, 13)})),
+        'request_detail': ('staff', lambda client, i, rng: client.get(
+            f'/staff/request/{random_ref(rng)}/')),
+        'audit_log': ('staff', lambda client, i, rng: client.get('/staff/audit/')),
+        'audit_log_date': ('staff', lambda client, i, rng: client.get(
+            '/staff/audit/', {'date': (SEED_EPOCH + timedelta(minutes=rng.randrange(size))).strftime('%Y-%m-%d')})),
+        'serve_uploaded_file': ('staff', lambda client, i, rng: client.get(
+            '/' + files[i % len(files)])),
+    }
+
+
+def _consume(response):
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    response.close()
+    return size
+
+
+def measure(call, client, iterations, warmup, memory_iterations, seed_value=0):
+    rng = random.Random(seed_value)
+    for i in range(warmup):
+        _consume(call(client, i, rng))
+
+    latencies, query_counts, query_times, errors = [], [], [], 0
+    for i in range(warmup, warmup + iterations):
+        queries = QueryTimer()
+        with connection.execute_wrapper(queries):
+            started = time.perf_counter()
+            response = call(client, i, rng)
+            _consume(response)
+            elapsed = time.perf_counter() - started
+        if response.status_code >= 400:
+            errors += 1
+        latencies.append(elapsed * 1000)
+        query_counts.append(queries.count)
+        query_times.append(queries.seconds * 1000)
+
+    peak = 0
+    tracemalloc.start()
+    try:
+        for i in range(warmup + iterations, warmup + iterations + memory_iterations):
+            tracemalloc.reset_peak()
+            _consume(call(client, i, rng))
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+    finally:
+        tracemalloc.stop()
+
+    latencies.sort()
+    return {
+        'iterations': iterations,
+        'p50_ms': round(percentile(latencies, 0.50), 3),
+        'p99_ms': round(percentile(latencies, 0.99), 3),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'queries': max(query_counts),
+        'query_ms': round(sum(query_times) / len(query_times), 3),
+        'peak_kib': round(peak / 1024, 1),
+        'errors': errors,
+    }
+
+
+def run_scenarios(size, iterations=50, warmup=5, memory_iterations=5, only=None, seed_value=0):
+    public = Client()
+    staff = Client()
+    staff.force_login(staff_user())
+    clients = {'public': public, 'staff': staff}
+
+    results = {}
+    for name, (kind, call) in scenarios(size).items():
+        if only and name not in only:
+            continue
+        results[name] = measure(call, clients[kind], iterations, warmup, memory_iterations, seed_value)
+    return results
+
+
+# ── Baselines ─────────────────────────────────────────────────────────────────
+
+def compare(baseline, current, threshold=0.2):
+    """
+    Compare two baselines scenario by scenario. Returns a list of
+    ``(size, scenario, metric, old, new, regressed)``; latencies regress when
+    they grow by more than ``threshold``, query counts on any increase.
+    """
+    rows = []
+    for size, run in current['sizes'].items():
+        old_run = baseline.get('sizes', {}).get(size)
+        if not old_run:
+            continue
+        for name, metrics in run['scenarios'].items():
+            old = old_run['scenarios'].get(name)
+            if not old:
+                continue
+            for metric in ('p50_ms', 'p99_ms', 'queries', 'peak_kib'):
+                before, after = old[metric], metrics[metric]
+                if metric == 'queries':
+                    regressed = after > before
+                else:
+                    regressed = before > 0 and after > before * (1 + threshold)
+                rows.append((size, name, metric, before, after, regressed))
+    return rows
@@ -0,0 +1,157 @@
+"""
+Background bulk deletion of requests.
+
+``bulk_delete_requests`` snapshots the selected ids into a ``BulkDeleteJob``
+with one query and returns immediately. ``run_job`` then works through the
+snapshot in chunks of ``BULK_DELETE_CHUNK_SIZE``: each chunk's rows (and their
+messages) are deleted in one short transaction, which also drops their
+storage references and records the chunk's upload names on the job, and
+files left without references are unlinked afterwards on a thread pool.
+Only the unlink step can be interrupted between the database commit and the
+disk, and it is journalled, so rerunning the job (see the
+``run_bulk_delete_jobs`` command) finishes it without orphaning files.
+
+The retention purge (``core.retention``) runs its jobs through the same
+code; they are marked with ``purge_before`` and resumed by
+``purge_requests`` rather than ``run_bulk_delete_jobs``.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import BulkDeleteJob, IFMISResetRequest
+from .storage import upload_storage
+
+
+logger = logging.getLogger(__name__)
+
+# A RUNNING job whose worker has not saved progress for this long is assumed
+# dead and may be picked up again.
+STALE_AFTER = timedelta(minutes=5)
+
+
+def file_size(storage, name):
+    try:
+        return storage.size(name)
+    except OSError:
+        return 0
+
+
+def unlink_files(names, pool):
+    """
+    Unlink the uploads in ``names`` that are no longer referenced, in
+    parallel; returns ``(files_removed, bytes_removed)``.
+    """
+    storage = upload_storage()
+    # Sized before the unlink; whichever of them go is only known after.
+    sizes = {name: file_size(storage, name) for name in set(names) if name}
+    removed = storage.collect(names, pool=pool)
+    return len(removed), sum(sizes.get(name, 0) for name in removed)
+
+
+def delete_chunk(ids, purge_before=None):
+    """
+    Delete the requests in ``ids`` (with their messages), drop their upload
+    references and return ``(deleted_count, file_names)``. Call inside a
+    transaction, then pass the names to ``unlink_files``.
+
+    With ``purge_before``, only requests still processed before that time are
+    deleted: a purge snapshot may be resumed days later, after some of its
+    requests were reverted to pending.
+    """
+    qs = IFMISResetRequest.objects.filter(pk__in=ids)
+    if purge_before is not None:
+        qs = qs.filter(processed=True, processed_at__lt=purge_before)
+    # Locked, so two jobs covering the same rows cannot both release a file.
+    files = [name for name in qs.select_for_update().values_list('uploaded_file', flat=True) if name]
+    _, per_model = qs.delete()
+    upload_storage().release(files)
+    return per_model.get(IFMISResetRequest._meta.label, 0), files
+
+
+def create_job(user, ids):
+    """Queue the deletion of ``ids``, the caller's snapshot of existing rows."""
+    return BulkDeleteJob.objects.create(created_by=user, request_ids=sorted(ids))
+
+
+def claim(job_id):
+    """Mark the job RUNNING for this worker; returns it, or None if taken."""
+    stale = timezone.now() - STALE_AFTER
+    claimed = BulkDeleteJob.objects.filter(pk=job_id).filter(
+        Q(status=BulkDeleteJob.STATUS_PENDING) |
+        Q(status=BulkDeleteJob.STATUS_FAILED) |
+        Q(status=BulkDeleteJob.STATUS_RUNNING, updated_at__lt=stale)
+    ).update(status=BulkDeleteJob.STATUS_RUNNING, updated_at=timezone.now())
+    return BulkDeleteJob.objects.get(pk=job_id) if claimed else None
+
+
+def _unlink_pending(job, pool):
+    files, size = unlink_files(job.pending_files, pool)
+    job.files_removed += files
+    job.bytes_removed += size
+    job.pending_files = []
+    job.save(update_fields=['files_removed', 'bytes_removed', 'pending_files', 'updated_at'])
+
+
+def run_job(job_id, chunk_size=None, file_workers=None):
+    job = claim(job_id)
+    if job is None:
+        return None
+
+    chunk_size = chunk_size or settings.BULK_DELETE_CHUNK_SIZE
+    file_workers = file_workers or settings.BULK_DELETE_FILE_WORKERS
+    with ThreadPoolExecutor(max_workers=file_workers) as pool:
+        try:
+            # Files left over from an interrupted run.
+            if job.pending_files:
+                _unlink_pending(job, pool)
+
+            while job.position < job.total:
+                chunk = job.request_ids[job.position:job.position + chunk_size]
+                with transaction.atomic():
+                    deleted, files = delete_chunk(chunk, job.purge_before)
+                    job.position += len(chunk)
+                    job.deleted += deleted
+                    job.pending_files = files
+                    job.save(update_fields=['position', 'deleted', 'pending_files', 'updated_at'])
+
+                _unlink_pending(job, pool)
+
+            job.status = BulkDeleteJob.STATUS_DONE
+            job.error = ''
+        except Exception as exc:
+            logger.exception('Bulk delete job %s failed', job.pk)
+            job.status = BulkDeleteJob.STATUS_FAILED
+            job.error = str(exc)[:2000]
+        job.save(update_fields=['status', 'error', 'updated_at'])
+    return job
+
+
+def _run_in_thread(job_id):
+    try:
+        run_job(job_id)
+    finally:
+        connection.close()
+
+
+def start_job(job):
+    """Run ``job`` on a background thread once the current transaction commits."""
+    def launch():
+        threading.Thread(target=_run_in_thread, args=(job.pk,), daemon=True,
+                         name=f'bulk-delete-{job.pk}').start()
+    transaction.on_commit(launch)
+
+
+def resumable_jobs():
+    stale = timezone.now() - STALE_AFTER
+    return BulkDeleteJob.objects.filter(
+        Q(status=BulkDeleteJob.STATUS_PENDING) |
+        Q(status=BulkDeleteJob.STATUS_RUNNING, updated_at__lt=stale),
+        purge_before__isnull=True,
+    ).order_by('created_at')
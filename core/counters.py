@@ -0,0 +1,123 @@
+"""
+Incrementally maintained request statistics.
+
+``RequestCounter`` holds one row per (submission day, department, status)
+with the number of requests in it. ``core.signals`` adjusts the matching
+rows whenever a request is created, flips between pending and processed, or
+is deleted, inside the same transaction as the change itself
+(``IFMISResetRequest.save`` is atomic and deletes always are). Code that
+changes ``processed`` with ``QuerySet.update()`` must call ``move`` itself.
+
+Dashboard KPIs are then sums over this summary table, whose size depends on
+days x departments rather than on the number of requests. ``rebuild`` (and
+``manage.py reconcile_request_counters``) recomputes it from scratch.
+"""
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import IFMISResetRequest, RequestCounter
+
+
+# Pending requests at least this many days old count as overdue; matches the
+# red "days open" badge on the dashboard.
+OVERDUE_AFTER_DAYS = 3
+
+
+def key_for(request_obj):
+    return (timezone.localdate(request_obj.submitted_at), request_obj.department, request_obj.processed)
+
+
+def adjust(key, delta):
+    """Add ``delta`` to the counter for ``key`` = (day, department, processed)."""
+    if not delta:
+        return
+    day, department, processed = key
+    counters = RequestCounter.objects.filter(day=day, department=department, processed=processed)
+    if counters.update(count=F('count') + delta):
+        return
+    try:
+        with transaction.atomic():
+            RequestCounter.objects.create(day=day, department=department, processed=processed, count=delta)
+    except IntegrityError:
+        counters.update(count=F('count') + delta)
+
+
+def move(old_key, new_key, count=1):
+    if old_key != new_key:
+        adjust(old_key, -count)
+        adjust(new_key, count)
+
+
+def move_status(request_objs, processed):
+    """
+    Account for ``request_objs`` (with their *old* status loaded) being set
+    to ``processed`` by a ``QuerySet.update()``.
+    """
+    # Group by counter row so a bulk change costs two UPDATEs per
+    # (day, department) rather than two per request.
+    moves = {}
+    for obj in request_objs:
+        old = key_for(obj)
+        moves[old] = moves.get(old, 0) + 1
+    for old, count in moves.items():
+        move(old, (old[0], old[1], processed), count)
+
+
+def kpis():
+    """Total, pending, processed and overdue counts from the summary table."""
+    overdue_before = timezone.localdate() - timedelta(days=OVERDUE_AFTER_DAYS - 1)
+    totals = RequestCounter.objects.aggregate(
+        n_processed=Sum('count', filter=Q(processed=True), default=0),
+        n_pending=Sum('count', filter=Q(processed=False), default=0),
+        n_overdue=Sum('count', filter=Q(processed=False, day__lt=overdue_before), default=0),
+    )
+    return {
+        'total': totals['n_processed'] + totals['n_pending'],
+        'pending': totals['n_pending'],
+        'processed': totals['n_processed'],
+        'overdue': totals['n_overdue'],
+    }
+
+
+def rebuild():
+    """Recompute every counter from the requests table; returns the row count."""
+    rows = (
+        IFMISResetRequest.objects
+        .annotate(day=TruncDate('submitted_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'department', 'processed')
+        .annotate(n=Count('pk'))
+        .order_by()
+    )
+    with transaction.atomic():
+        RequestCounter.objects.all().delete()
+        RequestCounter.objects.bulk_create([
+            RequestCounter(day=row['day'], department=row['department'],
+                           processed=row['processed'], count=row['n'])
+            for row in rows
+        ], batch_size=500)
+    return RequestCounter.objects.count()
+
+
+def discrepancies():
+    """Counters that disagree with the requests table, as {key: (stored, actual)}."""
+    actual = {
+        (row['day'], row['department'], row['processed']): row['n']
+        for row in IFMISResetRequest.objects
+        .annotate(day=TruncDate('submitted_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'department', 'processed')
+        .annotate(n=Count('pk'))
+        .order_by()
+    }
+    stored = {
+        (c.day, c.department, c.processed): c.count
+        for c in RequestCounter.objects.all()
+    }
+    return {
+        key: (stored.get(key, 0), actual.get(key, 0))
+        for key in stored.keys() | actual.keys()
+        if stored.get(key, 0) != actual.get(key, 0)
+    }
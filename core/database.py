@@ -0,0 +1,52 @@
+"""
+Per-connection database tuning.
+
+SQLite is configured when each connection is opened (``connection_created``):
+
+* ``journal_mode=WAL`` lets readers keep reading while one writer commits,
+  instead of every write locking the whole file.
+* ``synchronous=NORMAL`` is durable across application crashes in WAL mode
+  and avoids an fsync per commit.
+* ``busy_timeout`` makes a writer wait for the lock instead of failing at
+  once with "database is locked".
+* ``mmap_size`` serves reads from the page cache without copying.
+
+Transactions are started with ``BEGIN IMMEDIATE`` (the ``transaction_mode``
+option in settings), so a transaction that reads and then writes takes the
+write lock up front and waits for it under ``busy_timeout``; a deferred
+transaction that tries to upgrade while another writer is active fails
+immediately, whatever the timeout.
+
+PostgreSQL needs no per-connection setup; see ``DB_PROFILE`` in settings.
+"""
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+JOURNAL_MODES = {'DELETE', 'TRUNCATE', 'PERSIST', 'MEMORY', 'WAL', 'OFF'}
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+
+def sqlite_pragmas():
+    journal_mode = settings.SQLITE_JOURNAL_MODE.upper()
+    synchronous = settings.SQLITE_SYNCHRONOUS.upper()
+    if journal_mode not in JOURNAL_MODES:
+        raise ValueError(f'Unknown SQLITE_JOURNAL_MODE {settings.SQLITE_JOURNAL_MODE!r}.')
+    if synchronous not in SYNCHRONOUS_MODES:
+        raise ValueError(f'Unknown SQLITE_SYNCHRONOUS {settings.SQLITE_SYNCHRONOUS!r}.')
+    return [
+        f'PRAGMA journal_mode={journal_mode}',
+        f'PRAGMA synchronous={synchronous}',
+        f'PRAGMA busy_timeout={int(settings.SQLITE_BUSY_TIMEOUT_MS)}',
+        f'PRAGMA mmap_size={int(settings.SQLITE_MMAP_SIZE)}',
+    ]
+
+
+@receiver(connection_created)
+def configure_sqlite(sender, connection, **kwargs):
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for pragma in sqlite_pragmas():
+            cursor.execute(pragma)
@@ -0,0 +1,166 @@
+"""
+Streaming CSV and XLSX export of requests.
+
+Rows are read with ``QuerySet.iterator(chunk_size=EXPORT_CHUNK_SIZE)`` and
+written straight into the response body, so memory use does not grow with
+the size of the export. CSV goes through the standard ``csv`` module; XLSX is
+produced by a minimal SpreadsheetML writer that streams the sheet into a zip
+archive on the fly (``zipfile`` writes data descriptors when the output
+cannot seek), so no spreadsheet library is needed.
+"""
+import csv
+import re
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.utils import timezone
+
+
+COLUMNS = [
+    ('reference_code', 'Reference'),
+    ('full_name', 'Full Name'),
+    ('department', 'Department'),
+    ('email', 'Email'),
+    ('submitted_at', 'Submitted'),
+    ('processed', 'Status'),
+    ('processed_at', 'Processed At'),
+    ('processed_by__username', 'Processed By'),
+]
+
+CSV_CONTENT_TYPE = 'text/csv; charset=utf-8'
+XLSX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+
+# Characters that make spreadsheet applications treat a cell as a formula.
+_FORMULA_PREFIXES = ('=', '+', '-', '@', '\t', '\r')
+# XML 1.0 forbids most control characters, even escaped.
+_ILLEGAL_XML_RE = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+
+def export_rows(queryset):
+    """Yield one list of display strings per request, in constant memory."""
+    fields = [field for field, _ in COLUMNS]
+    for values in queryset.values_list(*fields).iterator(chunk_size=settings.EXPORT_CHUNK_SIZE):
+        yield [_display(field, value) for field, value in zip(fields, values)]
+
+
+def _display(field, value):
+    if value is None:
+        return ''
+    if field == 'processed':
+        return 'Processed' if value else 'Pending'
+    if field in ('submitted_at', 'processed_at'):
+        return timezone.localtime(value).strftime('%Y-%m-%d %H:%M')
+    value = str(value)
+    if value.startswith(_FORMULA_PREFIXES):
+        value = "'" + value
+    return value
+
+
+# ── CSV ───────────────────────────────────────────────────────────────────────
+
+class _Echo:
+    """File-like object whose ``write`` just returns the value."""
+
+    def write(self, value):
+        return value
+
+
+def stream_csv(rows):
+    writer = csv.writer(_Echo())
+    # BOM so Excel opens the UTF-8 file with the right encoding.
+    yield '\ufeff' + writer.writerow([title for _, title in COLUMNS])
+    for row in rows:
+        yield writer.writerow(row)
+
+
+# ── XLSX ──────────────────────────────────────────────────────────────────────
+
+class _ChunkBuffer:
+    """Write-only, non-seekable sink that hands out what was written so far."""
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/xl/workbook.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet.main+xml"/>'
+    '<Override PartName="/xl/worksheets/sheet1.xml" '
+    'ContentType="application/vnd.openxmlformats-officedocument.spreadsheetml.worksheet+xml"/>'
+    '</Types>'
+)
+_ROOT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" '
+    'Target="xl/workbook.xml"/>'
+    '</Relationships>'
+)
+_WORKBOOK = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<workbook xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main" '
+    'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+    '<sheets><sheet name="Requests" sheetId="1" r:id="rId1"/></sheets>'
+    '</workbook>'
+)
+_WORKBOOK_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" '
+    'Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/worksheet" '
+    'Target="worksheets/sheet1.xml"/>'
+    '</Relationships>'
+)
+_SHEET_HEAD = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<worksheet xmlns="http://schemas.openxmlformats.org/spreadsheetml/2006/main"><sheetData>'
+)
+_SHEET_TAIL = '</sheetData></worksheet>'
+
+
+def _xlsx_row(values):
+    cells = ''.join(
+        f'<c t="inlineStr"><is><t xml:space="preserve">{escape(_ILLEGAL_XML_RE.sub("", value))}</t></is></c>'
+        for value in values
+    )
+    return f'<row>{cells}</row>'.encode()
+
+
+def stream_xlsx(rows, flush_every=500):
+    sink = _ChunkBuffer()
+    with zipfile.ZipFile(sink, mode='w', compression=zipfile.ZIP_DEFLATED) as archive:
+        archive.writestr('[Content_Types].xml', _CONTENT_TYPES)
+        archive.writestr('_rels/.rels', _ROOT_RELS)
+        archive.writestr('xl/workbook.xml', _WORKBOOK)
+        archive.writestr('xl/_rels/workbook.xml.rels', _WORKBOOK_RELS)
+        yield sink.take()
+
+        with archive.open('xl/worksheets/sheet1.xml', mode='w', force_zip64=True) as sheet:
+            sheet.write(_SHEET_HEAD.encode())
+            sheet.write(_xlsx_row([title for _, title in COLUMNS]))
+            for i, row in enumerate(rows, 1):
+                sheet.write(_xlsx_row(row))
+                if i % flush_every == 0:
+                    data = sink.take()
+                    if data:
+                        yield data
+            sheet.write(_SHEET_TAIL.encode())
+    yield sink.take()
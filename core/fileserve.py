@@ -0,0 +1,145 @@
+"""
+Efficient delivery of protected files.
+
+Permission checks stay in the view; this module only ships the bytes:
+
+* conditional GET (ETag / If-Modified-Since -> 304) so re-opening a scan
+  costs a stat() instead of a 5 MB transfer,
+* single byte-range requests (206) for PDF viewers that fetch pages lazily,
+* chunked streaming otherwise, so the file is never read into memory,
+* optional offload to the front-end web server with ``X-Accel-Redirect``
+  (nginx) or ``X-Sendfile`` (Apache/lighttpd), see
+  ``PROTECTED_MEDIA_OFFLOAD``.
+"""
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+
+
+CHUNK_SIZE = 64 * 1024
+
+OFFLOAD_X_ACCEL = 'x-accel-redirect'
+OFFLOAD_X_SENDFILE = 'x-sendfile'
+
+_RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def file_etag(stat):
+    return quote_etag(f'{stat.st_mtime_ns:x}-{stat.st_size:x}')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range ``Range`` header into an inclusive ``(start, end)``.
+
+    Returns ``None`` when the header is absent or not something we serve as
+    a range (multi-range, other units) so the caller sends the whole file,
+    and raises ``ValueError`` when the range cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # Suffix range: the last N bytes; an empty file has none.
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(header)
+        return max(size - length, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or end < start:
+        raise ValueError(header)
+    return start, end
+
+
+def _if_range_matches(request, etag, mtime):
+    if_range = request.META.get('HTTP_IF_RANGE')
+    if not if_range:
+        return True
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    since = parse_http_date_safe(if_range)
+    return since is not None and int(mtime) <= since
+
+
+def _stream_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        remaining = length
+        while remaining > 0:
+            chunk = f.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def serve_file(request, path, filename, as_attachment=False, internal_url=None):
+    """
+    Return a response delivering ``path`` to the client as ``filename``.
+
+    ``internal_url`` is the path nginx should serve in X-Accel-Redirect mode.
+    """
+    stat = os.stat(path)
+    etag = file_etag(stat)
+    last_modified = int(stat.st_mtime)
+
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is not None:
+        return response
+
+    content_type, encoding = mimetypes.guess_type(path)
+    content_type = content_type or 'application/octet-stream'
+    offload = settings.PROTECTED_MEDIA_OFFLOAD
+
+    if offload == OFFLOAD_X_ACCEL and internal_url:
+        # nginx handles Range itself for internal redirects.
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = internal_url
+    elif offload == OFFLOAD_X_SENDFILE:
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = os.fsencode(path).decode('latin-1')
+    else:
+        # A stale If-Range means the whole file is sent, so the Range header
+        # (even an unsatisfiable one) is ignored.
+        byte_range = None
+        if _if_range_matches(request, etag, stat.st_mtime):
+            try:
+                byte_range = parse_range(request.META.get('HTTP_RANGE'), stat.st_size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f'bytes */{stat.st_size}'
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            length = end - start + 1
+            response = StreamingHttpResponse(
+                _stream_range(path, start, length), status=206, content_type=content_type,
+            )
+            response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+            response['Content-Length'] = str(length)
+        else:
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+            response.block_size = CHUNK_SIZE
+        response['Accept-Ranges'] = 'bytes'
+
+    if encoding:
+        response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Last-Modified'] = http_date(last_modified)
+    # Protected content: never cache in shared proxies, always revalidate.
+    response['Cache-Control'] = 'private, no-cache'
+    disposition = 'attachment' if as_attachment else 'inline'
+    response['Content-Disposition'] = f'{disposition}; filename="{filename}"'
+    return response
@@ -1,8 +1,8 @@
 from django import forms
-import mimetypes
 import os
 
 from .models import IFMISResetRequest, IFMISRequestMessage
+from .uploads import EXTENSIONS, inspect_file
 
 class IFMISResetForm(forms.ModelForm):
     MAX_UPLOAD_SIZE = 5 * 1024 * 1024
@@ -13,22 +13,39 @@ class IFMISResetForm(forms.ModelForm):
         model = IFMISResetRequest
         fields = ['full_name', 'department', 'email', 'uploaded_file']
 
+    def __init__(self, *args, upload_error=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        # A file rejected while streaming never reaches request.FILES; report
+        # why instead of "This field is required."
+        self.upload_error = upload_error
+        if upload_error:
+            self.fields['uploaded_file'].required = False
+
     def clean_uploaded_file(self):
+        if self.upload_error:
+            raise forms.ValidationError(self.upload_error)
         uploaded_file = self.cleaned_data.get('uploaded_file')
         if not uploaded_file:
             return uploaded_file
 
-        if uploaded_file.size > self.MAX_UPLOAD_SIZE:
-            raise forms.ValidationError("File size must be 5MB or less.")
+        # Files streamed through ValidatingUploadHandler were sized, sniffed
+        # and hashed on the way in; anything else is inspected here.
+        if hasattr(uploaded_file, 'sha256'):
+            error, detected_type, digest = uploaded_file.upload_error, uploaded_file.detected_type, uploaded_file.sha256
+        else:
+            inspector = inspect_file(uploaded_file, self.MAX_UPLOAD_SIZE)
+            error, detected_type, digest = inspector.error, inspector.detected_type, inspector.sha256
+        if error:
+            raise forms.ValidationError(error)
 
         extension = os.path.splitext(uploaded_file.name)[1].lower()
         if extension not in self.ALLOWED_EXTENSIONS:
             raise forms.ValidationError("Only PDF, JPG, and PNG files are allowed.")
 
-        content_type = getattr(uploaded_file, 'content_type', None) or mimetypes.guess_type(uploaded_file.name)[0]
-        if content_type and content_type.lower() not in self.ALLOWED_CONTENT_TYPES:
+        if detected_type not in self.ALLOWED_CONTENT_TYPES or extension not in EXTENSIONS[detected_type]:
             raise forms.ValidationError("Unsupported file type. Please upload PDF, JPG, or PNG.")
 
+        self.instance.sha256 = digest
         return uploaded_file
 
 
@@ -0,0 +1,188 @@
+"""
+In-process pub/sub for live conversation updates.
+
+Every open Server-Sent Events stream subscribes to one reference code and
+gets an ``asyncio.Queue`` on its event loop. ``publish`` may be called from
+any thread (sync views run in a worker thread under ASGI) and hands events to
+the subscribers' loops with ``call_soon_threadsafe``. An idle subscriber is a
+dict entry and a parked coroutine, so one ASGI process can hold thousands.
+
+Fan-out is per process. Streams also re-read the database every
+``LIVE_RESYNC_INTERVAL`` seconds, which catches changes made in other
+processes, and slow consumers whose queue overflowed simply catch up from
+their cursor on that resync.
+"""
+import asyncio
+import json
+import threading
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateformat import format as date_format
+
+from .models import IFMISRequestMessage, IFMISResetRequest
+
+
+QUEUE_SIZE = 100
+
+# Seconds between keep-alive comments on an idle stream.
+HEARTBEAT_INTERVAL = 15
+# Seconds between database catch-up reads on an open stream.
+RESYNC_INTERVAL = 60
+# Reconnect delay advertised to EventSource clients, in milliseconds.
+RETRY_MS = 5000
+# Reconnect delay after a WSGI snapshot, which closes straight away: the
+# polling interval of live.js, so such clients cost no more than polling.
+POLL_INTERVAL_MS = 15000
+
+
+class Broker:
+    def __init__(self):
+        self._subscribers = {}
+        self._lock = threading.Lock()
+
+    def subscribe(self, ref_code):
+        queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+        entry = (asyncio.get_running_loop(), queue)
+        with self._lock:
+            self._subscribers.setdefault(ref_code, set()).add(entry)
+        return entry
+
+    def unsubscribe(self, ref_code, entry):
+        with self._lock:
+            subscribers = self._subscribers.get(ref_code)
+            if subscribers is not None:
+                subscribers.discard(entry)
+                if not subscribers:
+                    del self._subscribers[ref_code]
+
+    def subscriber_count(self, ref_code=None):
+        with self._lock:
+            if ref_code is not None:
+                return len(self._subscribers.get(ref_code, ()))
+            return sum(len(s) for s in self._subscribers.values())
+
+    def publish(self, ref_code, event):
+        with self._lock:
+            subscribers = list(self._subscribers.get(ref_code, ()))
+        for loop, queue in subscribers:
+            try:
+                loop.call_soon_threadsafe(_offer, queue, event)
+            except RuntimeError:
+                # Event loop already closed; the stream is going away.
+                pass
+
+
+def _offer(queue, event):
+    try:
+        queue.put_nowait(event)
+    except asyncio.QueueFull:
+        # The stream will pick the event up from the database on resync.
+        pass
+
+
+broker = Broker()
+
+
+def serialize_message(msg):
+    return {
+        'id': msg.pk,
+        'sender': msg.sender,
+        'content': msg.content,
+        'timestamp': msg.timestamp.isoformat(),
+        'display_time': date_format(timezone.localtime(msg.timestamp), 'd M, H:i'),
+    }
+
+
+def publish_message(ref_code, msg):
+    event = {'type': 'message', 'message': serialize_message(msg)}
+    transaction.on_commit(lambda: broker.publish(ref_code, event))
+
+
+def publish_status(ref_code, processed):
+    event = {'type': 'status', 'processed': processed}
+    transaction.on_commit(lambda: broker.publish(ref_code, event))
+
+
+# ── Server-Sent Events ────────────────────────────────────────────────────────
+
+def sse(event, event_id=None):
+    lines = [] if event_id is None else [f'id: {event_id}']
+    lines.append(f"event: {event['type']}")
+    lines.append(f'data: {json.dumps(event)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def new_messages(request_id, after):
+    return [
+        serialize_message(m)
+        for m in IFMISRequestMessage.objects.filter(request_id=request_id, pk__gt=after).order_by('pk')
+    ]
+
+
+def snapshot_events(request_id, processed, after):
+    """The whole stream on WSGI: the catch-up part, then the client reconnects."""
+    yield f'retry: {POLL_INTERVAL_MS}\n\n'
+    yield sse({'type': 'status', 'processed': processed})
+    for message in new_messages(request_id, after):
+        yield sse({'type': 'message', 'message': message}, message['id'])
+
+
+async def event_stream(request_id, ref_code, processed, after):
+    """
+    Async SSE body for one reference code: catch-up from ``after``, then live
+    events from the broker, keep-alives, and periodic database resyncs.
+    """
+    loop = asyncio.get_running_loop()
+    entry = broker.subscribe(ref_code)
+    queue = entry[1]
+    try:
+        # Subscribe before the catch-up read so nothing falls in between.
+        yield f'retry: {RETRY_MS}\n\n'
+        yield sse({'type': 'status', 'processed': processed})
+        sent = set()
+        floor = after
+        for message in await sync_to_async(new_messages)(request_id, after):
+            sent.add(message['id'])
+            yield sse({'type': 'message', 'message': message}, message['id'])
+
+        next_resync = loop.time() + RESYNC_INTERVAL
+        while True:
+            timeout = max(min(HEARTBEAT_INTERVAL, next_resync - loop.time()), 0)
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if loop.time() < next_resync:
+                    yield ': keep-alive\n\n'
+                    continue
+                next_resync = loop.time() + RESYNC_INTERVAL
+                state = await IFMISResetRequest.objects.filter(pk=request_id).values_list('processed', flat=True).afirst()
+                if state is None:
+                    yield sse({'type': 'deleted'})
+                    return
+                if state != processed:
+                    processed = state
+                    yield sse({'type': 'status', 'processed': processed})
+                # Re-read from the last resync point; ``sent`` drops anything
+                # already delivered live, including out-of-order commits.
+                for message in await sync_to_async(new_messages)(request_id, floor):
+                    if message['id'] not in sent:
+                        sent.add(message['id'])
+                        yield sse({'type': 'message', 'message': message}, message['id'])
+                if sent:
+                    floor = max(sent)
+                    sent = {floor}
+                continue
+
+            if event['type'] == 'message':
+                message = event['message']
+                if message['id'] in sent or message['id'] <= floor:
+                    continue
+                sent.add(message['id'])
+                yield sse(event, message['id'])
+            elif event['type'] == 'status' and event['processed'] != processed:
+                processed = event['processed']
+                yield sse(event)
+    finally:
+        broker.unsubscribe(ref_code, entry)
@@ -0,0 +1,29 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import audit_archive
+
+
+class Command(BaseCommand):
+    help = 'Move old AuditLog entries into compressed monthly archive segments.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than-days', type=int, default=settings.AUDIT_ARCHIVE_AFTER_DAYS,
+                            help='Archive entries older than this many days.')
+        parser.add_argument('--chunk-size', type=int, default=1000,
+                            help='Entries moved per transaction.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only report how many entries would be archived.')
+
+    def handle(self, *args, **options):
+        count = audit_archive.archive(
+            older_than_days=options['older_than_days'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        if options['dry_run']:
+            self.stdout.write(f"{count} audit entr{'y' if count == 1 else 'ies'} would be archived.")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {count} audit entr{'y' if count == 1 else 'ies'} to {settings.AUDIT_ARCHIVE_DIR}."
+            ))
@@ -0,0 +1,148 @@
+import json
+import platform
+import tempfile
+import time
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from django.test.utils import (
+    override_settings, setup_databases, setup_test_environment, teardown_databases, teardown_test_environment,
+)
+from django.utils import timezone
+
+from core import audit, benchmark, search
+
+
+class Command(BaseCommand):
+    help = (
+        'Seed a test database with synthetic requests, messages and audit entries and '
+        'benchmark the public and staff views (latency, queries, peak memory).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help='Data set sizes (rows per table) to benchmark, smallest first.')
+        parser.add_argument('--iterations', type=int, default=50, help='Timed requests per scenario.')
+        parser.add_argument('--warmup', type=int, default=5, help='Untimed requests per scenario.')
+        parser.add_argument('--memory-iterations', type=int, default=5,
+                            help='Requests per scenario traced for peak memory.')
+        parser.add_argument('--scenario', action='append', dest='scenarios',
+                            help='Only run this scenario (repeatable).')
+        parser.add_argument('--seed', type=int, default=0, help='Random seed for the data and request mix.')
+        parser.add_argument('--output', help='Write the results as a JSON baseline to this file.')
+        parser.add_argument('--compare', help='Compare the results with this JSON baseline.')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Relative latency/memory growth reported as a regression (default 0.2).')
+        parser.add_argument('--keepdb', action='store_true',
+                            help='Keep the test database (and its seeded rows) for the next run.')
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options['sizes']))
+        if not sizes or sizes[0] < 1:
+            raise CommandError('--sizes must be positive.')
+        if options['iterations'] < 1:
+            raise CommandError('--iterations must be at least 1.')
+        baseline = None
+        if options['compare']:
+            try:
+                with open(options['compare']) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'Cannot read baseline {options["compare"]}: {exc}')
+
+        setup_test_environment()
+        # Point every connection (threads read the same settings) at its test
+        # database before anything can open one, so no query, however early
+        # or late, reaches or creates the configured database.
+        for conn in connections.all():
+            conn.close()
+            test_name = conn.creation._get_test_db_name()
+            # Pinned, so setup_databases derives the same name again.
+            conn.settings_dict['TEST']['NAME'] = conn.settings_dict['NAME'] = test_name
+        old_config = setup_databases(verbosity=0, interactive=False, keepdb=options['keepdb'])
+        search.reset_backend_cache()
+        try:
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                MEDIA_ROOT=media_root,
+                PREVIEW_CACHE_DIR=f'{media_root}/previews',
+                AUDIT_ARCHIVE_DIR=f'{media_root}/audit_archive',
+                # Totals are flushed at exit, after this override is gone.
+                METRICS_ENABLED=False,
+            ):
+                result = self.run_benchmarks(sizes, options)
+        finally:
+            audit.flush()
+            teardown_databases(old_config, verbosity=0, keepdb=options['keepdb'])
+            teardown_test_environment()
+
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(result, f, indent=2, sort_keys=True)
+            self.stdout.write(f"Baseline written to {options['output']}.")
+
+        if baseline is not None:
+            self.report_comparison(baseline, result, options['threshold'])
+
+    def run_benchmarks(self, sizes, options):
+        result = {
+            'version': 1,
+            'generated_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'seed': options['seed'],
+            'iterations': options['iterations'],
+            'sizes': {},
+        }
+        for size in sizes:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'{size:,} rows'))
+            started = time.perf_counter()
+            added = benchmark.seed(size, options['seed'], progress=self.seed_progress)
+            seed_seconds = time.perf_counter() - started
+            self.stdout.write(f'Seeded {added:,} request(s) in {seed_seconds:.1f}s.')
+
+            scenarios = benchmark.run_scenarios(
+                size,
+                iterations=options['iterations'],
+                warmup=options['warmup'],
+                memory_iterations=options['memory_iterations'],
+                only=options['scenarios'],
+                seed_value=options['seed'],
+            )
+            result['sizes'][str(size)] = {'seed_seconds': round(seed_seconds, 1), 'scenarios': scenarios}
+            self.report(scenarios)
+        return result
+
+    def seed_progress(self, done):
+        if done % 100_000 == 0:
+            self.stdout.write(f'  {done:,} seeded')
+
+    def report(self, scenarios):
+        self.stdout.write(
+            f"{'scenario':<22} {'p50 ms':>9} {'p99 ms':>9} {'queries':>8} {'query ms':>9} {'peak KiB':>9} {'errors':>7}"
+        )
+        for name, m in scenarios.items():
+            line = (
+                f"{name:<22} {m['p50_ms']:>9.2f} {m['p99_ms']:>9.2f} {m['queries']:>8} "
+                f"{m['query_ms']:>9.2f} {m['peak_kib']:>9.1f} {m['errors']:>7}"
+            )
+            self.stdout.write(self.style.ERROR(line) if m['errors'] else line)
+
+    def report_comparison(self, baseline, result, threshold):
+        rows = benchmark.compare(baseline, result, threshold)
+        if not rows:
+            self.stdout.write('Nothing in common with the baseline to compare.')
+            return
+        regressions = 0
+        for size, name, metric, before, after, regressed in rows:
+            change = f'{(after - before) / before:+.0%}' if before else 'new'
+            line = f'{size:>8} {name:<22} {metric:<9} {before:>10} -> {after:<10} {change}'
+            if regressed:
+                regressions += 1
+                self.stdout.write(self.style.ERROR(line))
+            else:
+                self.stdout.write(line)
+        if regressions:
+            raise CommandError(f'{regressions} regression(s) against {baseline.get("generated_at", "the baseline")}.')
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline.'))
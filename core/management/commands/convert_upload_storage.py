@@ -0,0 +1,98 @@
+import hashlib
+import os
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.utils import timezone
+
+from core.models import IFMISResetRequest, UploadBlob
+from core.storage import hashed_name, is_hashed_name, upload_storage
+
+
+def file_digest(path):
+    sha256 = hashlib.sha256()
+    with open(path, 'rb') as fh:
+        for chunk in iter(lambda: fh.read(64 * 1024), b''):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+class Command(BaseCommand):
+    help = (
+        'Move uploads stored under their original names into content-addressed '
+        'storage, sharing one file between identical uploads.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be converted without changing anything.')
+        parser.add_argument('--recount', action='store_true',
+                            help='Rebuild reference counts from the requests table and remove unreferenced files.')
+
+    def handle(self, *args, **options):
+        storage = upload_storage()
+        dry_run = options['dry_run']
+        converted = shared = missing = saved_bytes = 0
+        seen = set()
+
+        legacy = (
+            IFMISResetRequest.objects.exclude(uploaded_file='')
+            .only('pk', 'uploaded_file', 'sha256').order_by('pk')
+        )
+        for req in legacy.iterator(chunk_size=500):
+            old_name = req.uploaded_file.name
+            if is_hashed_name(old_name):
+                continue
+            path = storage.path(old_name)
+            if not os.path.exists(path):
+                missing += 1
+                self.stderr.write(f"Request #{req.pk}: {old_name} is missing; skipped.")
+                continue
+
+            digest = file_digest(path)
+            new_name = hashed_name(old_name, digest)
+            already_stored = new_name in seen or storage.exists(new_name)
+            seen.add(new_name)
+            converted += 1
+            if already_stored:
+                shared += 1
+                saved_bytes += os.path.getsize(path)
+            if dry_run:
+                continue
+
+            with transaction.atomic():
+                storage.acquire(new_name)
+                if not storage.exists(new_name):
+                    os.replace(path, storage.path(new_name))
+                IFMISResetRequest.objects.filter(pk=req.pk).update(
+                    uploaded_file=new_name, sha256=digest, updated_at=timezone.now(),
+                )
+            # Legacy names belong to exactly one request.
+            if os.path.exists(path):
+                os.remove(path)
+
+        if options['recount'] and not dry_run:
+            self.recount()
+
+        prefix = '[dry run] ' if dry_run else ''
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Converted {converted} upload(s); {shared} duplicate(s) now share a stored file "
+            f"({saved_bytes} bytes freed); {missing} missing."
+        ))
+
+    def recount(self):
+        counts = dict(
+            IFMISResetRequest.objects.exclude(uploaded_file='')
+            .values_list('uploaded_file').annotate(n=Count('pk'))
+        )
+        with transaction.atomic():
+            UploadBlob.objects.exclude(name__in=counts).update(refcount=0)
+            for name, n in counts.items():
+                if is_hashed_name(name):
+                    UploadBlob.objects.update_or_create(name=name, defaults={'refcount': n})
+        unreferenced = list(UploadBlob.objects.filter(refcount__lte=0).values_list('name', flat=True))
+        removed = upload_storage().collect(unreferenced)
+        self.stdout.write(
+            f"Recounted references for {len(counts)} stored file(s); removed {len(removed)} unreferenced."
+        )
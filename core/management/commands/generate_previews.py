@@ -0,0 +1,22 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core import previews
+from core.models import IFMISResetRequest
+
+
+class Command(BaseCommand):
+    help = 'Render missing document previews for existing uploads.'
+
+    def handle(self, *args, **options):
+        names = sorted(set(
+            IFMISResetRequest.objects.exclude(uploaded_file='').values_list('uploaded_file', flat=True)
+        ))
+        todo = [n for n in names if previews.can_render(n) and previews.cached_preview(n) is None]
+        with ThreadPoolExecutor(max_workers=settings.PREVIEW_WORKERS) as pool:
+            rendered = sum(1 for path in pool.map(previews.render, todo) if path)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {rendered} of {len(todo)} missing preview(s) for {len(names)} stored upload(s)."
+        ))
@@ -0,0 +1,52 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core import retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete requests processed more than --days days ago, with their messages and uploads. '
+        'Resumes an interrupted purge first; writes one audit entry per run.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.REQUEST_RETENTION_DAYS,
+                            help='Retention window in days (default REQUEST_RETENTION_DAYS).')
+        parser.add_argument('--chunk-size', type=int, default=settings.BULK_DELETE_CHUNK_SIZE,
+                            help='Requests deleted per transaction (default BULK_DELETE_CHUNK_SIZE).')
+        parser.add_argument('--file-workers', type=int, default=settings.BULK_DELETE_FILE_WORKERS,
+                            help='Threads unlinking files (default BULK_DELETE_FILE_WORKERS).')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Report what would be removed without changing anything.')
+
+    def handle(self, *args, **options):
+        days = options['days']
+        if days < 1:
+            raise CommandError('--days must be at least 1.')
+        if options['chunk_size'] < 1 or options['file_workers'] < 1:
+            raise CommandError('--chunk-size and --file-workers must be at least 1.')
+
+        if options['dry_run']:
+            cutoff = retention.cutoff_for(days)
+            found = retention.estimate(cutoff)
+            self.stdout.write(
+                f"Would purge {found['requests']} request(s) processed before {cutoff:%Y-%m-%d %H:%M} "
+                f"and remove {found['files']} file(s), {retention.size_label(found['bytes'])}."
+            )
+            return
+
+        try:
+            result = retention.purge(days, chunk_size=options['chunk_size'], file_workers=options['file_workers'])
+        except retention.PurgeInProgress as exc:
+            raise CommandError(str(exc))
+
+        for job in result['failed']:
+            self.stdout.write(self.style.ERROR(f"Job #{job.pk} failed: {job.error}"))
+        line = (
+            f"Purged {result['requests']} request(s) processed before {result['cutoff']:%Y-%m-%d %H:%M}; "
+            f"removed {result['files']} file(s), {retention.size_label(result['bytes'])}."
+        )
+        if result['failed']:
+            raise CommandError(f"{line} Rerun to resume the failed job(s).")
+        self.stdout.write(self.style.SUCCESS(line))
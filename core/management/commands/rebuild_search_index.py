@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from core.search import rebuild_index, search_backend
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the staff dashboard search index from IFMISResetRequest.'
+
+    def handle(self, *args, **options):
+        count = rebuild_index()
+        self.stdout.write(self.style.SUCCESS(
+            f'Search index rebuilt ({search_backend() or "icontains fallback"}): {count} request(s).'
+        ))
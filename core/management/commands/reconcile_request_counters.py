@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from core.counters import discrepancies, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Check the dashboard request counters against the requests table and rebuild them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true',
+                            help='Only report counters that are out of step; change nothing.')
+
+    def handle(self, *args, **options):
+        diffs = discrepancies()
+        for (day, department, processed), (stored, actual) in sorted(diffs.items(), key=str):
+            status = 'processed' if processed else 'pending'
+            self.stdout.write(f"{day} {department} {status}: stored {stored}, actual {actual}")
+
+        if options['check']:
+            self.stdout.write(f"{len(diffs)} counter(s) out of step.")
+            return
+        rows = rebuild()
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {rows} counter row(s); {len(diffs)} had drifted."
+        ))
@@ -0,0 +1,37 @@
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.analytics import backfill_processed_at, rollup_day
+
+
+class Command(BaseCommand):
+    help = 'Compute the daily turnaround rollups (run nightly; defaults to yesterday).'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', help='Roll up this day (YYYY-MM-DD) instead of yesterday.')
+        parser.add_argument('--days', type=int, default=1,
+                            help='Number of days to roll up, ending with --date or yesterday.')
+        parser.add_argument('--backfill-processed-at', action='store_true',
+                            help='First fill missing processed_at values from the audit log, including the archive.')
+
+    def handle(self, *args, **options):
+        if options['date']:
+            try:
+                last = date.fromisoformat(options['date'])
+            except ValueError:
+                raise CommandError('--date must be YYYY-MM-DD.')
+        else:
+            last = date.today() - timedelta(days=1)
+        if options['days'] < 1:
+            raise CommandError('--days must be at least 1.')
+
+        if options['backfill_processed_at']:
+            filled = backfill_processed_at(include_archive=True)
+            self.stdout.write(f"Backfilled processed_at on {filled} request(s).")
+
+        for offset in range(options['days'] - 1, -1, -1):
+            day = last - timedelta(days=offset)
+            rows = rollup_day(day)
+            self.stdout.write(f"{day}: {rows} rollup row(s).")
+        self.stdout.write(self.style.SUCCESS('Turnaround rollup complete.'))
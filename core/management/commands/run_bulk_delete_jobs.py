@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from core.bulkdelete import resumable_jobs, run_job
+from core.models import BulkDeleteJob
+
+
+class Command(BaseCommand):
+    help = 'Run or resume pending and interrupted bulk delete jobs.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retry-failed', action='store_true',
+                            help='Also retry jobs that previously failed.')
+
+    def handle(self, *args, **options):
+        job_ids = list(resumable_jobs().values_list('pk', flat=True))
+        if options['retry_failed']:
+            job_ids += list(
+                BulkDeleteJob.objects.filter(status=BulkDeleteJob.STATUS_FAILED, purge_before__isnull=True)
+                .values_list('pk', flat=True)
+            )
+
+        for job_id in job_ids:
+            job = run_job(job_id)
+            if job is None:
+                self.stdout.write(f"Job #{job_id} is being run by another worker; skipped.")
+            elif job.status == BulkDeleteJob.STATUS_DONE:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Job #{job.pk}: deleted {job.deleted} request(s), removed {job.files_removed} file(s)."
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"Job #{job.pk} failed: {job.error}"))
+        if not job_ids:
+            self.stdout.write("No bulk delete jobs to run.")
@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from core.outbox import requeue_dead, send_queued
+
+
+class Command(BaseCommand):
+    help = 'Deliver queued notification emails from the OutboundEmail outbox.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=settings.EMAIL_OUTBOX_BATCH_SIZE,
+                            help='Messages sent per SMTP connection.')
+        parser.add_argument('--loop', action='store_true',
+                            help='Keep running, polling the outbox every --interval seconds.')
+        parser.add_argument('--interval', type=float, default=5.0,
+                            help='Seconds to sleep when the outbox is empty (with --loop).')
+        parser.add_argument('--requeue-dead', action='store_true',
+                            help='Move dead-lettered messages back to the queue first.')
+
+    def handle(self, *args, **options):
+        if options['requeue_dead']:
+            self.stdout.write(f"Requeued {requeue_dead()} dead-lettered message(s).")
+
+        while True:
+            sent, failed = send_queued(batch_size=options['batch_size'])
+            if sent or failed:
+                self.stdout.write(f"Sent {sent}, failed {failed}.")
+            if not options['loop']:
+                # Drain everything that is currently due, then exit.
+                if sent or failed:
+                    continue
+                break
+            if not (sent or failed):
+                time.sleep(options['interval'])
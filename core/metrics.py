@@ -0,0 +1,366 @@
+"""
+Request, rate limiter, cache and email metrics in Prometheus text format.
+
+Every process keeps its counters and histograms in memory (a dict update
+under a lock per observation) and periodically writes a snapshot of its
+cumulative totals to its own file in ``METRICS_DIR``: at most every
+``METRICS_FLUSH_INTERVAL`` seconds at the end of a request or an outbox batch,
+and at exit. The staff ``/staff/metrics/`` endpoint sums the files of every
+process, so web workers and the ``send_queued_mail`` worker are reported
+together without a shared server.
+
+When a process exits, its totals are folded into one ``exited.json`` and its
+own file is removed; the files of processes that died without doing so are
+folded in by the next scrape. The directory therefore holds one file per
+live process plus one, and the totals stay monotonic. ``METRICS_DIR`` must
+not be shared between hosts, since liveness is checked by process id.
+Emptying it resets the totals, which Prometheus handles like any counter
+reset.
+
+``MetricsMiddleware`` records, per URL name, a latency histogram, responses
+by status class and the number and time of database queries. The latency of
+a streaming response covers producing the response object, not sending the
+body.
+"""
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: merges are not locked against each other.
+    fcntl = None
+
+from django.conf import settings
+from django.db import connection
+from django.utils.deprecation import MiddlewareMixin
+
+
+logger = logging.getLogger(__name__)
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+COUNTER = 'counter'
+HISTOGRAM = 'histogram'
+
+EXITED_FILE = 'exited.json'
+LOCK_FILE = '.lock'
+
+METRICS = {
+    'ifmis_http_request_duration_seconds': (HISTOGRAM, 'Time to produce a response, by URL name.'),
+    'ifmis_http_responses_total': (COUNTER, 'Responses by URL name and status class.'),
+    'ifmis_db_queries_total': (COUNTER, 'Database queries run while handling requests, by URL name.'),
+    'ifmis_db_query_seconds_total': (COUNTER, 'Time spent in database queries, by URL name.'),
+    'ifmis_rate_limit_total': (COUNTER, 'Rate limited requests by policy and result (allowed/limited).'),
+    'ifmis_track_cache_total': (COUNTER, 'Track page cache lookups by result (hit/not_modified/miss).'),
+    'ifmis_emails_total': (COUNTER, 'Outbox emails by outcome (queued/sent/retry/dead).'),
+}
+
+
+class QueryTimer:
+    """``connection.execute_wrapper`` that counts and times queries."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.seconds += time.perf_counter() - started
+
+
+# ── In-process registry ───────────────────────────────────────────────────────
+
+class Registry:
+    def __init__(self):
+        self.counters = {}
+        # (name, labels) -> [bucket counts..., +Inf count, sum]
+        self.histograms = {}
+        self._lock = threading.Lock()
+
+    def inc(self, name, labels=(), value=1):
+        key = (name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, labels, value):
+        key = (name, labels)
+        with self._lock:
+            series = self.histograms.get(key)
+            if series is None:
+                series = self.histograms[key] = [0] * (len(DURATION_BUCKETS) + 1) + [0.0]
+            series[bisect.bisect_left(DURATION_BUCKETS, value)] += 1
+            series[-1] += value
+
+    def __bool__(self):
+        return bool(self.counters or self.histograms)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), list(series)] for (name, labels), series in self.histograms.items()],
+            }
+
+
+def _new_process_file():
+    return f'{os.getpid()}-{uuid.uuid4().hex[:8]}.json'
+
+
+_registry = Registry()
+_process_file = _new_process_file()
+_last_flush = time.monotonic()
+_flush_lock = threading.Lock()
+
+
+def _after_fork():
+    # A forked worker (e.g. gunicorn --preload) counts from zero in its own
+    # file rather than sharing the parent's.
+    global _registry, _process_file, _last_flush, _flush_lock
+    _registry = Registry()
+    _process_file = _new_process_file()
+    _last_flush = time.monotonic()
+    _flush_lock = threading.Lock()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, value=1, **labels):
+    if settings.METRICS_ENABLED:
+        _registry.inc(name, _labels(labels), value)
+
+
+def observe(name, value, **labels):
+    if settings.METRICS_ENABLED:
+        _registry.observe(name, _labels(labels), value)
+
+
+# ── Shared store ──────────────────────────────────────────────────────────────
+
+def _write_json(path, data):
+    tmp = f'{path}.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp, path)
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+@contextmanager
+def _store_lock(directory):
+    """Serialise merges and reads of the shared files across processes."""
+    with open(os.path.join(directory, LOCK_FILE), 'a') as f:
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def flush():
+    """Write this process's totals to its file in ``METRICS_DIR``."""
+    global _last_flush
+    if not settings.METRICS_ENABLED or not _registry:
+        return
+    with _flush_lock:
+        directory = settings.METRICS_DIR
+        os.makedirs(directory, exist_ok=True)
+        _write_json(os.path.join(directory, _process_file), _registry.snapshot())
+        _last_flush = time.monotonic()
+
+
+def maybe_flush():
+    if time.monotonic() - _last_flush >= settings.METRICS_FLUSH_INTERVAL:
+        try:
+            flush()
+        except OSError:
+            logger.exception('Could not write metrics to %s', settings.METRICS_DIR)
+
+
+def _accumulate(counters, histograms, data):
+    for name, labels, value in data.get('counters', []):
+        key = (name, tuple(map(tuple, labels)))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, series in data.get('histograms', []):
+        key = (name, tuple(map(tuple, labels)))
+        if len(series) != len(DURATION_BUCKETS) + 2:
+            continue  # written with other buckets
+        merged = histograms.setdefault(key, [0] * len(series))
+        histograms[key] = [a + b for a, b in zip(merged, series)]
+
+
+def _serialise(counters, histograms):
+    return {
+        'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+        'histograms': [[name, list(labels), series] for (name, labels), series in histograms.items()],
+    }
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, but belongs to another user
+    return True
+
+
+def _retire(directory, filenames):
+    """Fold ``filenames`` into ``EXITED_FILE`` and remove them. Hold the store lock."""
+    if not filenames:
+        return
+    counters, histograms = {}, {}
+    exited = os.path.join(directory, EXITED_FILE)
+    for path in [exited] + [os.path.join(directory, name) for name in filenames]:
+        _accumulate(counters, histograms, _read_json(path) or {})
+    _write_json(exited, _serialise(counters, histograms))
+    for name in filenames:
+        try:
+            os.remove(os.path.join(directory, name))
+        except FileNotFoundError:
+            pass
+
+
+def _dead_process_files(filenames):
+    dead = []
+    for name in filenames:
+        pid = name.split('-', 1)[0]
+        if name.endswith('.json') and pid.isdigit() and not _pid_alive(int(pid)):
+            dead.append(name)
+    return dead
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        if not settings.METRICS_ENABLED or not _registry:
+            return
+        flush()
+        with _store_lock(settings.METRICS_DIR):
+            _retire(settings.METRICS_DIR, [_process_file])
+    except Exception:
+        logger.exception('Could not write metrics to %s at exit', settings.METRICS_DIR)
+
+
+def collect():
+    """Totals of every process, as ``(counters, histograms)`` dicts."""
+    try:
+        flush()
+    except OSError:
+        # Report what is already on disk rather than failing the scrape.
+        logger.exception('Could not write metrics to %s', settings.METRICS_DIR)
+    counters, histograms = {}, {}
+    directory = settings.METRICS_DIR
+    if not os.path.isdir(directory):
+        return counters, histograms
+    try:
+        with _store_lock(directory):
+            _retire(directory, _dead_process_files(os.listdir(directory)))
+            for name in os.listdir(directory):
+                if name.endswith('.json'):
+                    _accumulate(counters, histograms, _read_json(os.path.join(directory, name)) or {})
+    except OSError:
+        logger.exception('Could not read metrics from %s', directory)
+    return counters, histograms
+
+
+# ── Prometheus text format ────────────────────────────────────────────────────
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def render():
+    counters, histograms = collect()
+    lines = []
+    for name, (kind, help_text) in METRICS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        if kind == COUNTER:
+            for (metric, labels), value in sorted(counters.items()):
+                if metric == name:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+            continue
+        for (metric, labels), series in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(DURATION_BUCKETS, series):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            cumulative += series[len(DURATION_BUCKETS)]
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {cumulative}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {_format_value(series[-1])}')
+            lines.append(f'{name}_count{_format_labels(labels)} {cumulative}')
+    return '\n'.join(lines) + '\n'
+
+
+# ── Middleware ────────────────────────────────────────────────────────────────
+
+def status_class(status_code):
+    return f'{status_code // 100}xx'
+
+
+class MetricsMiddleware(MiddlewareMixin):
+    """Time every request and count its database queries. Should come first."""
+
+    def process_request(self, request):
+        if not settings.METRICS_ENABLED:
+            return
+        request._metrics_timer = QueryTimer()
+        request._metrics_started = time.perf_counter()
+        connection.execute_wrappers.append(request._metrics_timer)
+
+    def process_response(self, request, response):
+        timer = getattr(request, '_metrics_timer', None)
+        if timer is None:
+            return response
+        elapsed = time.perf_counter() - request._metrics_started
+        if timer in connection.execute_wrappers:
+            connection.execute_wrappers.remove(timer)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (match.view_name if match else '') or 'unmatched'
+        observe('ifmis_http_request_duration_seconds', elapsed, view=view, method=request.method)
+        inc('ifmis_http_responses_total', view=view, status=status_class(response.status_code))
+        if timer.count:
+            inc('ifmis_db_queries_total', timer.count, view=view)
+            inc('ifmis_db_query_seconds_total', timer.seconds, view=view)
+        maybe_flush()
+        return response
@@ -0,0 +1,53 @@
+from django.db import migrations, transaction
+from django.db.utils import OperationalError
+
+
+SEARCH_TABLE = 'core_ifmisresetrequest_search'
+REQUEST_TABLE = 'core_ifmisresetrequest'
+COLUMNS = ('full_name', 'department', 'email', 'reference_code')
+
+
+def create_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    columns = ', '.join(COLUMNS)
+
+    if connection.vendor == 'sqlite':
+        # SQLite builds without FTS5 keep working on the icontains fallback.
+        try:
+            with transaction.atomic(using=connection.alias):
+                schema_editor.execute(
+                    f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({columns}, prefix='2 3')"
+                )
+        except OperationalError:
+            return
+        schema_editor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {REQUEST_TABLE}'
+        )
+
+    elif connection.vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        for column in COLUMNS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS {REQUEST_TABLE}_{column}_trgm '
+                f'ON {REQUEST_TABLE} USING gin (UPPER({column}::text) gin_trgm_ops)'
+            )
+
+
+def drop_search_index(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+    elif connection.vendor == 'postgresql':
+        for column in COLUMNS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS {REQUEST_TABLE}_{column}_trgm')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0004_auditlog'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
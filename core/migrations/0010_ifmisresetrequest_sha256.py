@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 02:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_bulkdeletejob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ifmisresetrequest',
+            name='sha256',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+    ]
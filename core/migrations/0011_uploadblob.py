@@ -0,0 +1,28 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:10
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_ifmisresetrequest_sha256'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='UploadBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, unique=True)),
+                ('refcount', models.IntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='ifmisresetrequest',
+            name='uploaded_file',
+            field=models.FileField(storage=core.storage.upload_storage, upload_to='uploads/'),
+        ),
+    ]
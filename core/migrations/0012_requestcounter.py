@@ -0,0 +1,47 @@
+# Generated by Django 6.0.2 on 2026-10-17 03:55
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+
+def populate_counters(apps, schema_editor):
+    # A frozen copy of core.counters.rebuild at this point in the schema.
+    IFMISResetRequest = apps.get_model('core', 'IFMISResetRequest')
+    RequestCounter = apps.get_model('core', 'RequestCounter')
+    rows = (
+        IFMISResetRequest.objects
+        .annotate(day=TruncDate('submitted_at', tzinfo=timezone.get_current_timezone()))
+        .values('day', 'department', 'processed')
+        .annotate(n=Count('pk'))
+        .order_by()
+    )
+    RequestCounter.objects.bulk_create([
+        RequestCounter(day=row['day'], department=row['department'], processed=row['processed'], count=row['n'])
+        for row in rows
+    ], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_uploadblob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RequestCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('department', models.CharField(max_length=255)),
+                ('processed', models.BooleanField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'department', 'processed'), name='core_requestcounter_key_uniq')],
+            },
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
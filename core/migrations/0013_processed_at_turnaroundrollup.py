@@ -0,0 +1,82 @@
+# Generated by Django 6.0.2 on 2026-10-17 04:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def backfill_processed_at(apps, schema_editor):
+    # A frozen copy of core.analytics.backfill_processed_at (live log only).
+    IFMISResetRequest = apps.get_model('core', 'IFMISResetRequest')
+    AuditLog = apps.get_model('core', 'AuditLog')
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+
+    # The earliest MARK_PROCESSED after the last MARK_PENDING of each request.
+    completed = {}
+    events = (
+        AuditLog.objects.filter(action__in=['MARK_PROCESSED', 'MARK_PENDING'])
+        .order_by('timestamp', 'id')
+        .values_list('ref_code', 'action', 'timestamp', 'admin_id')
+    )
+    for ref_code, action, timestamp, admin_id in events.iterator(chunk_size=2000):
+        if not ref_code:
+            continue
+        if action == 'MARK_PENDING':
+            completed.pop(ref_code, None)
+        else:
+            completed.setdefault(ref_code, (timestamp, admin_id))
+
+    known_admins = set(User.objects.values_list('pk', flat=True))
+    missing = (
+        IFMISResetRequest.objects.filter(processed=True, processed_at__isnull=True)
+        .values_list('pk', 'reference_code')
+    )
+    for pk, ref_code in missing.iterator(chunk_size=500):
+        if ref_code not in completed:
+            continue
+        timestamp, admin_id = completed[ref_code]
+        if admin_id not in known_admins:
+            admin_id = None
+        IFMISResetRequest.objects.filter(pk=pk).update(processed_at=timestamp, processed_by_id=admin_id)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_requestcounter'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ifmisresetrequest',
+            name='processed_at',
+            field=models.DateTimeField(blank=True, db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='ifmisresetrequest',
+            name='processed_by',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='processed_requests', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.CreateModel(
+            name='TurnaroundRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('dimension', models.CharField(choices=[('department', 'Department'), ('admin', 'Admin')], max_length=20)),
+                ('key', models.CharField(max_length=255)),
+                ('label', models.CharField(max_length=255)),
+                ('count', models.PositiveIntegerField()),
+                ('p50_seconds', models.FloatField()),
+                ('p90_seconds', models.FloatField()),
+                ('p99_seconds', models.FloatField()),
+                ('histogram', models.JSONField(default=list)),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['-day', 'dimension', 'label'],
+                'constraints': [models.UniqueConstraint(fields=('day', 'dimension', 'key'), name='core_turnaround_key_uniq')],
+            },
+        ),
+        migrations.RunPython(backfill_processed_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 6.0.2 on 2026-10-17 05:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_processed_at_turnaroundrollup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('LOGIN', 'Logged In'), ('LOGOUT', 'Logged Out'), ('VIEW_REQUEST', 'Viewed Request'), ('MARK_PROCESSED', 'Marked as Processed'), ('MARK_PENDING', 'Reverted to Pending'), ('SEND_REPLY', 'Sent Reply'), ('DELETE_REQUEST', 'Deleted Request'), ('BULK_DELETE', 'Bulk Deleted Requests'), ('EXPORT_REQUESTS', 'Exported Requests')], max_length=30),
+        ),
+    ]
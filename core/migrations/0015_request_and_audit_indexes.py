@@ -0,0 +1,35 @@
+# Generated by Django 6.0.2 on 2026-10-17 05:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_auditlog_export_action'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['timestamp'], name='core_audit_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['ref_code', 'timestamp'], name='core_audit_ref_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='auditlog',
+            index=models.Index(fields=['admin', 'timestamp'], name='core_audit_admin_ts_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ifmisresetrequest',
+            index=models.Index(fields=['processed', 'submitted_at'], name='core_req_processed_sub_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='ifmisresetrequest',
+            index=models.Index(fields=['submitted_at', 'id'], name='core_req_submitted_idx'),
+        ),
+    ]
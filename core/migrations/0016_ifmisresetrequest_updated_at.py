@@ -0,0 +1,32 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:10
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+
+def initial_updated_at(apps, schema_editor):
+    # Best known time of the last change, rather than the migration time.
+    IFMISResetRequest = apps.get_model('core', 'IFMISResetRequest')
+    IFMISResetRequest.objects.update(updated_at=Coalesce('processed_at', 'submitted_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_request_and_audit_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ifmisresetrequest',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.RunPython(initial_updated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='ifmisresetrequest',
+            index=models.Index(fields=['updated_at', 'id'], name='core_req_updated_idx'),
+        ),
+    ]
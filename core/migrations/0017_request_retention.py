@@ -0,0 +1,34 @@
+# Generated by Django 6.0.2 on 2026-10-17 06:40
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_ifmisresetrequest_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bulkdeletejob',
+            name='bytes_removed',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='bulkdeletejob',
+            name='purge_before',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='auditlog',
+            name='action',
+            field=models.CharField(choices=[('LOGIN', 'Logged In'), ('LOGOUT', 'Logged Out'), ('VIEW_REQUEST', 'Viewed Request'), ('MARK_PROCESSED', 'Marked as Processed'), ('MARK_PENDING', 'Reverted to Pending'), ('SEND_REPLY', 'Sent Reply'), ('DELETE_REQUEST', 'Deleted Request'), ('BULK_DELETE', 'Bulk Deleted Requests'), ('EXPORT_REQUESTS', 'Exported Requests'), ('PURGE_REQUESTS', 'Purged Old Requests')], max_length=30),
+        ),
+        migrations.AddIndex(
+            model_name='ifmisresetrequest',
+            index=models.Index(fields=['processed', 'processed_at'], name='core_req_processed_at_idx'),
+        ),
+    ]
@@ -1,21 +1,74 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.utils import timezone
 from django.utils.crypto import get_random_string
 
+from .storage import upload_storage
+
+
+REFERENCE_CODE_LENGTH = 12
 
 class IFMISResetRequest(models.Model):
     full_name     = models.CharField(max_length=255)
     department    = models.CharField(max_length=255)
     email         = models.EmailField()
-    uploaded_file = models.FileField(upload_to='uploads/')
+    uploaded_file = models.FileField(upload_to='uploads/', storage=upload_storage)
     submitted_at  = models.DateTimeField(auto_now_add=True)
     processed     = models.BooleanField(default=False)
-    reference_code = models.CharField(max_length=12, unique=True, blank=True)
+    reference_code = models.CharField(max_length=REFERENCE_CODE_LENGTH, unique=True, blank=True)
+    # Hex SHA-256 of uploaded_file, computed while the upload streamed in.
+    sha256        = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    processed_at  = models.DateTimeField(null=True, blank=True, db_index=True)
+    processed_by  = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True,
+                                      related_name='processed_requests')
+    # Bumped on every save(); code using QuerySet.update() must set it too.
+    updated_at    = models.DateTimeField(auto_now=True)
 
     def save(self, *args, **kwargs):
         if not self.reference_code:
-            self.reference_code = get_random_string(12).upper()
-        super().save(*args, **kwargs)
+            self.reference_code = get_random_string(REFERENCE_CODE_LENGTH).upper()
+        # Atomic so the post_save counter updates (core.counters) commit or
+        # roll back together with the row.
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+
+    class Meta:
+        indexes = [
+            # Status tabs/KPIs filter on processed and order by submission.
+            models.Index(fields=['processed', 'submitted_at'], name='core_req_processed_sub_idx'),
+            # Date-range filters and keyset paging on (submitted_at, id).
+            models.Index(fields=['submitted_at', 'id'], name='core_req_submitted_idx'),
+            # API incremental sync (updated_since) pages on (updated_at, id).
+            models.Index(fields=['updated_at', 'id'], name='core_req_updated_idx'),
+            # Retention purge finds requests processed before a cutoff.
+            models.Index(fields=['processed', 'processed_at'], name='core_req_processed_at_idx'),
+        ]
+
+    def _set_processed(self, processed, user=None):
+        # The row is locked and re-read so that two staff processing the same
+        # request at once stamp, audit and email it only once.
+        with transaction.atomic():
+            current = type(self).objects.select_for_update().values_list('processed', flat=True).get(pk=self.pk)
+            if current == processed:
+                self.refresh_from_db(fields=['processed', 'processed_at', 'processed_by'])
+                return False
+            self.processed = processed
+            self.processed_at = timezone.now() if processed else None
+            self.processed_by = user if processed else None
+            self.save()
+        return True
+
+    def mark_processed(self, user):
+        """
+        Mark processed by ``user``. Returns False, changing nothing, if it
+        already was, so the first processing time (which turnaround is
+        measured from) is never restamped.
+        """
+        return self._set_processed(True, user)
+
+    def mark_pending(self):
+        """Revert to pending. Returns False if the request already was pending."""
+        return self._set_processed(False)
 
     def __str__(self):
         return f"{self.full_name} ({self.reference_code})"
@@ -49,6 +102,8 @@ class AuditLog(models.Model):
     ACTION_SEND_REPLY       = 'SEND_REPLY'
     ACTION_DELETE_REQUEST   = 'DELETE_REQUEST'
     ACTION_BULK_DELETE      = 'BULK_DELETE'
+    ACTION_EXPORT           = 'EXPORT_REQUESTS'
+    ACTION_PURGE_REQUESTS   = 'PURGE_REQUESTS'
 
     ACTION_CHOICES = [
         (ACTION_LOGIN,          'Logged In'),
@@ -59,6 +114,8 @@ class AuditLog(models.Model):
         (ACTION_SEND_REPLY,     'Sent Reply'),
         (ACTION_DELETE_REQUEST, 'Deleted Request'),
         (ACTION_BULK_DELETE,    'Bulk Deleted Requests'),
+        (ACTION_EXPORT,         'Exported Requests'),
+        (ACTION_PURGE_REQUESTS, 'Purged Old Requests'),
     ]
 
     admin        = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='audit_logs')
@@ -67,10 +124,17 @@ class AuditLog(models.Model):
     ref_code     = models.CharField(max_length=12, blank=True, null=True)
     detail       = models.TextField(blank=True)   # extra context e.g. message preview
     ip_address   = models.GenericIPAddressField(null=True, blank=True)
-    timestamp    = models.DateTimeField(auto_now_add=True)
+    # Set when the entry is created, not when it reaches the database, so
+    # entries buffered by core.audit keep their real time.
+    timestamp    = models.DateTimeField(default=timezone.now, editable=False)
 
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            models.Index(fields=['timestamp'], name='core_audit_ts_idx'),
+            models.Index(fields=['ref_code', 'timestamp'], name='core_audit_ref_ts_idx'),
+            models.Index(fields=['admin', 'timestamp'], name='core_audit_admin_ts_idx'),
+        ]
 
     def __str__(self):
         return f"[{self.timestamp:%Y-%m-%d %H:%M}] {self.admin} — {self.action} {self.ref_code or ''}"
@@ -82,4 +146,196 @@ class AuditLog(models.Model):
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        raise ValueError("AuditLog entries cannot be deleted.")
\ No newline at end of file
+        raise ValueError("AuditLog entries cannot be deleted.")
+
+    @classmethod
+    def bulk_append(cls, entries, batch_size=None):
+        """Insert new entries in as few statements as possible. Append-only."""
+        if any(entry.pk for entry in entries):
+            raise ValueError("AuditLog entries are immutable and cannot be updated.")
+        return cls.objects.bulk_create(entries, batch_size=batch_size)
+
+
+class OutboundEmail(models.Model):
+    """
+    Durable outbox for notification emails. Rows are written on the request
+    path and delivered in batches by ``core.outbox`` (see the
+    ``send_queued_mail`` management command).
+    """
+
+    STATUS_PENDING = 'PENDING'
+    STATUS_SENDING = 'SENDING'
+    STATUS_SENT    = 'SENT'
+    STATUS_DEAD    = 'DEAD'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENDING, 'Sending'),
+        (STATUS_SENT,    'Sent'),
+        (STATUS_DEAD,    'Dead-lettered'),
+    ]
+
+    subject         = models.CharField(max_length=255)
+    body            = models.TextField()
+    from_email      = models.CharField(max_length=255)
+    recipient       = models.EmailField()
+    status          = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts        = models.PositiveIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claim_token     = models.CharField(max_length=32, blank=True)
+    claimed_at      = models.DateTimeField(null=True, blank=True)
+    last_error      = models.TextField(blank=True)
+    created_at      = models.DateTimeField(auto_now_add=True)
+    sent_at         = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='core_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.status}: {self.subject} -> {self.recipient}"
+
+
+class RateLimitCounter(models.Model):
+    """
+    Per-key hit counter for one fixed window, shared by every worker process.
+    Used by ``core.ratelimit``'s database backend; increments are single
+    ``UPDATE ... SET count = count + 1`` statements, so they are atomic.
+    """
+
+    key        = models.CharField(max_length=200)
+    window     = models.BigIntegerField()   # window start, in periods since the epoch
+    count      = models.PositiveIntegerField(default=0)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'window'], name='core_ratelimit_key_window_uniq'),
+        ]
+        indexes = [
+            models.Index(fields=['expires_at'], name='core_ratelimit_expires_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.key}@{self.window}: {self.count}"
+
+
+class BulkDeleteJob(models.Model):
+    """
+    A resumable bulk deletion of requests (see ``core.bulkdelete``).
+
+    ``request_ids`` is the snapshot taken when the job was created and
+    ``position`` how far through it the job has got. ``pending_files`` holds
+    the uploads of the last deleted chunk until they are unlinked, so a crash
+    between the database delete and the unlink never orphans a file.
+    ``purge_before`` is set on jobs created by ``manage.py purge_requests``
+    (see ``core.retention``), which resumes them itself.
+    """
+
+    STATUS_PENDING = 'PENDING'
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_DONE    = 'DONE'
+    STATUS_FAILED  = 'FAILED'
+
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_DONE,    'Done'),
+        (STATUS_FAILED,  'Failed'),
+    ]
+
+    created_by    = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='bulk_delete_jobs')
+    created_at    = models.DateTimeField(auto_now_add=True)
+    updated_at    = models.DateTimeField(auto_now=True)
+    status        = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    request_ids   = models.JSONField(default=list)
+    position      = models.PositiveIntegerField(default=0)
+    deleted       = models.PositiveIntegerField(default=0)
+    files_removed = models.PositiveIntegerField(default=0)
+    bytes_removed = models.PositiveBigIntegerField(default=0)
+    pending_files = models.JSONField(default=list, blank=True)
+    purge_before  = models.DateTimeField(null=True, blank=True)
+    error         = models.TextField(blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Bulk delete #{self.pk} ({self.status}, {self.position}/{self.total})"
+
+    @property
+    def total(self):
+        return len(self.request_ids)
+
+
+class UploadBlob(models.Model):
+    """
+    Reference count for one content-addressed upload (see ``core.storage``).
+    A row at zero is kept until the file is collected, so the unlink and any
+    concurrent re-upload of the same content serialise on it.
+    """
+    name       = models.CharField(max_length=255, unique=True)
+    refcount   = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.name} ({self.refcount})"
+
+
+class RequestCounter(models.Model):
+    """
+    Number of requests submitted on ``day`` by ``department`` that are
+    currently pending or processed. Maintained by ``core.counters``.
+    """
+    day        = models.DateField()
+    department = models.CharField(max_length=255)
+    processed  = models.BooleanField()
+    count      = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'department', 'processed'],
+                                    name='core_requestcounter_key_uniq'),
+        ]
+
+    def __str__(self):
+        status = 'processed' if self.processed else 'pending'
+        return f"{self.day} {self.department} {status}: {self.count}"
+
+
+class TurnaroundRollup(models.Model):
+    """
+    Submission-to-processed turnaround for the requests processed on ``day``,
+    per department or per admin (``dimension``). Written nightly by
+    ``manage.py rollup_turnaround``; ``histogram`` holds counts per
+    ``core.analytics.BUCKET_EDGES`` bucket so ranges of days can be merged.
+    """
+    DIMENSION_DEPARTMENT = 'department'
+    DIMENSION_ADMIN      = 'admin'
+
+    DIMENSION_CHOICES = [
+        (DIMENSION_DEPARTMENT, 'Department'),
+        (DIMENSION_ADMIN,      'Admin'),
+    ]
+
+    day         = models.DateField()
+    dimension   = models.CharField(max_length=20, choices=DIMENSION_CHOICES)
+    key         = models.CharField(max_length=255)
+    label       = models.CharField(max_length=255)
+    count       = models.PositiveIntegerField()
+    p50_seconds = models.FloatField()
+    p90_seconds = models.FloatField()
+    p99_seconds = models.FloatField()
+    histogram   = models.JSONField(default=list)
+    created_at  = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ['-day', 'dimension', 'label']
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'dimension', 'key'], name='core_turnaround_key_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.dimension} {self.label}: p50 {self.p50_seconds:.0f}s"
@@ -0,0 +1,172 @@
+"""
+Outbound email queue.
+
+Views call ``queue_email`` (or ``queue_emails`` for a batch) which only
+INSERTs ``OutboundEmail`` rows, so a slow SMTP server never blocks a request.
+``send_queued`` claims due rows, delivers them over a single backend
+connection and reschedules failures with exponential backoff until
+``EMAIL_OUTBOX_MAX_ATTEMPTS`` is reached, after which the row is
+dead-lettered for manual inspection.
+
+With ``EMAIL_OUTBOX_EAGER`` on (the default for the console and locmem
+backends) queued mail is delivered right after the surrounding transaction
+commits, so development and tests need no worker.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.crypto import get_random_string
+
+from . import metrics
+from .models import OutboundEmail
+
+
+logger = logging.getLogger(__name__)
+
+# A worker that dies mid-batch leaves rows in SENDING; they become claimable
+# again after this long.
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+def queue_email(subject, body, recipients, from_email=None):
+    """Queue one message per recipient and return the created rows."""
+    return queue_emails([(subject, body, recipient) for recipient in recipients], from_email)
+
+
+def queue_emails(messages, from_email=None):
+    """Queue ``(subject, body, recipient)`` messages with one INSERT; returns the rows."""
+    from_email = from_email or settings.DEFAULT_FROM_EMAIL
+    emails = OutboundEmail.objects.bulk_create([
+        OutboundEmail(subject=subject, body=body, from_email=from_email, recipient=recipient)
+        for subject, body, recipient in messages
+    ])
+    if not emails:
+        return emails
+    metrics.inc('ifmis_emails_total', len(emails), outcome='queued')
+    if settings.EMAIL_OUTBOX_EAGER:
+        ids = [e.pk for e in emails]
+        transaction.on_commit(lambda: send_queued(batch_size=len(ids), ids=ids), robust=True)
+    return emails
+
+
+def retry_delay(attempts):
+    """Backoff before the next attempt: base * 2^(attempts-1), capped."""
+    delay = settings.EMAIL_OUTBOX_RETRY_BASE * (2 ** max(attempts - 1, 0))
+    return timedelta(seconds=min(delay, settings.EMAIL_OUTBOX_RETRY_MAX))
+
+
+def claim_batch(batch_size, ids=None):
+    """
+    Atomically claim up to ``batch_size`` due messages for this worker.
+
+    A single UPDATE stamps the rows with a random claim token, so two workers
+    can never pick up the same message.
+    """
+    now = timezone.now()
+    due = OutboundEmail.objects.filter(
+        Q(status=OutboundEmail.STATUS_PENDING, next_attempt_at__lte=now) |
+        Q(status=OutboundEmail.STATUS_SENDING, claimed_at__lt=now - CLAIM_TIMEOUT)
+    )
+    if ids is not None:
+        due = due.filter(pk__in=ids)
+    candidates = list(due.order_by('next_attempt_at', 'id').values_list('pk', flat=True)[:batch_size])
+    if not candidates:
+        return []
+
+    token = get_random_string(32)
+    due.filter(pk__in=candidates).update(
+        status=OutboundEmail.STATUS_SENDING, claim_token=token, claimed_at=now,
+    )
+    return list(OutboundEmail.objects.filter(claim_token=token, status=OutboundEmail.STATUS_SENDING))
+
+
+def _record_failure(email, error):
+    email.attempts += 1
+    email.last_error = str(error)[:2000]
+    email.claim_token = ''
+    if email.attempts >= settings.EMAIL_OUTBOX_MAX_ATTEMPTS:
+        email.status = OutboundEmail.STATUS_DEAD
+        metrics.inc('ifmis_emails_total', outcome='dead')
+        logger.error('Dead-lettered email %s to %s after %s attempts: %s',
+                     email.pk, email.recipient, email.attempts, error)
+    else:
+        email.status = OutboundEmail.STATUS_PENDING
+        metrics.inc('ifmis_emails_total', outcome='retry')
+        email.next_attempt_at = timezone.now() + retry_delay(email.attempts)
+        logger.warning('Email %s to %s failed (attempt %s), retrying at %s: %s',
+                       email.pk, email.recipient, email.attempts, email.next_attempt_at, error)
+    email.save(update_fields=['attempts', 'last_error', 'claim_token', 'status', 'next_attempt_at'])
+
+
+def deliver(emails, connection=None):
+    """
+    Send ``emails`` over one backend connection. Returns ``(sent, failed)``.
+    """
+    if not emails:
+        return 0, 0
+
+    connection = connection or get_connection(fail_silently=False)
+    sent_ids = []
+    failed = 0
+    try:
+        connection.open()
+        for email in emails:
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.body,
+                    from_email=email.from_email,
+                    to=[email.recipient],
+                    connection=connection,
+                ).send()
+            except Exception as exc:
+                failed += 1
+                _record_failure(email, exc)
+                # The SMTP session may be unusable after an error; start a
+                # fresh one for the rest of the batch.
+                try:
+                    connection.close()
+                    connection.open()
+                except Exception:
+                    pass
+            else:
+                sent_ids.append(email.pk)
+    except Exception as exc:
+        # Could not even connect: every unsent message in the batch failed.
+        done = set(sent_ids)
+        for email in emails:
+            if email.pk not in done and email.status == OutboundEmail.STATUS_SENDING:
+                failed += 1
+                _record_failure(email, exc)
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        if sent_ids:
+            OutboundEmail.objects.filter(pk__in=sent_ids).update(
+                status=OutboundEmail.STATUS_SENT, sent_at=timezone.now(), claim_token='',
+            )
+            metrics.inc('ifmis_emails_total', len(sent_ids), outcome='sent')
+        # The outbox worker has no requests to flush its metrics.
+        metrics.maybe_flush()
+
+    return len(sent_ids), failed
+
+
+def send_queued(batch_size=None, ids=None, connection=None):
+    """Claim and deliver one batch of due messages. Returns ``(sent, failed)``."""
+    batch_size = batch_size or settings.EMAIL_OUTBOX_BATCH_SIZE
+    return deliver(claim_batch(batch_size, ids=ids), connection=connection)
+
+
+def requeue_dead():
+    """Move dead-lettered messages back to the queue; returns the row count."""
+    return OutboundEmail.objects.filter(status=OutboundEmail.STATUS_DEAD).update(
+        status=OutboundEmail.STATUS_PENDING, attempts=0, next_attempt_at=timezone.now(),
+    )
@@ -0,0 +1,125 @@
+"""
+Keyset (cursor) pagination.
+
+Numbered pages cost an OFFSET scan that grows with the page number plus a
+COUNT(*) over the whole filtered set. Keyset pages instead seek past the last
+row seen using the ordering columns, so page 1000 costs the same as page 1.
+The ordering must end in a unique column (normally ``id``) so the cursor is
+unambiguous.
+"""
+import base64
+import json
+
+from django.db.models import Q
+
+
+class InvalidCursor(ValueError):
+    pass
+
+
+class KeysetPage:
+    """One page of results; iterable like a Django ``Page``."""
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    NEXT = 'n'
+    PREVIOUS = 'p'
+
+    def __init__(self, queryset, per_page, ordering=('-submitted_at', '-id')):
+        self.queryset = queryset
+        self.per_page = int(per_page)
+        self.ordering = tuple(ordering)
+        opts = queryset.model._meta
+        self._fields = []
+        for term in self.ordering:
+            name = term.lstrip('-')
+            field = opts.pk if name == 'pk' else opts.get_field(name)
+            self._fields.append((field.attname, field, term.startswith('-')))
+
+    # ── Cursor encoding ──────────────────────────────────────────────────────
+
+    def encode_cursor(self, obj, direction):
+        values = [field.value_to_string(obj) for _, field, _ in self._fields]
+        raw = json.dumps([direction, values], separators=(',', ':')).encode()
+        return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        try:
+            raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            direction, values = json.loads(raw)
+        except (ValueError, TypeError):
+            raise InvalidCursor(token)
+        if direction not in (self.NEXT, self.PREVIOUS) or len(values) != len(self._fields):
+            raise InvalidCursor(token)
+        try:
+            values = [field.to_python(v) for (_, field, _), v in zip(self._fields, values)]
+        except Exception:
+            raise InvalidCursor(token)
+        return direction, values
+
+    # ── Paging ───────────────────────────────────────────────────────────────
+
+    def _seek(self, values, forward):
+        """Rows strictly after (forward) or before the cursor row in ordering."""
+        condition = Q()
+        equal = {}
+        for (attname, _, descending), value in zip(self._fields, values):
+            lookup = 'lt' if descending == forward else 'gt'
+            condition |= Q(**equal, **{f'{attname}__{lookup}': value})
+            equal[attname] = value
+        return condition
+
+    def _reversed_ordering(self):
+        return [t[1:] if t.startswith('-') else f'-{t}' for t in self.ordering]
+
+    def page(self, cursor=None):
+        """Return a page; raises ``InvalidCursor`` on a malformed cursor."""
+        direction, values = (None, None) if not cursor else self.decode_cursor(cursor)
+
+        if direction == self.PREVIOUS:
+            qs = self.queryset.filter(self._seek(values, forward=False)).order_by(*self._reversed_ordering())
+            rows = list(qs[:self.per_page + 1])
+            has_previous = len(rows) > self.per_page
+            rows = rows[:self.per_page][::-1]
+            has_next = True
+        else:
+            qs = self.queryset
+            if direction == self.NEXT:
+                qs = qs.filter(self._seek(values, forward=True))
+            rows = list(qs.order_by(*self.ordering)[:self.per_page + 1])
+            has_next = len(rows) > self.per_page
+            rows = rows[:self.per_page]
+            has_previous = direction == self.NEXT
+
+        return KeysetPage(
+            rows,
+            next_cursor=self.encode_cursor(rows[-1], self.NEXT) if rows and has_next else None,
+            previous_cursor=self.encode_cursor(rows[0], self.PREVIOUS) if rows and has_previous else None,
+        )
+
+    def get_page(self, cursor=None):
+        """Like ``page()`` but falls back to the first page on a bad cursor."""
+        try:
+            return self.page(cursor)
+        except InvalidCursor:
+            return self.page(None)
@@ -0,0 +1,206 @@
+"""
+Small first-page previews of uploaded documents.
+
+Staff triage from the dashboard and detail page used to mean pulling each
+full scan through ``serve_uploaded_file``. Instead, a thumbnail (WebP when
+Pillow supports it, else PNG) is rendered for every upload on a small worker
+pool after the request that stored it has committed, and served from a disk
+cache in ``PREVIEW_CACHE_DIR``.
+
+Rendering uses only local tooling and degrades gracefully:
+
+* images need Pillow;
+* PDFs need poppler's ``pdftoppm`` (first page only), converted to WebP when
+  Pillow is present.
+
+If neither is available no preview is produced and the templates fall back to
+the plain "View" link. Previews are keyed by the stored file name, which is
+content-addressed (``core.storage``), so identical uploads share one preview.
+The cache is bounded by ``PREVIEW_CACHE_MAX_BYTES``; least recently used
+previews (by mtime, refreshed on every hit) are evicted first.
+"""
+import logging
+import mimetypes
+import os
+import posixpath
+import shutil
+import subprocess
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # pragma: no cover - optional dependency
+    Image = None
+
+
+logger = logging.getLogger(__name__)
+
+mimetypes.add_type('image/webp', '.webp')
+
+PDF_EXTENSIONS = {'.pdf'}
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def preview_format():
+    if Image is not None and features.check('webp'):
+        return 'webp'
+    return 'png'
+
+
+def preview_name(upload_name):
+    """
+    Cache file name for the upload stored as ``upload_name``. The upload's
+    extension is kept, so ``x.pdf`` and ``x.jpg`` get separate previews.
+    """
+    return f'{posixpath.basename(upload_name)}.{preview_format()}'
+
+
+def preview_path(upload_name):
+    return os.path.join(settings.PREVIEW_CACHE_DIR, preview_name(upload_name))
+
+
+def can_render(upload_name):
+    extension = os.path.splitext(upload_name)[1].lower()
+    if extension in IMAGE_EXTENSIONS:
+        return Image is not None
+    if extension in PDF_EXTENSIONS:
+        return shutil.which('pdftoppm') is not None
+    return False
+
+
+def cached_preview(upload_name):
+    """Path of the cached preview for ``upload_name``, or ``None``."""
+    path = preview_path(upload_name)
+    try:
+        # Touch on every hit so eviction drops the least recently used.
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+# ── Rendering ─────────────────────────────────────────────────────────────────
+
+def _render_image(source, target, fmt):
+    with Image.open(source) as image:
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((settings.PREVIEW_SIZE, settings.PREVIEW_SIZE))
+        if image.mode not in ('RGB', 'RGBA', 'L'):
+            image = image.convert('RGB')
+        image.save(target, format=fmt.upper())
+
+
+def _render_pdf(source, target, fmt):
+    with tempfile.TemporaryDirectory() as tmp:
+        prefix = os.path.join(tmp, 'page')
+        subprocess.run(
+            ['pdftoppm', '-f', '1', '-l', '1', '-singlefile', '-png',
+             '-scale-to', str(settings.PREVIEW_SIZE), source, prefix],
+            check=True, capture_output=True, timeout=settings.PREVIEW_RENDER_TIMEOUT,
+        )
+        page = prefix + '.png'
+        if fmt == 'png':
+            shutil.move(page, target)
+        else:
+            _render_image(page, target, fmt)
+
+
+def render(upload_name):
+    """Render the preview for ``upload_name`` now; returns its path or None."""
+    from .storage import upload_storage
+
+    source = upload_storage().path(upload_name)
+    if not os.path.exists(source) or not can_render(upload_name):
+        return None
+    target = preview_path(upload_name)
+    if os.path.exists(target):
+        return target
+
+    os.makedirs(settings.PREVIEW_CACHE_DIR, exist_ok=True)
+    fmt = preview_format()
+    fd, partial = tempfile.mkstemp(suffix=f'.{fmt}', dir=settings.PREVIEW_CACHE_DIR)
+    os.close(fd)
+    try:
+        if os.path.splitext(upload_name)[1].lower() in PDF_EXTENSIONS:
+            _render_pdf(source, partial, fmt)
+        else:
+            _render_image(source, partial, fmt)
+        os.replace(partial, target)
+    except Exception:
+        logger.exception('Could not render a preview of %s', upload_name)
+        return None
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    evict()
+    return target
+
+
+def evict(max_bytes=None):
+    """Trim the cache to ``PREVIEW_CACHE_MAX_BYTES``, oldest first."""
+    max_bytes = settings.PREVIEW_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    try:
+        entries = [e for e in os.scandir(settings.PREVIEW_CACHE_DIR) if e.is_file()]
+    except FileNotFoundError:
+        return 0
+    stats = [(e.stat(), e.path) for e in entries]
+    total = sum(st.st_size for st, _ in stats)
+    removed = 0
+    for st, path in sorted(stats, key=lambda item: item[0].st_mtime):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        total -= st.st_size
+        removed += 1
+    return removed
+
+
+def discard(upload_name):
+    """Drop the preview of an upload whose file has been deleted."""
+    try:
+        os.remove(preview_path(upload_name))
+    except FileNotFoundError:
+        pass
+
+
+# ── Worker pool ───────────────────────────────────────────────────────────────
+
+def _executor_instance():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.PREVIEW_WORKERS, thread_name_prefix='preview',
+            )
+        return _executor
+
+
+def _render_job(upload_name):
+    try:
+        render(upload_name)
+    finally:
+        with _lock:
+            _pending.discard(upload_name)
+
+
+def schedule(upload_name):
+    """Queue a preview for ``upload_name`` unless it is cached or queued."""
+    if not upload_name or not can_render(upload_name) or os.path.exists(preview_path(upload_name)):
+        return False
+    with _lock:
+        if upload_name in _pending:
+            return False
+        _pending.add(upload_name)
+    _executor_instance().submit(_render_job, upload_name)
+    return True
@@ -0,0 +1,192 @@
+"""
+Rate limiting for public endpoints.
+
+Policies are named in ``settings.RATE_LIMITS`` (e.g. ``'submit': '5/h'``) and
+attached to views with the ``rate_limit`` decorator. ``RateLimitMiddleware``
+enforces them in ``process_view``, before ``CsrfViewMiddleware`` reads
+``request.POST``, so a rejected upload is turned away without its multipart
+body ever being parsed.
+
+Limits use a sliding-window counter: the hits in the current fixed window plus
+the previous window's hits weighted by how much of it still overlaps the
+sliding window. Unlike a single expiring counter this does not reset the window
+on every hit and does not allow a burst of 2x the limit at a window boundary.
+
+Counters live in a store shared by every worker process:
+
+* ``database`` (default): ``RateLimitCounter`` rows incremented with
+  ``UPDATE ... SET count = count + 1``, which is atomic on every backend.
+* ``cache``: ``cache.add`` + ``cache.incr``. Only use this with a cache
+  whose ``incr`` is atomic and shared (Redis, Memcached); LocMemCache is
+  per-process and the database/file caches increment non-atomically.
+"""
+import random
+import time
+from datetime import datetime, timezone as dt_timezone
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.http import HttpResponse
+from django.utils.deprecation import MiddlewareMixin
+
+from . import metrics
+from .models import RateLimitCounter
+from .utils import get_client_ip
+
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+# Fraction of hits that also purge expired counter rows.
+CLEANUP_PROBABILITY = 0.01
+
+
+class Policy:
+    def __init__(self, name, limit, period):
+        self.name = name
+        self.limit = limit
+        self.period = period
+
+    @classmethod
+    def parse(cls, name, rate):
+        """Parse ``'<count>/<s|m|h|d>'``, e.g. ``'5/h'``."""
+        count, _, unit = rate.partition('/')
+        if unit not in PERIODS or not count.strip().isdigit():
+            raise ValueError(f"Invalid rate {rate!r} for policy {name!r}; expected e.g. '5/h'.")
+        return cls(name, int(count), PERIODS[unit])
+
+
+def get_policy(name):
+    return Policy.parse(name, settings.RATE_LIMITS[name])
+
+
+# ── Counter stores ────────────────────────────────────────────────────────────
+
+class DatabaseBackend:
+    def incr(self, key, window, period):
+        updated = RateLimitCounter.objects.filter(key=key, window=window).update(count=F('count') + 1)
+        if not updated:
+            expires_at = datetime.fromtimestamp((window + 2) * period, tz=dt_timezone.utc)
+            try:
+                with transaction.atomic():
+                    RateLimitCounter.objects.create(key=key, window=window, count=1, expires_at=expires_at)
+            except IntegrityError:
+                # Another worker created the row first.
+                RateLimitCounter.objects.filter(key=key, window=window).update(count=F('count') + 1)
+        if random.random() < CLEANUP_PROBABILITY:
+            RateLimitCounter.objects.filter(expires_at__lt=datetime.now(dt_timezone.utc)).delete()
+        return self.get(key, window)
+
+    def decr(self, key, window):
+        RateLimitCounter.objects.filter(key=key, window=window, count__gt=0).update(count=F('count') - 1)
+
+    def get(self, key, window):
+        return RateLimitCounter.objects.filter(key=key, window=window).values_list('count', flat=True).first() or 0
+
+
+class CacheBackend:
+    @staticmethod
+    def _key(key, window):
+        return f'ratelimit:{key}:{window}'
+
+    def incr(self, key, window, period):
+        cache_key = self._key(key, window)
+        cache.add(cache_key, 0, timeout=2 * period)
+        try:
+            return cache.incr(cache_key)
+        except ValueError:
+            # Evicted between add() and incr().
+            cache.set(cache_key, 1, timeout=2 * period)
+            return 1
+
+    def decr(self, key, window):
+        try:
+            cache.decr(self._key(key, window))
+        except ValueError:
+            pass
+
+    def get(self, key, window):
+        return cache.get(self._key(key, window), 0)
+
+
+BACKENDS = {
+    'database': DatabaseBackend,
+    'cache': CacheBackend,
+}
+
+
+def get_backend():
+    return BACKENDS[settings.RATE_LIMIT_BACKEND]()
+
+
+# ── Limiting ──────────────────────────────────────────────────────────────────
+
+def hit(policy_name, ident, now=None):
+    """
+    Count one hit for ``ident`` against ``policy_name``.
+
+    Returns ``(allowed, retry_after_seconds)``. Rejected hits are not counted,
+    so a client that keeps retrying is released once its earlier hits age out.
+    """
+    policy = get_policy(policy_name)
+    backend = get_backend()
+    now = time.time() if now is None else now
+    window, offset = divmod(now, policy.period)
+    window = int(window)
+    key = f'{policy.name}:{ident}'
+
+    current = backend.incr(key, window, policy.period)
+    previous = backend.get(key, window - 1)
+    estimate = previous * (1 - offset / policy.period) + current
+    if estimate <= policy.limit:
+        metrics.inc('ifmis_rate_limit_total', policy=policy.name, result='allowed')
+        return True, 0
+
+    backend.decr(key, window)
+    metrics.inc('ifmis_rate_limit_total', policy=policy.name, result='limited')
+    return False, int(policy.period - offset) + 1
+
+
+def rate_limit(policy_name, methods=('POST',), key=get_client_ip, on_limit=None):
+    """
+    Mark a view as rate limited by ``RateLimitMiddleware``.
+
+    ``key`` maps the request to the identity being limited (client IP by
+    default); ``on_limit(request)`` may build a custom rejection response.
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def wrapped_view(*args, **kwargs):
+            return view_func(*args, **kwargs)
+        wrapped_view.rate_limit = (policy_name, tuple(methods), key, on_limit)
+        return wrapped_view
+    return decorator
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    """
+    Enforce ``@rate_limit`` policies. Must come before CsrfViewMiddleware so
+    rejected requests are answered before the body is read.
+    """
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        spec = getattr(view_func, 'rate_limit', None)
+        if spec is None:
+            return None
+        policy_name, methods, key, on_limit = spec
+        if request.method not in methods:
+            return None
+
+        allowed, retry_after = hit(policy_name, key(request))
+        if allowed:
+            return None
+
+        if on_limit is not None:
+            response = on_limit(request)
+        else:
+            response = HttpResponse('Too many requests. Please try again later.',
+                                    status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
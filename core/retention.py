@@ -0,0 +1,121 @@
+"""
+Retention purge of old processed requests (``manage.py purge_requests``).
+
+Requests processed more than ``REQUEST_RETENTION_DAYS`` ago are deleted with
+their messages, and their uploads (copies of staff ID documents) are
+unlinked once nothing else references them. Pending requests are never
+purged, however old.
+
+A run snapshots the expired ids into a ``BulkDeleteJob`` marked with
+``purge_before`` and works through it with ``core.bulkdelete``: rows are
+deleted in chunks, one short transaction each, with the job's position as
+the checkpoint, and files are unlinked on a thread pool. An interrupted or
+failed run leaves its job behind; the next run finishes it before looking
+for newly expired requests. Every run writes one ``PURGE_REQUESTS`` audit
+entry summarising what it removed.
+
+``estimate`` is the dry run: what a purge would remove, without changing
+anything.
+"""
+from datetime import timedelta
+
+from django.db.models import Count
+from django.template.defaultfilters import filesizeformat
+from django.utils import timezone
+
+from . import audit
+from .bulkdelete import STALE_AFTER, file_size, run_job
+from .models import AuditLog, BulkDeleteJob, IFMISResetRequest, UploadBlob
+from .storage import is_hashed_name, upload_storage
+
+
+class PurgeInProgress(Exception):
+    pass
+
+
+def cutoff_for(days):
+    return timezone.now() - timedelta(days=days)
+
+
+def expired(cutoff):
+    return IFMISResetRequest.objects.filter(processed=True, processed_at__lt=cutoff)
+
+
+def unfinished_jobs():
+    return (BulkDeleteJob.objects.filter(purge_before__isnull=False)
+            .exclude(status=BulkDeleteJob.STATUS_DONE).order_by('created_at'))
+
+
+def estimate(cutoff):
+    """
+    ``{'requests', 'files', 'bytes'}`` a purge at ``cutoff`` would remove. A
+    file counts when every reference to it is from an expired request.
+    """
+    qs = expired(cutoff)
+    uses = dict(
+        qs.exclude(uploaded_file='').order_by().values('uploaded_file')
+        .annotate(n=Count('pk')).values_list('uploaded_file', 'n')
+    )
+    names = list(uses)
+    refcounts = {}
+    for i in range(0, len(names), 500):
+        refcounts.update(UploadBlob.objects.filter(name__in=names[i:i + 500]).values_list('name', 'refcount'))
+
+    storage = upload_storage()
+    freed = [
+        name for name, n in uses.items()
+        if (refcounts[name] <= n if name in refcounts else not is_hashed_name(name))
+    ]
+    return {
+        'requests': qs.count(),
+        'files': len(freed),
+        'bytes': sum(file_size(storage, name) for name in freed),
+    }
+
+
+def size_label(num_bytes):
+    return filesizeformat(num_bytes).replace('\xa0', ' ')
+
+
+def purge(days, chunk_size=None, file_workers=None):
+    """
+    Delete requests processed more than ``days`` days ago. Returns
+    ``{'cutoff', 'requests', 'files', 'bytes', 'jobs', 'failed'}``;
+    ``failed`` lists jobs that stopped with an error, which the next run
+    resumes.
+    """
+    stale = timezone.now() - STALE_AFTER
+    if unfinished_jobs().filter(status=BulkDeleteJob.STATUS_RUNNING, updated_at__gte=stale).exists():
+        raise PurgeInProgress('Another purge is running.')
+
+    cutoff = cutoff_for(days)
+    result = {'cutoff': cutoff, 'requests': 0, 'files': 0, 'bytes': 0, 'jobs': [], 'failed': []}
+
+    def run(job):
+        before = (job.deleted, job.files_removed, job.bytes_removed)
+        job = run_job(job.pk, chunk_size=chunk_size, file_workers=file_workers)
+        if job is None:
+            return  # claimed by a concurrent run
+        result['requests'] += job.deleted - before[0]
+        result['files'] += job.files_removed - before[1]
+        result['bytes'] += job.bytes_removed - before[2]
+        result['jobs'].append(job)
+        if job.status == BulkDeleteJob.STATUS_FAILED:
+            result['failed'].append(job)
+
+    for job in unfinished_jobs():
+        run(job)
+    if not result['failed']:
+        # Snapshot after resuming, so rows those jobs removed are not in it.
+        ids = sorted(expired(cutoff).values_list('pk', flat=True))
+        if ids:
+            run(BulkDeleteJob.objects.create(request_ids=ids, purge_before=cutoff))
+
+    detail = (
+        f"Purged {result['requests']} request(s) processed before {cutoff:%Y-%m-%d %H:%M} "
+        f"({days} day retention); removed {result['files']} file(s), {size_label(result['bytes'])}."
+    )
+    if result['failed']:
+        detail += f" {len(result['failed'])} job(s) failed and will be resumed by the next run."
+    audit.record(AuditLog(action=AuditLog.ACTION_PURGE_REQUESTS, detail=detail))
+    return result
@@ -0,0 +1,72 @@
+"""
+Staff role resolution.
+
+Whether a user belongs to ``IFMIS_ADMIN`` is resolved once and remembered in
+their session, stamped with a global roles version kept in the cache. Any
+change to group membership (or to a group itself) bumps the version from
+``core.signals``, which makes every remembered answer stale at once. The
+answer is also re-checked after ``ROLE_CACHE_TTL`` seconds, which bounds
+staleness when the cache is per-process (LocMemCache) and a change was made
+in another worker; with a shared cache invalidation is immediate.
+"""
+import time
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.auth.views import redirect_to_login
+from django.core.cache import cache
+
+
+ADMIN_GROUP = 'IFMIS_ADMIN'
+
+SESSION_KEY = '_ifmis_roles'
+VERSION_CACHE_KEY = 'ifmis_roles_version'
+
+
+def roles_version():
+    # Seeded with a timestamp so a cache restart never reuses an old version.
+    cache.add(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+    return cache.get(VERSION_CACHE_KEY)
+
+
+def bump_roles_version():
+    cache.set(VERSION_CACHE_KEY, time.time_ns(), timeout=None)
+
+
+def is_ifmis_admin(user):
+    """Uncached check against the auth tables."""
+    return user.is_authenticated and user.groups.filter(name=ADMIN_GROUP).exists()
+
+
+def has_admin_role(request):
+    """Cached ``is_ifmis_admin(request.user)`` for the current session."""
+    user = request.user
+    if not user.is_authenticated:
+        return False
+
+    session = getattr(request, 'session', None)
+    if session is None:
+        return is_ifmis_admin(user)
+
+    version = roles_version()
+    cached = session.get(SESSION_KEY)
+    if (cached and cached['uid'] == user.pk and cached['v'] == version
+            and time.time() - cached['at'] < settings.ROLE_CACHE_TTL):
+        return cached['admin']
+
+    is_admin = is_ifmis_admin(user)
+    session[SESSION_KEY] = {'uid': user.pk, 'v': version, 'at': time.time(), 'admin': is_admin}
+    return is_admin
+
+
+def ifmis_admin_required(view_func):
+    """
+    Replacement for ``login_required`` + ``user_passes_test(is_ifmis_admin)``
+    that uses the session-cached role.
+    """
+    @wraps(view_func)
+    def _wrapped_view(request, *args, **kwargs):
+        if has_admin_role(request):
+            return view_func(request, *args, **kwargs)
+        return redirect_to_login(request.get_full_path(), settings.LOGIN_URL)
+    return _wrapped_view
@@ -0,0 +1,138 @@
+"""
+Search index for the staff dashboard.
+
+On SQLite the searchable request columns are mirrored into an FTS5 shadow
+table keyed by request id and kept in sync from ``core.signals``. On
+PostgreSQL the ``pg_trgm`` GIN indexes created by migration 0005 let the
+database answer the ``icontains`` filters without a sequential scan and the
+results are ranked by trigram similarity. Any other setup (or an SQLite build
+without FTS5) falls back to plain ``icontains`` filtering.
+"""
+import re
+
+from django.db import connection
+from django.db.models import F, FloatField, Func, Q, Value
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Greatest
+
+from .models import IFMISResetRequest
+
+
+SEARCH_TABLE = 'core_ifmisresetrequest_search'
+SEARCH_COLUMNS = ('full_name', 'department', 'email', 'reference_code')
+
+BACKEND_FTS5 = 'fts5'
+BACKEND_TRIGRAM = 'trigram'
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+_backend_cache = {}
+
+
+def search_backend():
+    """Return the active search backend for the default connection, or None."""
+    if connection.alias not in _backend_cache:
+        backend = None
+        if connection.vendor == 'sqlite':
+            if SEARCH_TABLE in connection.introspection.table_names():
+                backend = BACKEND_FTS5
+        elif connection.vendor == 'postgresql':
+            backend = BACKEND_TRIGRAM
+        _backend_cache[connection.alias] = backend
+    return _backend_cache[connection.alias]
+
+
+def reset_backend_cache():
+    _backend_cache.clear()
+
+
+def build_match_query(text):
+    """Turn free text into an FTS5 query: every word must match as a prefix."""
+    return ' '.join(f'"{token}"*' for token in _TOKEN_RE.findall(text))
+
+
+def _icontains(qs, text):
+    return qs.filter(
+        Q(full_name__icontains=text) |
+        Q(department__icontains=text) |
+        Q(email__icontains=text) |
+        Q(reference_code__icontains=text)
+    )
+
+
+def search_requests(qs, text):
+    """
+    Filter ``qs`` to requests matching ``text``, best matches first.
+
+    The result is annotated with ``search_rank`` (lower is better) and ordered
+    by it, newest first within equal rank.
+    """
+    backend = search_backend()
+
+    if backend == BACKEND_FTS5:
+        match = build_match_query(text)
+        if match:
+            table = IFMISResetRequest._meta.db_table
+            return qs.filter(
+                pk__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match])
+            ).annotate(
+                search_rank=RawSQL(
+                    f'SELECT rank FROM {SEARCH_TABLE} '
+                    f'WHERE {SEARCH_TABLE} MATCH %s AND rowid = "{table}"."id"',
+                    [match],
+                    output_field=FloatField(),
+                )
+            ).order_by('search_rank', '-submitted_at', '-id')
+
+    elif backend == BACKEND_TRIGRAM:
+        similarity = Greatest(*[
+            Func(F(column), Value(text), function='similarity', output_field=FloatField())
+            for column in SEARCH_COLUMNS
+        ])
+        return _icontains(qs, text).annotate(
+            search_rank=-similarity
+        ).order_by('search_rank', '-submitted_at', '-id')
+
+    return _icontains(qs, text).order_by('-submitted_at', '-id')
+
+
+# ── Index maintenance ─────────────────────────────────────────────────────────
+
+def index_request(req):
+    if search_backend() != BACKEND_FTS5:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [req.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, {", ".join(SEARCH_COLUMNS)}) VALUES (%s, %s, %s, %s, %s)',
+            [req.pk] + [getattr(req, column) for column in SEARCH_COLUMNS],
+        )
+
+
+def unindex_request(pk):
+    if search_backend() != BACKEND_FTS5:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [pk])
+
+
+def rebuild_index():
+    """
+    Recreate the search index from ``IFMISResetRequest`` and return the
+    number of rows indexed.
+    """
+    table = IFMISResetRequest._meta.db_table
+    columns = ', '.join(SEARCH_COLUMNS)
+
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5({columns}, prefix='2 3')"
+            )
+            cursor.execute(f'INSERT INTO {SEARCH_TABLE} (rowid, {columns}) SELECT id, {columns} FROM {table}')
+        elif connection.vendor == 'postgresql':
+            for column in SEARCH_COLUMNS:
+                cursor.execute(f'REINDEX INDEX {table}_{column}_trgm')
+
+    reset_backend_cache()
+    return IFMISResetRequest.objects.count()
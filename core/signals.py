@@ -1,14 +1,15 @@
+from django.contrib.auth.models import Group, User
 from django.contrib.auth.signals import user_logged_in
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
 from django.dispatch import receiver
+from django.utils import timezone
 
-from .models import AuditLog
-
-
-def get_client_ip(request):
-    x_forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded:
-        return x_forwarded.split(',')[0].strip()
-    return request.META.get('REMOTE_ADDR', '0.0.0.0')
+from . import audit, counters, live, previews, trackcache
+from .models import AuditLog, IFMISRequestMessage, IFMISResetRequest
+from .roles import bump_roles_version, has_admin_role
+from .search import index_request, unindex_request
+from .utils import get_client_ip
 
 
 @receiver(user_logged_in)
@@ -19,12 +20,94 @@ def log_staff_login(sender, request, user, **kwargs):
     if request.path != '/staff/login/':
         return
 
-    if not user.groups.filter(name='IFMIS_ADMIN').exists():
+    # Resolves and caches the role in the freshly cycled session.
+    if not has_admin_role(request):
         return
 
-    AuditLog(
+    audit.record(AuditLog(
         admin=user,
         action=AuditLog.ACTION_LOGIN,
         detail=f"Logged in as {user.username}",
         ip_address=get_client_ip(request),
-    ).save()
+    ))
+
+
+@receiver(post_save, sender=IFMISResetRequest)
+def update_search_index(sender, instance, **kwargs):
+    index_request(instance)
+
+
+@receiver(post_delete, sender=IFMISResetRequest)
+def remove_from_search_index(sender, instance, **kwargs):
+    unindex_request(instance.pk)
+
+
+@receiver(post_save, sender=IFMISResetRequest)
+@receiver(post_delete, sender=IFMISResetRequest)
+def invalidate_track_page(sender, instance, **kwargs):
+    # After commit: a track page rendered before then would still read the
+    # old row and cache it under the new version.
+    ref_code = instance.reference_code
+    transaction.on_commit(lambda: trackcache.invalidate(ref_code))
+
+
+@receiver(post_save, sender=IFMISRequestMessage)
+def invalidate_track_page_on_message(sender, instance, created, **kwargs):
+    if created:
+        ref_code = instance.request.reference_code
+        transaction.on_commit(lambda: trackcache.invalidate(ref_code))
+
+
+@receiver(post_save, sender=IFMISRequestMessage)
+def publish_new_message(sender, instance, created, **kwargs):
+    if created:
+        live.publish_message(instance.request.reference_code, instance)
+
+
+@receiver(post_save, sender=IFMISResetRequest)
+def publish_status_change(sender, instance, created, **kwargs):
+    if not created:
+        live.publish_status(instance.reference_code, instance.processed)
+
+
+@receiver(pre_save, sender=IFMISResetRequest)
+def remember_counter_key(sender, instance, **kwargs):
+    # The counter the row is leaving; one extra SELECT on updates only.
+    instance._counter_key = None
+    if not instance._state.adding and instance.pk:
+        old = sender.objects.filter(pk=instance.pk).values('submitted_at', 'department', 'processed').first()
+        if old:
+            instance._counter_key = (timezone.localdate(old['submitted_at']), old['department'], old['processed'])
+
+
+@receiver(post_save, sender=IFMISResetRequest)
+def update_counters(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    new_key = counters.key_for(instance)
+    old_key = getattr(instance, '_counter_key', None)
+    if created or old_key is None:
+        counters.adjust(new_key, 1)
+    else:
+        counters.move(old_key, new_key)
+
+
+@receiver(post_delete, sender=IFMISResetRequest)
+def update_counters_on_delete(sender, instance, **kwargs):
+    counters.adjust(counters.key_for(instance), -1)
+
+
+@receiver(post_save, sender=IFMISResetRequest)
+def schedule_preview(sender, instance, created, **kwargs):
+    if created and instance.uploaded_file:
+        name = instance.uploaded_file.name
+        transaction.on_commit(lambda: previews.schedule(name))
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def invalidate_cached_roles(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        bump_roles_version()
+
@@ -0,0 +1,72 @@
+// Live conversation updates for the track and request detail pages.
+// Uses Server-Sent Events where available and falls back to polling.
+function startLiveChat(opts) {
+  const box = opts.box;
+  if (!box) {
+    return;
+  }
+  const base = '/live/' + encodeURIComponent(opts.refCode);
+  let processed = opts.processed;
+  let cursor = 0;
+  box.querySelectorAll('[data-id]').forEach(el => {
+    cursor = Math.max(cursor, Number(el.dataset.id));
+  });
+
+  function append(msg) {
+    if (box.querySelector('[data-id="' + msg.id + '"]')) {
+      return;
+    }
+    const empty = box.querySelector('.chat-empty');
+    if (empty) {
+      empty.remove();
+    }
+    const row = document.createElement('div');
+    row.className = 'chat-msg ' + (msg.sender === 'admin' ? 'chat-msg--admin' : 'chat-msg--user');
+    row.dataset.id = msg.id;
+    const meta = document.createElement('div');
+    meta.className = 'chat-meta';
+    meta.textContent = opts.senderLabel(msg.sender) + ' | ' + msg.display_time;
+    const bubble = document.createElement('div');
+    bubble.className = 'chat-bubble';
+    bubble.textContent = msg.content;
+    row.append(meta, bubble);
+    box.append(row);
+    cursor = Math.max(cursor, msg.id);
+    box.scrollTop = box.scrollHeight;
+    if (opts.countEl) {
+      const n = box.querySelectorAll('.chat-msg').length;
+      opts.countEl.textContent = n + ' message' + (n === 1 ? '' : 's');
+    }
+  }
+
+  function status(isProcessed) {
+    // A status flip changes most of the page; just reload it.
+    if (isProcessed !== processed) {
+      processed = isProcessed;
+      window.location.reload();
+    }
+  }
+
+  if (window.EventSource) {
+    const events = new EventSource(base + '/events/?after=' + cursor);
+    events.addEventListener('message', e => append(JSON.parse(e.data).message));
+    events.addEventListener('status', e => status(JSON.parse(e.data).processed));
+    events.addEventListener('deleted', () => {
+      events.close();
+      window.location.reload();
+    });
+    return;
+  }
+
+  setInterval(() => {
+    fetch(base + '/poll/?after=' + cursor)
+      .then(r => (r.ok ? r.json() : null))
+      .then(data => {
+        if (data) {
+          data.messages.forEach(append);
+          status(data.processed);
+        }
+      })
+      .catch(() => {});
+  }, 15000);
+}
@@ -0,0 +1,147 @@
+"""
+Content-addressed, reference-counted storage for uploaded forms.
+
+Most requesters upload a copy of the same ``IFMIS_FORM.pdf``. Instead of one
+blob per upload, ``ContentAddressedStorage`` names every file after the
+SHA-256 of its content (``uploads/<sha256><ext>``) and keeps a reference count
+per name in ``UploadBlob``. Saving a file that is already stored only bumps
+the count; ``delete()`` drops one reference and removes the file from disk
+when the last one goes. Names stay flat under ``uploads/`` so the existing
+``serve_uploaded_file`` URLs keep working.
+
+Reference counts are changed with conditional UPDATE/DELETE statements, and a
+file is only written or unlinked while its ``UploadBlob`` row is locked by the
+current transaction, so an upload racing with the deletion of the last copy
+of the same content either revives the blob or writes it afresh.
+
+Files that predate this backend have no ``UploadBlob`` row and are unlinked
+on delete as before; ``manage.py convert_upload_storage`` moves them over.
+"""
+import hashlib
+import os
+import posixpath
+import re
+from collections import Counter
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.core.files.storage import FileSystemStorage
+
+from . import previews
+
+
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}(\.[a-z0-9]+)?$')
+
+
+def content_digest(content):
+    """SHA-256 of ``content``; reuses the digest from the upload handler."""
+    digest = getattr(content, 'sha256', None)
+    if digest:
+        return digest
+    sha256 = hashlib.sha256()
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    for chunk in content.chunks():
+        sha256.update(chunk)
+    if hasattr(content, 'seek'):
+        content.seek(0)
+    return sha256.hexdigest()
+
+
+def hashed_name(name, digest):
+    directory, filename = posixpath.split(name)
+    return posixpath.join(directory, digest + os.path.splitext(filename)[1].lower())
+
+
+def is_hashed_name(name):
+    return bool(HASHED_NAME_RE.match(posixpath.basename(name)))
+
+
+class ContentAddressedStorage(FileSystemStorage):
+
+    def __init__(self, **kwargs):
+        # Rewriting an existing name can only ever write identical bytes.
+        kwargs.setdefault('allow_overwrite', True)
+        super().__init__(**kwargs)
+
+    def get_available_name(self, name, max_length=None):
+        # The real name is derived from the content in _save().
+        return name
+
+    def _save(self, name, content):
+        name = hashed_name(name, content_digest(content))
+        with transaction.atomic():
+            self.acquire(name)
+            if not self.exists(name):
+                name = super()._save(name, content)
+        return name
+
+    def delete(self, name):
+        """Drop one reference to ``name``; unlink it if it was the last."""
+        if not name:
+            return
+        with transaction.atomic():
+            self.release([name])
+            self.collect([name])
+
+    # ── Reference counting ────────────────────────────────────────────────
+
+    def acquire(self, name, count=1):
+        from .models import UploadBlob
+
+        if UploadBlob.objects.filter(name=name).update(refcount=F('refcount') + count):
+            return
+        try:
+            with transaction.atomic():
+                UploadBlob.objects.create(name=name, refcount=count)
+        except IntegrityError:
+            # Created concurrently; count against that row instead.
+            UploadBlob.objects.filter(name=name).update(refcount=F('refcount') + count)
+
+    def release(self, names):
+        """
+        Drop one reference per entry in ``names``. Only touches the database,
+        so it can share the transaction that deletes the referencing rows;
+        call ``collect`` afterwards to remove unreferenced files.
+        """
+        from .models import UploadBlob
+
+        for name, count in Counter(n for n in names if n).items():
+            UploadBlob.objects.filter(name=name).update(refcount=F('refcount') - count)
+
+    def collect(self, names, pool=None):
+        """
+        Unlink every file in ``names`` that has no references left, plus any
+        legacy (pre content-addressing) file. Safe to repeat. Returns the
+        names that were removed.
+        """
+        from .models import UploadBlob
+
+        with transaction.atomic():
+            dead = []
+            for name in sorted(set(n for n in names if n)):
+                if UploadBlob.objects.filter(name=name, refcount__lte=0).delete()[0]:
+                    dead.append(name)
+                elif not is_hashed_name(name):
+                    dead.append(name)
+            # Unlink while the deletes above still hold their locks.
+            unlink = super().delete
+            if pool is not None:
+                list(pool.map(unlink, dead))
+            else:
+                for name in dead:
+                    unlink(name)
+        for name in dead:
+            previews.discard(name)
+        return dead
+
+
+_storage = None
+
+
+def upload_storage():
+    """Storage for ``IFMISResetRequest.uploaded_file``."""
+    global _storage
+    if _storage is None:
+        _storage = ContentAddressedStorage()
+    return _storage
@@ -1,3 +1,1451 @@
-from django.test import TestCase
+import asyncio
+import hashlib
+import importlib
+import json
+import os
+import csv
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import zipfile
+from io import BytesIO, StringIO
+from datetime import date, datetime, timedelta
+from unittest import mock, skipIf, skipUnless
+
+from django.apps import apps as django_apps
+from django.conf import settings
+from django.contrib.auth.models import Group, User
+from django.core import mail
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.files.uploadhandler import StopFutureHandlers, StopUpload
+from django.db import connection, connections, transaction
+from django.db.models import Sum
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    analytics, audit, audit_archive, counters, export, live, metrics, outbox, previews, ratelimit, retention,
+    roles, search, transitions,
+)
+from .bulkdelete import create_job, run_job
+from .fileserve import parse_range, serve_file
+from .pagination import InvalidCursor, KeysetPaginator
+from .models import (
+    AuditLog, BulkDeleteJob, IFMISRequestMessage, IFMISResetRequest, OutboundEmail, RequestCounter,
+    TurnaroundRollup, UploadBlob,
+)
+from .roles import ADMIN_GROUP
+from .storage import upload_storage
+from .uploads import ValidatingUploadHandler
+from .utils import day_range
+from .views import filter_requests, upload_request
+
+
+def staff_user(username='helpdesk'):
+    user = User.objects.create_user(username, is_staff=True)
+    user.groups.add(Group.objects.get_or_create(name=ADMIN_GROUP)[0])
+    return user
+
+
+def use_temp_media(testcase):
+    """Point MEDIA_ROOT and the preview cache at a directory removed after the test."""
+    media = tempfile.TemporaryDirectory()
+    override = override_settings(MEDIA_ROOT=media.name, PREVIEW_CACHE_DIR=f'{media.name}/previews')
+    override.enable()
+    testcase.addCleanup(media.cleanup)
+    testcase.addCleanup(override.disable)
+    return media.name
+
+
+def make_request(i=0, **fields):
+    """A saved request with its own upload (distinct content per ``i``)."""
+    fields.setdefault('uploaded_file', SimpleUploadedFile('form.pdf', f'%PDF-1.4 form {i}'.encode()))
+    return IFMISResetRequest.objects.create(
+        full_name=f'User {i}', department='Finance', email=f'user{i}@example.com', **fields,
+    )
+
+
+@skipUnless(connection.vendor == 'sqlite', 'Query plans are checked on SQLite.')
+class QueryPlanTests(TestCase):
+    """
+    Dashboard and audit filters must be answered from an index. A plan line
+    ``SCAN <table>`` without ``USING INDEX`` is a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        IFMISResetRequest.objects.bulk_create([
+            IFMISResetRequest(full_name=f'User {i}', department='Finance', email='user@example.com',
+                              uploaded_file='uploads/form.pdf', reference_code=f'REF{i:09d}')
+            for i in range(50)
+        ])
+
+    def assertUsesIndex(self, queryset, table):
+        plan = queryset.explain()
+        full_scans = [
+            line for line in plan.splitlines()
+            if re.search(rf'\bSCAN {table}\b', line) and 'USING' not in line
+        ]
+        self.assertEqual(full_scans, [], f'Full scan of {table}:\n{plan}')
+
+    def dashboard_queryset(self, **params):
+        request = RequestFactory().get('/staff/dashboard/', params)
+        qs = filter_requests(request)[0]
+        return qs.order_by('-submitted_at', '-id')
+
+    def test_dashboard_year_filter(self):
+        self.assertUsesIndex(self.dashboard_queryset(year='2026'), 'core_ifmisresetrequest')
+
+    def test_dashboard_month_and_year_filter(self):
+        self.assertUsesIndex(self.dashboard_queryset(month='3', year='2026'), 'core_ifmisresetrequest')
+
+    def test_dashboard_full_date_filter(self):
+        self.assertUsesIndex(self.dashboard_queryset(day='14', month='3', year='2026'), 'core_ifmisresetrequest')
+
+    def test_dashboard_month_without_year(self):
+        self.assertUsesIndex(self.dashboard_queryset(month='3'), 'core_ifmisresetrequest')
+
+    def test_dashboard_unfiltered_page(self):
+        self.assertUsesIndex(self.dashboard_queryset()[:15], 'core_ifmisresetrequest')
+
+    def test_pending_requests_by_submission(self):
+        qs = IFMISResetRequest.objects.filter(processed=False).order_by('submitted_at')
+        self.assertUsesIndex(qs, 'core_ifmisresetrequest')
+
+    def test_audit_date_filter(self):
+        start, end = day_range(date(2026, 3, 14))
+        qs = AuditLog.objects.filter(timestamp__gte=start, timestamp__lt=end)
+        self.assertUsesIndex(qs, 'core_auditlog')
+
+    def test_audit_history_for_reference(self):
+        qs = AuditLog.objects.filter(ref_code='REF000000001').order_by('-timestamp')
+        self.assertUsesIndex(qs, 'core_auditlog')
+
+    def test_audit_log_page(self):
+        self.assertUsesIndex(AuditLog.objects.all()[:25], 'core_auditlog')
+
+    def test_audit_log_view_reference_filter(self):
+        self.client.force_login(staff_user())
+        response = self.client.get('/staff/audit/', {'ref': ' ref000000001 '})
+        qs = response.context['page_obj'].paginator.object_list
+        self.assertIn('core_audit_ref_ts_idx', qs.explain())
+        self.assertUsesIndex(qs, 'core_auditlog')
+
+    def test_audit_log_view_matches_a_partial_reference_as_a_prefix(self):
+        self.client.force_login(staff_user())
+        AuditLog.bulk_append([
+            AuditLog(action=AuditLog.ACTION_VIEW_REQUEST, ref_code=ref)
+            for ref in ('REF000000001', 'REF000000002', 'XREF00000000')
+        ])
+        response = self.client.get('/staff/audit/', {'ref': 'ref0000'})
+        self.assertEqual(sorted(e.ref_code for e in response.context['page_obj']), ['REF000000001', 'REF000000002'])
+        response = self.client.get('/staff/audit/', {'ref': 'ref000000001'})
+        self.assertEqual([e.ref_code for e in response.context['page_obj']], ['REF000000001'])
+
+
+class KeysetPaginationTests(TestCase):
+
+    def setUp(self):
+        now = timezone.now()
+        for i in range(8):
+            req = IFMISResetRequest.objects.create(full_name=f'User {i}', department='Finance',
+                                                   email=f'user{i}@example.com', uploaded_file='uploads/form.pdf')
+            # Pairs share a submission time, so the id tie-break matters.
+            IFMISResetRequest.objects.filter(pk=req.pk).update(submitted_at=now - timedelta(hours=i // 2))
+        self.expected = list(IFMISResetRequest.objects.order_by('-submitted_at', '-id').values_list('pk', flat=True))
+        self.paginator = KeysetPaginator(IFMISResetRequest.objects.all(), 3)
+
+    def test_walks_forward_and_back_over_ties(self):
+        pages, page = [], self.paginator.page()
+        while True:
+            pages.append([req.pk for req in page])
+            if not page.has_next():
+                break
+            page = self.paginator.page(page.next_cursor)
+        self.assertEqual(sum(pages, []), self.expected)
+        self.assertEqual([len(p) for p in pages], [3, 3, 2])
+
+        back = self.paginator.page(page.previous_cursor)
+        self.assertEqual([req.pk for req in back], pages[1])
+        first = self.paginator.page(back.previous_cursor)
+        self.assertEqual([req.pk for req in first], pages[0])
+        self.assertFalse(first.has_previous())
+
+    def test_bad_cursor(self):
+        for cursor in ('not-a-cursor', 'WyJ4IixbXV0'):
+            with self.subTest(cursor=cursor), self.assertRaises(InvalidCursor):
+                self.paginator.page(cursor)
+        self.assertEqual([req.pk for req in self.paginator.get_page('junk')], self.expected[:3])
+
+    def test_dashboard_pages_by_cursor_without_count_or_offset(self):
+        self.client.force_login(staff_user())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/staff/dashboard/', {'cursor': ''})
+        self.assertTrue(response.context['cursor_mode'])
+        self.assertEqual([req.pk for req in response.context['page_obj']], self.expected)
+        request_queries = [q['sql'] for q in queries.captured_queries if 'FROM "core_ifmisresetrequest"' in q['sql']]
+        self.assertTrue(request_queries)
+        self.assertFalse([sql for sql in request_queries if 'COUNT(' in sql or 'OFFSET' in sql])
+
+
+class SearchTests(TestCase):
+
+    def setUp(self):
+        search.reset_backend_cache()
+        self.addCleanup(search.reset_backend_cache)
+        self.alice = self.create('Alice Mwangi', 'Finance')
+        self.bob = self.create('Bob Otieno', 'Health')
+
+    def create(self, name, department):
+        return IFMISResetRequest.objects.create(full_name=name, department=department,
+                                                email=f'{name.split()[0].lower()}@example.com',
+                                                uploaded_file='uploads/form.pdf')
+
+    def found(self, text):
+        return [req.pk for req in search.search_requests(IFMISResetRequest.objects.all(), text)]
+
+    def test_every_word_matches_as_a_prefix(self):
+        self.assertEqual(self.found('ali'), [self.alice.pk])
+        self.assertEqual(self.found('alice fin'), [self.alice.pk])
+        self.assertEqual(self.found('alice health'), [])
+        self.assertEqual(self.found(self.bob.reference_code), [self.bob.pk])
+        self.assertEqual(self.found('example'), [self.bob.pk, self.alice.pk])
+
+    @skipUnless(connection.vendor == 'sqlite', 'The FTS5 index is SQLite only.')
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(search.search_backend(), search.BACKEND_FTS5)
+        self.alice.full_name = 'Alicia Kamau'
+        self.alice.save()
+        self.assertEqual(self.found('kamau'), [self.alice.pk])
+        self.assertEqual(self.found('mwangi'), [])
+
+        self.bob.delete()
+        self.assertEqual(self.found('bob'), [])
+        self.assertEqual(search.rebuild_index(), 1)
+        self.assertEqual(self.found('alicia'), [self.alice.pk])
+
+    def test_falls_back_to_icontains_without_an_index(self):
+        with mock.patch.object(search, 'search_backend', return_value=None):
+            self.assertEqual(self.found('otien'), [self.bob.pk])
+
+
+class BulkStatusTests(TestCase):
+
+    def setUp(self):
+        self.user = staff_user()
+        self.client.force_login(self.user)
+        self.requests = [
+            IFMISResetRequest.objects.create(full_name=f'User {i}', department='Finance',
+                                             email=f'user{i}@example.com', uploaded_file='uploads/form.pdf')
+            for i in range(4)
+        ]
+        self.requests[0].mark_processed(self.user)
+
+    def post(self, status, requests):
+        return self.client.post('/staff/bulk-status/', {
+            'selected_ids': [str(r.pk) for r in requests], 'status': status,
+        })
+
+    def test_mark_processed_skips_rows_already_processed(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.post('processed', self.requests)
+        updates = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('UPDATE "core_ifmisresetrequest"')]
+        self.assertEqual(len(updates), 1)
+        self.assertFalse(IFMISResetRequest.objects.filter(processed=False).exists())
+        self.assertEqual(counters.kpis()['processed'], 4)
+        self.assertEqual(counters.kpis()['pending'], 0)
+        audit.flush()
+        changed = {r.reference_code for r in self.requests[1:]}
+        logged = AuditLog.objects.filter(action=AuditLog.ACTION_MARK_PROCESSED)
+        self.assertEqual(set(logged.values_list('ref_code', flat=True)), changed)
+        self.assertEqual(set(OutboundEmail.objects.values_list('recipient', flat=True)),
+                         {r.email for r in self.requests[1:]})
+
+    def test_revert_to_pending(self):
+        self.post('pending', self.requests)
+        req = IFMISResetRequest.objects.get(pk=self.requests[0].pk)
+        self.assertFalse(req.processed)
+        self.assertIsNone(req.processed_at)
+        self.assertIsNone(req.processed_by)
+        self.assertEqual(counters.kpis()['pending'], 4)
+        self.assertFalse(OutboundEmail.objects.exists())
+
+
+class AuditBufferTests(TestCase):
+
+    def setUp(self):
+        audit.flush()
+
+    def entry(self, action=AuditLog.ACTION_VIEW_REQUEST):
+        return AuditLog(action=action, ref_code='REF000000001', detail=action)
+
+    def test_entries_wait_for_a_flush(self):
+        audit.record(self.entry())
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(audit.flush(), 1)
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_strict_actions_are_written_immediately_and_in_order(self):
+        audit.record(self.entry())
+        audit.record(self.entry(AuditLog.ACTION_DELETE_REQUEST))
+        self.assertEqual(list(AuditLog.objects.order_by('pk').values_list('action', flat=True)),
+                         [AuditLog.ACTION_VIEW_REQUEST, AuditLog.ACTION_DELETE_REQUEST])
+
+    def test_full_or_old_buffer_flushes_itself(self):
+        buffer = audit.AuditBuffer(max_entries=3, max_age=60)
+        for _ in range(3):
+            buffer.add(self.entry())
+        self.assertEqual((len(buffer), AuditLog.objects.count()), (0, 3))
+
+        buffer = audit.AuditBuffer(max_entries=100, max_age=0)
+        buffer.add(self.entry())
+        self.assertEqual(len(buffer), 0)
+
+    def test_failed_flush_is_logged_and_retried(self):
+        audit.record(self.entry())
+        middleware = audit.AuditFlushMiddleware(lambda request: None)
+        with mock.patch.object(AuditLog, 'bulk_append', side_effect=RuntimeError('database is locked')), \
+                self.assertLogs('core.audit', 'ERROR'):
+            middleware.process_response(RequestFactory().get('/'), None)
+        self.assertEqual(len(audit._buffer), 1)
+        self.assertEqual(audit.flush(), 1)
+
+    def test_flush_inside_a_transaction_waits_for_commit(self):
+        audit.record(self.entry())
+        with self.captureOnCommitCallbacks(execute=True):
+            with transaction.atomic():
+                self.assertEqual(audit.flush(), 0)
+                self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(AuditLog.objects.count(), 1)
+
+    def test_rolled_back_bulk_change_keeps_buffered_entries(self):
+        req = IFMISResetRequest.objects.create(full_name='User', department='Finance',
+                                               email='user@example.com', uploaded_file='uploads/form.pdf')
+        audit.record(self.entry())
+        with self.captureOnCommitCallbacks(execute=True), self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                transitions.set_status([req.pk], True, None)
+                raise RuntimeError('queue_emails failed')
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(len(audit._buffer), 1)
+        self.assertEqual(audit.flush(), 1)
+
+
+class AuditArchiveTests(TestCase):
+    OLD = timezone.make_aware(datetime(2025, 1, 15, 12, 0))
+
+    def setUp(self):
+        audit.flush()
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = os.path.join(tmp.name, 'archive')
+        override = override_settings(AUDIT_ARCHIVE_DIR=self.dir)
+        override.enable()
+        self.addCleanup(override.disable)
+
+    def append(self, count, start=0, timestamp=None):
+        return AuditLog.bulk_append([
+            AuditLog(action=AuditLog.ACTION_VIEW_REQUEST, ref_code=f'REF{i:09d}', timestamp=timestamp or self.OLD)
+            for i in range(start, start + count)
+        ])
+
+    def archived_ids(self):
+        return sorted(record['id'] for record in audit_archive.read_segment('2025-01'))
+
+    def test_viewing_the_log_does_not_create_the_archive(self):
+        self.client.force_login(staff_user())
+        response = self.client.get('/staff/audit/', {'source': 'archive'})
+        self.assertEqual(response.context['archived_count'], 0)
+        self.assertFalse(os.path.exists(self.dir))
+
+    def test_moves_old_entries_into_the_segment(self):
+        old = [e.pk for e in self.append(3)]
+        self.append(1, start=3, timestamp=timezone.now())
+        self.assertEqual(audit_archive.archive(older_than_days=30, chunk_size=2), 3)
+
+        self.assertEqual(list(AuditLog.objects.values_list('ref_code', flat=True)), ['REF000000003'])
+        self.assertEqual(self.archived_ids(), sorted(old))
+        self.assertEqual(audit_archive.archived_count(), 3)
+        self.assertEqual([e.pk for e in audit_archive.search(ref='ref000000001')], [old[1]])
+        self.assertEqual(sorted(e.pk for e in audit_archive.search(ref='ref00000000')), sorted(old))
+
+    def test_date_search_only_opens_segments_spanning_the_day(self):
+        january = self.append(2)
+        self.append(1, start=2, timestamp=self.OLD + timedelta(days=31))
+        audit_archive.archive(older_than_days=30)
+        self.assertEqual(sorted(audit_archive.load_index()['segments']), ['2025-01', '2025-02'])
+
+        with mock.patch.object(audit_archive, 'read_segment', wraps=audit_archive.read_segment) as read:
+            found = audit_archive.search(date=self.OLD.date())
+            self.assertEqual([call.args[0] for call in read.call_args_list], ['2025-01'])
+            read.reset_mock()
+            # Inside January but after its last entry.
+            self.assertEqual(audit_archive.search(date=date(2025, 1, 20)), [])
+            read.assert_not_called()
+        self.assertEqual(sorted(e.pk for e in found), sorted(e.pk for e in january))
+
+    def test_rerun_replaces_a_member_cut_short_by_a_crash(self):
+        first = self.append(2)
+        audit_archive.archive(older_than_days=30)
+        pending = self.append(2, start=2)
+
+        # Crash part-way through writing the next chunk.
+        index = audit_archive.load_index()
+        offset = os.path.getsize(audit_archive.segment_path('2025-01'))
+        index['pending'] = {'month': '2025-01', 'ids': [e.pk for e in pending], 'offset': offset}
+        audit_archive.save_index(index)
+        audit_archive._append_member('2025-01', [audit_archive.serialize(e) for e in pending])
+        with open(audit_archive.segment_path('2025-01'), 'r+b') as f:
+            f.truncate(offset + 20)
+
+        self.assertEqual(self.archived_ids(), sorted(e.pk for e in first))
+        self.assertEqual(audit_archive.archive(older_than_days=30), 0)
+        self.assertEqual(self.archived_ids(), sorted(e.pk for e in first + pending))
+        self.assertFalse(AuditLog.objects.exists())
+        self.assertEqual(audit_archive.load_index()['segments']['2025-01']['count'], 4)
+
+
+@override_settings(EMAIL_OUTBOX_EAGER=False, EMAIL_OUTBOX_MAX_ATTEMPTS=3,
+                   EMAIL_OUTBOX_RETRY_BASE=60, EMAIL_OUTBOX_RETRY_MAX=3600)
+class OutboxTests(TestCase):
+    SMTP_DOWN = mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages',
+                           side_effect=ConnectionRefusedError('SMTP is down'))
+
+    def setUp(self):
+        self.email = outbox.queue_email('Subject', 'Body', ['user@example.com'])[0]
+
+    def fail_once(self):
+        with self.SMTP_DOWN, self.assertLogs('core.outbox'):
+            self.assertEqual(outbox.send_queued(), (0, 1))
+        self.email.refresh_from_db()
+
+    def make_due(self):
+        OutboundEmail.objects.filter(pk=self.email.pk).update(next_attempt_at=timezone.now())
+
+    def test_delivers_over_one_connection(self):
+        outbox.queue_email('Subject', 'Body', ['other@example.com'])
+        self.assertEqual(outbox.send_queued(), (2, 0))
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertFalse(OutboundEmail.objects.exclude(status=OutboundEmail.STATUS_SENT).exists())
+
+    def test_failures_back_off_exponentially(self):
+        self.fail_once()
+        self.assertEqual((self.email.status, self.email.attempts), (OutboundEmail.STATUS_PENDING, 1))
+        self.assertAlmostEqual((self.email.next_attempt_at - timezone.now()).total_seconds(), 60, delta=5)
+        self.assertEqual(outbox.send_queued(), (0, 0))  # not due yet
+
+        self.make_due()
+        self.fail_once()
+        self.assertAlmostEqual((self.email.next_attempt_at - timezone.now()).total_seconds(), 120, delta=5)
+        self.assertEqual(outbox.retry_delay(20), timedelta(hours=1))
+
+    def test_dead_letters_after_the_last_attempt(self):
+        for _ in range(3):
+            self.make_due()
+            self.fail_once()
+        self.assertEqual(self.email.status, OutboundEmail.STATUS_DEAD)
+        self.assertIn('SMTP is down', self.email.last_error)
+
+        self.assertEqual(outbox.requeue_dead(), 1)
+        self.assertEqual(outbox.send_queued(), (1, 0))
+
+    def test_expired_claim_is_reclaimed(self):
+        self.assertEqual(len(outbox.claim_batch(10)), 1)
+        self.assertEqual(outbox.claim_batch(10), [])
+
+        OutboundEmail.objects.filter(pk=self.email.pk).update(
+            claimed_at=timezone.now() - outbox.CLAIM_TIMEOUT - timedelta(seconds=1),
+        )
+        self.assertEqual(outbox.send_queued(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+
+@override_settings(RATE_LIMIT_BACKEND='database', RATE_LIMITS={'submit': '5/h', 'track': '1/h', 'test': '3/m'})
+class RateLimitTests(TestCase):
+    WINDOW = 600.0  # start of a one-minute window
+
+    def setUp(self):
+        # Counters this old count as expired; keep the random purge off them.
+        patcher = mock.patch.object(ratelimit, 'CLEANUP_PROBABILITY', 0)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def hits(self, at, count=1):
+        return [ratelimit.hit('test', '10.0.0.1', now=at) for _ in range(count)]
+
+    def test_limit_applies_per_window_and_rejections_are_not_counted(self):
+        self.assertEqual(self.hits(self.WINDOW, 3), [(True, 0)] * 3)
+        self.assertEqual(self.hits(self.WINDOW + 15, 2), [(False, 46)] * 2)
+        self.assertEqual(ratelimit.get_backend().get('test:10.0.0.1', 10), 3)
+        self.assertEqual(ratelimit.hit('test', '10.0.0.2', now=self.WINDOW)[0], True)
+
+    def test_previous_window_is_weighted_by_its_overlap(self):
+        self.hits(self.WINDOW, 3)
+        # Halfway into the next window: 3 * 0.5 + 1 = 2.5 allowed, then 3.5 not.
+        self.assertEqual([allowed for allowed, _ in self.hits(self.WINDOW + 90, 2)], [True, False])
+        # Three quarters in: 3 * 0.25 + 2 = 2.75.
+        self.assertTrue(self.hits(self.WINDOW + 105)[0][0])
+        # Once a whole window has passed without hits, the limit starts afresh.
+        self.assertEqual([allowed for allowed, _ in self.hits(self.WINDOW + 180, 3)], [True] * 3)
+
+    def test_middleware_answers_429_with_retry_after(self):
+        self.assertNotEqual(self.client.post('/track/', {'ref': 'ABC'}).status_code, 429)
+        response = self.client.post('/track/', {'ref': 'ABC'})
+        self.assertEqual(response.status_code, 429)
+        self.assertGreater(int(response['Retry-After']), 0)
+        self.assertNotEqual(self.client.get('/track/').status_code, 429)
+
+
+class RangeRequestTests(TestCase):
+    CONTENT = bytes(range(256)) * 4
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.path = os.path.join(tmp.name, 'form.pdf')
+        with open(self.path, 'wb') as f:
+            f.write(self.CONTENT)
+
+    def serve(self, **headers):
+        response = serve_file(RequestFactory().get('/', **headers), self.path, 'form.pdf')
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, body
+
+    def test_parse_range(self):
+        self.assertEqual(parse_range('bytes=0-99', 1024), (0, 99))
+        self.assertEqual(parse_range('bytes=1000-', 1024), (1000, 1023))
+        self.assertEqual(parse_range('bytes=1000-5000', 1024), (1000, 1023))
+        self.assertEqual(parse_range('bytes=-100', 1024), (924, 1023))
+        self.assertEqual(parse_range('bytes=-5000', 1024), (0, 1023))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1024))
+        self.assertIsNone(parse_range('items=0-1', 1024))
+        for header, size in (('bytes=1024-', 1024), ('bytes=5-2', 1024), ('bytes=-0', 1024), ('bytes=-10', 0),
+                             ('bytes=0-', 0)):
+            with self.subTest(header=header, size=size), self.assertRaises(ValueError):
+                parse_range(header, size)
+
+    def test_range_is_served_as_206(self):
+        response, body = self.serve(HTTP_RANGE='bytes=100-199')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], 'bytes 100-199/1024')
+        self.assertEqual(body, self.CONTENT[100:200])
+
+        response, body = self.serve(HTTP_RANGE='bytes=-24')
+        self.assertEqual((response.status_code, body), (206, self.CONTENT[-24:]))
+
+    def test_unsatisfiable_range_is_416(self):
+        response, _ = self.serve(HTTP_RANGE='bytes=2000-')
+        self.assertEqual((response.status_code, response['Content-Range']), (416, 'bytes */1024'))
+
+    def test_stale_if_range_ignores_an_unsatisfiable_range(self):
+        # The client's copy is outdated (the file may have shrunk): it gets
+        # the whole file, not a 416 for a range of the old one.
+        response, body = self.serve(HTTP_RANGE='bytes=2000-', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.CONTENT))
+
+    def test_stale_if_range_gets_the_whole_file(self):
+        response, body = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE='"stale"')
+        self.assertEqual((response.status_code, body), (200, self.CONTENT))
+
+        etag = response['ETag']
+        response, body = self.serve(HTTP_RANGE='bytes=0-9', HTTP_IF_RANGE=etag)
+        self.assertEqual((response.status_code, body), (206, self.CONTENT[:10]))
+        self.assertEqual(self.serve(HTTP_IF_NONE_MATCH=etag)[0].status_code, 304)
+
+
+class TrackCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.req = IFMISResetRequest.objects.create(full_name='User', department='Finance',
+                                                    email='user@example.com', uploaded_file='uploads/form.pdf')
+
+    def track(self, etag=None):
+        headers = {'HTTP_IF_NONE_MATCH': etag} if etag else {}
+        return self.client.get('/track/', {'ref': self.req.reference_code.lower()}, **headers)
+
+    def test_unchanged_page_is_served_from_the_cache(self):
+        etag = self.track()['ETag']
+        with self.assertNumQueries(0):
+            response = self.track()
+        self.assertEqual((response.status_code, response['ETag']), (200, etag))
+        with self.assertNumQueries(0):
+            self.assertEqual(self.track(etag).status_code, 304)
+
+    def test_new_message_changes_the_page(self):
+        etag = self.track()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            IFMISRequestMessage.objects.create(request=self.req, sender='admin', content='Your password was reset.')
+        response = self.track(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Your password was reset.')
+
+    def test_status_change_changes_the_page(self):
+        etag = self.track()['ETag']
+        with self.captureOnCommitCallbacks(execute=True):
+            self.req.mark_processed(staff_user())
+        response = self.track(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(self.track(response['ETag']).status_code, 304)
+
+    def test_version_is_only_bumped_once_the_change_commits(self):
+        etag = self.track()['ETag']
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with transaction.atomic():
+                IFMISRequestMessage.objects.create(request=self.req, sender='admin', content='Sent after commit.')
+                self.req.mark_processed(staff_user())
+                self.assertEqual(self.track(etag).status_code, 304)
+        self.assertTrue(callbacks)
+        response = self.track(etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Sent after commit.')
+        self.assertEqual(self.track(response['ETag']).status_code, 304)
+
+    def test_unknown_reference_creates_no_cache_entry(self):
+        response = self.client.get('/track/', {'ref': 'NOSUCHREF123'})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('ETag', response)
+        self.assertIsNone(cache.get('track_version:NOSUCHREF123'))
+
+
+class LiveTests(TestCase):
+
+    def setUp(self):
+        self.req = IFMISResetRequest.objects.create(full_name='User', department='Finance',
+                                                    email='user@example.com', uploaded_file='uploads/form.pdf')
+        self.messages = [
+            IFMISRequestMessage.objects.create(request=self.req, sender='admin', content=f'Message {i}')
+            for i in range(3)
+        ]
+
+    def test_broker_delivers_across_threads_to_that_reference_only(self):
+        broker = live.Broker()
+        event = {'type': 'status', 'processed': True}
+
+        async def scenario():
+            mine, other = broker.subscribe('REF000000001'), broker.subscribe('REF000000002')
+            thread = threading.Thread(target=broker.publish, args=('REF000000001', event))
+            thread.start()
+            thread.join()
+            received = await asyncio.wait_for(mine[1].get(), 1)
+            self.assertTrue(other[1].empty())
+            broker.unsubscribe('REF000000001', mine)
+            self.assertEqual(broker.subscriber_count(), 1)
+            broker.unsubscribe('REF000000002', other)
+            return received
+
+        self.assertEqual(asyncio.run(scenario()), event)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_full_queue_drops_events_for_the_resync(self):
+        broker = live.Broker()
+
+        async def scenario():
+            with mock.patch.object(live, 'QUEUE_SIZE', 1):
+                entry = broker.subscribe('REF000000001')
+            for processed in (True, False):
+                broker.publish('REF000000001', {'type': 'status', 'processed': processed})
+            await asyncio.sleep(0)
+            return entry[1].qsize()
+
+        self.assertEqual(asyncio.run(scenario()), 1)
+
+    def events(self, **headers):
+        response = self.client.get(f'/live/{self.req.reference_code.lower()}/events/',
+                                   {'after': self.messages[0].pk}, **headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return b''.join(response.streaming_content).decode()
+
+    def test_wsgi_snapshot_retries_at_the_polling_interval(self):
+        body = self.events()
+        self.assertTrue(body.startswith(f'retry: {live.POLL_INTERVAL_MS}\n\n'))
+        self.assertIn('event: status\ndata: {"type": "status", "processed": false}', body)
+        self.assertEqual(re.findall(r'^id: (\d+)$', body, re.M), [str(m.pk) for m in self.messages[1:]])
+
+    def test_snapshot_resumes_from_last_event_id(self):
+        body = self.events(HTTP_LAST_EVENT_ID=str(self.messages[1].pk))
+        self.assertEqual(re.findall(r'^id: (\d+)$', body, re.M), [str(self.messages[2].pk)])
+
+    def test_poll_returns_newer_messages_and_the_cursor(self):
+        url = f'/live/{self.req.reference_code}/poll/'
+        data = self.client.get(url, {'after': self.messages[0].pk}).json()
+        self.assertEqual(data['processed'], False)
+        self.assertEqual([m['content'] for m in data['messages']], ['Message 1', 'Message 2'])
+        self.assertEqual(data['cursor'], self.messages[2].pk)
+        data = self.client.get(url, {'after': data['cursor']}).json()
+        self.assertEqual((data['messages'], data['cursor']), ([], self.messages[2].pk))
+        self.assertEqual(self.client.get('/live/NOSUCHREF123/poll/').status_code, 404)
+
+    def test_bulk_status_change_is_published_after_commit(self):
+        with mock.patch.object(live.broker, 'publish') as publish:
+            with self.captureOnCommitCallbacks(execute=True):
+                with transaction.atomic():
+                    transitions.set_status([self.req.pk], True, staff_user())
+                    publish.assert_not_called()
+        publish.assert_called_once_with(self.req.reference_code, {'type': 'status', 'processed': True})
+
+
+class UploadValidationTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+
+    def submit(self, name, content):
+        return self.client.post('/', {
+            'full_name': 'Aminata Kamara',
+            'department': 'Ministry of Finance',
+            'email': 'aminata@example.gov.sl',
+            'uploaded_file': SimpleUploadedFile(name, content, 'application/pdf'),
+        })
+
+    def test_stores_the_sha256_of_the_content(self):
+        content = b'%PDF-1.4\n% reset form\n%%EOF\n'
+        self.submit('IFMIS_FORM.pdf', content)
+        req = IFMISResetRequest.objects.get()
+        self.assertEqual(req.sha256, hashlib.sha256(content).hexdigest())
+
+    def test_sniffs_content_not_the_filename(self):
+        for name, content in [('form.pdf', b'\x89PNG\r\n\x1a\n' + b'0' * 32),
+                              ('form.pdf', b'plain text, not a PDF at all'),
+                              ('form.png', b'%PDF-1.4 named like an image')]:
+            response = self.submit(name, content)
+            self.assertContains(response, 'field-error')
+        self.assertFalse(IFMISResetRequest.objects.exists())
+
+    def test_oversized_upload_is_refused(self):
+        response = self.submit('form.pdf', b'%PDF-1.4' + b'0' * (5 * 1024 * 1024))
+        self.assertContains(response, 'File size must be 5MB or less.')
+        self.assertFalse(IFMISResetRequest.objects.exists())
+
+    def test_handler_stops_at_the_limit(self):
+        request = RequestFactory().post('/')
+        handler = ValidatingUploadHandler(request, max_size=16)
+        with self.assertRaises(StopFutureHandlers):
+            handler.new_file('uploaded_file', 'form.pdf', 'application/pdf', None)
+        self.addCleanup(handler.file.close)
+        handler.receive_data_chunk(b'%PDF-1.4 0123456', 0)
+        with self.assertRaises(StopUpload):
+            handler.receive_data_chunk(b'more', 16)
+        self.assertTrue(request.upload_error.startswith('File size must be'))
+        self.assertEqual(handler.file.tell(), 16)
+
+    def test_rejected_upload_drains_the_body_and_answers_with_the_form(self):
+        request = RequestFactory().post('/', {
+            'full_name': 'Aminata Kamara',
+            'department': 'Ministry of Finance',
+            'email': 'aminata@example.gov.sl',
+            'uploaded_file': SimpleUploadedFile('form.pdf', b'%PDF-1.4' + b'0' * (6 * 1024 * 1024)),
+        })
+        request._dont_enforce_csrf_checks = True
+        response = upload_request(request)
+        # Answering before the body is read makes browsers show a reset.
+        self.assertEqual(len(request.environ['wsgi.input']), 0)
+        self.assertContains(response, 'File size must be 5MB or less.')
+        self.assertContains(response, 'Aminata Kamara')
+
+
+class ProcessRequestTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+        self.client.force_login(staff_user())
+        self.req = make_request()
+
+    def test_processing_twice_keeps_the_first_stamp(self):
+        url = f'/staff/process/{self.req.pk}/'
+        self.client.post(url)
+        first = IFMISResetRequest.objects.get(pk=self.req.pk).processed_at
+        self.client.post(url)
+        self.client.post(f'/staff/request/{self.req.reference_code}/', {'action': 'mark_processed'})
+        self.assertEqual(IFMISResetRequest.objects.get(pk=self.req.pk).processed_at, first)
+        audit.flush()
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.ACTION_MARK_PROCESSED).count(), 1)
+        self.assertEqual(OutboundEmail.objects.filter(subject__contains='Processed').count(), 1)
+
+    def test_process_is_post_only(self):
+        response = self.client.get(f'/staff/process/{self.req.pk}/')
+        self.assertEqual(response.status_code, 405)
+        self.assertFalse(IFMISResetRequest.objects.get(pk=self.req.pk).processed)
+
+
+class DashboardFragmentTests(TestCase):
+    """The dashboard script's partial responses (core.views, fragment mode)."""
+
+    XHR = {'HTTP_X_REQUESTED_WITH': 'XMLHttpRequest'}
+
+    def setUp(self):
+        use_temp_media(self)
+        self.client.force_login(staff_user())
+        self.requests = [make_request(i) for i in range(3)]
+
+    def test_html_fragment_has_rows_and_pager_only(self):
+        response = self.client.get('/staff/dashboard/fragment/', **self.XHR)
+        html = response.content.decode()
+        self.assertIn('<template data-target="tblBody">', html)
+        self.assertIn('<template data-target="tblPager">', html)
+        self.assertNotIn('<html', html)
+        for req in self.requests:
+            self.assertIn(f'id="req-{req.pk}"', html)
+
+    def test_json_fragment(self):
+        response = self.client.get('/staff/dashboard/fragment/', {'format': 'json'})
+        data = response.json()
+        self.assertEqual({r['reference_code'] for r in data['results']},
+                         {req.reference_code for req in self.requests})
+        self.assertEqual(data['count'], 3)
+
+    def test_process_returns_the_single_row(self):
+        req = self.requests[0]
+        response = self.client.post(f'/staff/process/{req.pk}/?n=2', **self.XHR)
+        html = response.content.decode()
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(html.startswith(f'<tr id="req-{req.pk}"'))
+        self.assertEqual(html.count('<tr'), 1)
+        self.assertIn('<td data-label="Row">2</td>', html)
+        self.assertIn('data-status="processed"', html)
+        self.assertEqual(json.loads(response['X-Dashboard-KPIs']),
+                         {'total': 3, 'pending': 2, 'processed': 1, 'overdue': 0})
+
+    def test_repeated_process_reports_unchanged_kpis(self):
+        url = f'/staff/process/{self.requests[0].pk}/'
+        first = self.client.post(url, **self.XHR)['X-Dashboard-KPIs']
+        self.assertEqual(self.client.post(url, **self.XHR)['X-Dashboard-KPIs'], first)
+
+    def test_process_without_script_redirects(self):
+        response = self.client.post(f'/staff/process/{self.requests[0].pk}/')
+        self.assertRedirects(response, '/staff/dashboard/', fetch_redirect_response=False)
+
+    def test_delete_returns_no_content(self):
+        req = self.requests[0]
+        response = self.client.post(f'/staff/delete/{req.pk}/', **self.XHR)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(IFMISResetRequest.objects.filter(pk=req.pk).exists())
+        self.assertEqual(json.loads(response['X-Dashboard-KPIs']),
+                         {'total': 2, 'pending': 2, 'processed': 0, 'overdue': 0})
+
+    def test_expired_session_is_redirected_to_login(self):
+        self.client.logout()
+        response = self.client.get('/staff/dashboard/fragment/', **self.XHR)
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(response['Location'].startswith('/staff/login/'))
+
+
+@override_settings(API_SERVICE_TOKENS=['s3cret-token'])
+class ApiTests(TestCase):
+    TOKEN = {'HTTP_AUTHORIZATION': 'Bearer s3cret-token'}
+
+    def setUp(self):
+        self.requests = [
+            IFMISResetRequest.objects.create(full_name=f'User {i}', department='Finance',
+                                             email=f'user{i}@example.com', uploaded_file='uploads/form.pdf')
+            for i in range(3)
+        ]
+
+    def get(self, params=None, **headers):
+        return self.client.get('/api/v1/requests/', params or {}, **headers)
+
+    def test_requires_a_known_token_or_an_admin_session(self):
+        self.assertEqual(self.get().status_code, 401)
+        self.assertEqual(self.get(HTTP_AUTHORIZATION='Bearer wrong').status_code, 401)
+        self.assertEqual(self.get(**self.TOKEN).status_code, 200)
+        self.client.force_login(staff_user())
+        self.assertEqual(self.get().status_code, 200)
+
+    def test_fields_limits_the_response_and_the_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.get({'fields': 'reference_code,processed'}, **self.TOKEN)
+        self.assertEqual(set(response.json()['results'][0]), {'reference_code', 'processed'})
+        select = next(q['sql'] for q in queries.captured_queries if 'FROM "core_ifmisresetrequest"' in q['sql'])
+        self.assertNotIn('full_name', select)
+        self.assertNotIn('email', select)
+
+        self.assertEqual(self.get({'fields': 'password'}, **self.TOKEN).status_code, 400)
+
+    def test_updated_since_pages_through_changed_rows_in_update_order(self):
+        base = timezone.now() - timedelta(hours=1)
+        for minutes, req in zip((30, 10, 20), self.requests):
+            IFMISResetRequest.objects.filter(pk=req.pk).update(updated_at=base + timedelta(minutes=minutes))
+
+        params = {'updated_since': (base + timedelta(minutes=15)).isoformat(), 'limit': 1, 'fields': 'id'}
+        seen = []
+        while True:
+            body = self.get(params, **self.TOKEN).json()
+            seen += [row['id'] for row in body['results']]
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(seen, [self.requests[2].pk, self.requests[0].pk])
+
+    def test_backfilled_processed_at_counts_as_an_update(self):
+        req = self.requests[0]
+        IFMISResetRequest.objects.filter(pk=req.pk).update(processed=True, updated_at=timezone.now() - timedelta(days=1))
+        AuditLog.bulk_append([AuditLog(action=AuditLog.ACTION_MARK_PROCESSED, ref_code=req.reference_code)])
+        since = timezone.now()
+
+        self.assertEqual(analytics.backfill_processed_at(), 1)
+        body = self.get({'updated_since': since.isoformat(), 'fields': 'id,processed_at'}, **self.TOKEN).json()
+        self.assertEqual([row['id'] for row in body['results']], [req.pk])
+        self.assertIsNotNone(body['results'][0]['processed_at'])
+
+    def test_after_id_returns_audit_entries_flushed_after_the_last_poll(self):
+        audit.flush()
+        seen = AuditLog.bulk_append([AuditLog(action=AuditLog.ACTION_LOGIN)])[0]
+        audit.record(AuditLog(action=AuditLog.ACTION_VIEW_REQUEST, ref_code=self.requests[0].reference_code))
+        polled_at = timezone.now()
+        params = {'after_id': seen.pk, 'fields': 'id,action'}
+        self.assertEqual(self.client.get('/api/v1/audit/', params, **self.TOKEN).json()['results'], [])
+
+        audit.flush()
+        late = self.client.get('/api/v1/audit/', {'updated_since': polled_at.isoformat()}, **self.TOKEN)
+        self.assertEqual(late.json()['results'], [])
+        body = self.client.get('/api/v1/audit/', params, **self.TOKEN).json()
+        self.assertEqual([row['action'] for row in body['results']], [AuditLog.ACTION_VIEW_REQUEST])
+        self.assertGreater(body['results'][0]['id'], seen.pk)
+
+    def test_after_id_pages_messages_by_id(self):
+        messages = [
+            IFMISRequestMessage.objects.create(request=req, sender='user', content=req.full_name)
+            for req in self.requests
+        ]
+        params = {'after_id': messages[0].pk, 'limit': 1, 'fields': 'id'}
+        seen = []
+        while True:
+            body = self.client.get('/api/v1/messages/', params, **self.TOKEN).json()
+            seen += [row['id'] for row in body['results']]
+            if not body['next_cursor']:
+                break
+            params['cursor'] = body['next_cursor']
+        self.assertEqual(seen, [m.pk for m in messages[1:]])
+        self.assertEqual(self.client.get('/api/v1/messages/', {'after_id': 'x'}, **self.TOKEN).status_code, 400)
+
+
+class RoleCacheTests(TestCase):
+    """The IFMIS_ADMIN check remembered in the session (core.roles)."""
+
+    def setUp(self):
+        cache.clear()
+        self.user = staff_user()
+        self.group = Group.objects.get(name=ADMIN_GROUP)
+        self.client.force_login(self.user)
+
+    def status(self):
+        return self.client.get('/api/v1/requests/', {'fields': 'id'}).status_code
+
+    def group_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            status = self.status()
+        return status, sum('"auth_user_groups"' in q['sql'] for q in queries.captured_queries)
+
+    def test_role_is_checked_once_per_session(self):
+        self.assertEqual(self.group_queries(), (200, 1))
+        self.assertEqual(self.group_queries(), (200, 0))
+
+    def test_group_changes_apply_on_the_next_request(self):
+        self.assertEqual(self.status(), 200)
+        self.user.groups.remove(self.group)
+        self.assertEqual(self.group_queries(), (401, 1))
+        self.user.groups.add(self.group)
+        self.assertEqual(self.status(), 200)
+        self.group.delete()
+        self.assertEqual(self.status(), 401)
+
+    def test_cached_role_expires_after_the_ttl(self):
+        self.assertEqual(self.status(), 200)
+        # Bypasses the signals, like a change made in another worker that
+        # has its own cache.
+        User.groups.through.objects.filter(user=self.user).delete()
+        self.assertEqual(self.status(), 200)
+
+        session = self.client.session
+        session[roles.SESSION_KEY]['at'] -= settings.ROLE_CACHE_TTL
+        session.save()
+        self.assertEqual(self.group_queries(), (401, 1))
+
+
+class ContentAddressedStorageTests(TestCase):
+
+    def setUp(self):
+        self.media = use_temp_media(self)
+        self.storage = upload_storage()
+
+    def refcount(self, name):
+        return UploadBlob.objects.filter(name=name).values_list('refcount', flat=True).first()
+
+    def test_identical_uploads_share_one_file(self):
+        first, second, other = make_request(1), make_request(1), make_request(2)
+        name = first.uploaded_file.name
+        self.assertEqual(second.uploaded_file.name, name)
+        self.assertNotEqual(other.uploaded_file.name, name)
+        self.assertEqual(name, f"uploads/{hashlib.sha256(b'%PDF-1.4 form 1').hexdigest()}.pdf")
+        self.assertEqual(self.refcount(name), 2)
+        self.assertEqual(len(os.listdir(os.path.join(self.media, 'uploads'))), 2)
+
+    def test_file_is_removed_with_its_last_reference(self):
+        name = make_request(1).uploaded_file.name
+        make_request(1)
+
+        self.storage.delete(name)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.delete(name)
+        self.assertIsNone(self.refcount(name))
+        self.assertFalse(self.storage.exists(name))
+
+    def test_collect_only_removes_unreferenced_files(self):
+        name = make_request(1).uploaded_file.name
+        make_request(1)
+        self.storage.release([name])
+        self.assertEqual(self.storage.collect([name]), [])
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.release([name])
+        self.assertEqual(self.storage.collect([name]), [name])
+        self.assertFalse(self.storage.exists(name))
+        self.assertEqual(self.storage.collect([name]), [])
+
+    def test_upload_after_the_last_copy_went_is_stored_afresh(self):
+        name = make_request(1).uploaded_file.name
+        self.storage.delete(name)
+        self.assertEqual(make_request(1).uploaded_file.name, name)
+        self.assertEqual(self.refcount(name), 1)
+        self.assertTrue(self.storage.exists(name))
+
+
+class PreviewCacheTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+
+    def test_uploads_differing_only_in_extension_have_separate_previews(self):
+        pdf, jpg = 'uploads/scan.pdf', 'uploads/scan.jpg'
+        self.assertNotEqual(previews.preview_name(pdf), previews.preview_name(jpg))
+
+        os.makedirs(os.path.dirname(previews.preview_path(pdf)))
+        open(previews.preview_path(pdf), 'wb').close()
+        self.assertIsNotNone(previews.cached_preview(pdf))
+        self.assertIsNone(previews.cached_preview(jpg))
+
+
+class MetricsTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        override = override_settings(METRICS_ENABLED=True, METRICS_DIR=self.directory)
+        override.enable()
+        self.addCleanup(override.disable)
+        patcher = mock.patch.object(metrics, '_registry', metrics.Registry())
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def dead_pid(self):
+        process = subprocess.Popen([sys.executable, '-c', 'pass'])
+        process.wait()
+        return process.pid
+
+    def emails_sent(self):
+        counters, _ = metrics.collect()
+        return counters.get(('ifmis_emails_total', (('outcome', 'sent'),)), 0)
+
+    def test_histogram_rendering(self):
+        for seconds in (0.003, 0.02, 0.3, 20):
+            metrics.observe('ifmis_http_request_duration_seconds', seconds, view='home', method='GET')
+        lines = metrics.render().splitlines()
+        name = 'ifmis_http_request_duration_seconds'
+        labels = 'method="GET",view="home"'
+        self.assertIn(f'{name}_bucket{{{labels},le="0.005"}} 1', lines)
+        self.assertIn(f'{name}_bucket{{{labels},le="0.025"}} 2', lines)
+        self.assertIn(f'{name}_bucket{{{labels},le="0.5"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{{labels},le="10.0"}} 3', lines)
+        self.assertIn(f'{name}_bucket{{{labels},le="+Inf"}} 4', lines)
+        self.assertIn(f'{name}_count{{{labels}}} 4', lines)
+        self.assertIn(f'{name}_sum{{{labels}}} 20.323', lines)
+        self.assertIn(f'# TYPE {name} histogram', lines)
+
+    def test_exited_process_files_are_merged_once(self):
+        sent = lambda n: {'counters': [['ifmis_emails_total', [['outcome', 'sent']], n]], 'histograms': []}
+        dead_file = f'{self.dead_pid()}-deadbeef.json'
+        with open(os.path.join(self.directory, dead_file), 'w') as f:
+            json.dump(sent(3), f)
+        with open(os.path.join(self.directory, metrics.EXITED_FILE), 'w') as f:
+            json.dump(sent(2), f)
+        metrics.inc('ifmis_emails_total', outcome='sent')
+
+        self.assertEqual(self.emails_sent(), 6)
+        self.assertNotIn(dead_file, os.listdir(self.directory))
+        self.assertEqual(self.emails_sent(), 6)
+
+    def test_scrape_survives_unwritable_directory(self):
+        blocker = os.path.join(self.directory, 'not-a-directory')
+        open(blocker, 'w').close()
+        metrics.inc('ifmis_emails_total', outcome='sent')
+        self.client.force_login(staff_user())
+        with override_settings(METRICS_DIR=blocker), self.assertLogs('core.metrics', 'ERROR'):
+            response = self.client.get('/staff/metrics/')
+        self.assertEqual(response.status_code, 200)
+
+
+class CounterTests(TestCase):
+
+    def stored(self):
+        return set(RequestCounter.objects.exclude(count=0).values_list('day', 'department', 'processed', 'count'))
+
+    def test_incremental_updates_agree_with_a_rebuild(self):
+        user = staff_user()
+        requests = [
+            IFMISResetRequest.objects.create(full_name=f'User {i}', department=('Finance', 'Health')[i % 2],
+                                             email=f'user{i}@example.com', uploaded_file='uploads/form.pdf')
+            for i in range(6)
+        ]
+        IFMISResetRequest.objects.filter(pk=requests[5].pk).update(submitted_at=timezone.now() - timedelta(days=9))
+        counters.rebuild()
+
+        requests[0].mark_processed(user)
+        requests[1].mark_processed(user)
+        requests[1].mark_pending()
+        requests[2].department = 'Treasury'
+        requests[2].save()
+        requests[3].delete()
+        transitions.set_status([requests[4].pk, requests[5].pk, requests[0].pk], True, user)
+
+        incremental = self.stored()
+        self.assertEqual(counters.discrepancies(), {})
+        counters.rebuild()
+        self.assertEqual(self.stored(), incremental)
+        self.assertEqual(counters.kpis(), {'total': 5, 'pending': 2, 'processed': 3, 'overdue': 0})
+
+    def test_reconcile_repairs_drifted_counters(self):
+        IFMISResetRequest.objects.create(full_name='User', department='Finance', email='user@example.com',
+                                         uploaded_file='uploads/form.pdf')
+        RequestCounter.objects.update(count=5)
+        self.assertEqual(len(counters.discrepancies()), 1)
+
+        call_command('reconcile_request_counters', stdout=StringIO())
+        self.assertEqual(counters.discrepancies(), {})
+        self.assertEqual(counters.kpis()['total'], 1)
+
+
+class TurnaroundRollupTests(TestCase):
+    DAY = date(2026, 3, 10)
+
+    def setUp(self):
+        self.alice, self.bob = staff_user('alice'), staff_user('bob')
+
+    def processed(self, department, hours, admin, day=DAY):
+        processed_at = analytics.day_bounds(day)[0] + timedelta(hours=12)
+        req = IFMISResetRequest.objects.create(full_name='User', department=department,
+                                               email='user@example.com', uploaded_file='uploads/form.pdf')
+        IFMISResetRequest.objects.filter(pk=req.pk).update(
+            processed=True, processed_at=processed_at, processed_by=admin,
+            submitted_at=processed_at - timedelta(hours=hours),
+        )
+        return req
+
+    def rollup(self, dimension, key, day=DAY):
+        return TurnaroundRollup.objects.get(day=day, dimension=dimension, key=key)
+
+    def test_rollup_day_stores_exact_percentiles_per_department_and_admin(self):
+        for hours in (1, 2, 3):
+            self.processed('Finance', hours, self.alice)
+        self.processed('Health', 10, self.bob)
+        self.processed('Finance', 1, self.alice, day=self.DAY + timedelta(days=1))
+
+        self.assertEqual(analytics.rollup_day(self.DAY), 4)
+        finance = self.rollup(TurnaroundRollup.DIMENSION_DEPARTMENT, 'Finance')
+        self.assertEqual((finance.count, finance.p50_seconds, finance.p90_seconds), (3, 7200, 10080))
+        self.assertEqual(sum(finance.histogram), 3)
+        alice = self.rollup(TurnaroundRollup.DIMENSION_ADMIN, str(self.alice.pk))
+        self.assertEqual((alice.label, alice.count), ('alice', 3))
+
+        # Rerunning a day replaces its rows.
+        self.assertEqual(analytics.rollup_day(self.DAY), 4)
+        self.assertEqual(TurnaroundRollup.objects.count(), 4)
+
+    def test_summary_is_exact_for_one_day_and_merges_histograms_across_days(self):
+        self.processed('Finance', 1, self.alice)
+        self.processed('Finance', 3, self.alice)
+        self.processed('Finance', 30, self.alice, day=self.DAY + timedelta(days=1))
+        analytics.rollup_day(self.DAY)
+        analytics.rollup_day(self.DAY + timedelta(days=1))
+
+        one_day = analytics.summary(self.DAY, self.DAY)[TurnaroundRollup.DIMENSION_DEPARTMENT]
+        self.assertEqual(one_day, [{'label': 'Finance', 'count': 2, 'p50': 7200, 'p90': 10080,
+                                    'p99': 10728, 'approximate': False}])
+
+        [merged] = analytics.summary(self.DAY, self.DAY + timedelta(days=1))[TurnaroundRollup.DIMENSION_DEPARTMENT]
+        self.assertEqual((merged['count'], merged['approximate']), (3, True))
+        # The median (3h) falls in the 2h-4h bucket, the p99 (30h) in 1d-2d.
+        self.assertTrue(2 * 3600 <= merged['p50'] <= 4 * 3600)
+        self.assertTrue(86400 <= merged['p99'] <= 2 * 86400)
+
+    def status_history(self):
+        """A processed request lacking processed_at, and the entry that completed it."""
+        req = self.processed('Finance', 1, None)
+        IFMISResetRequest.objects.filter(pk=req.pk).update(processed_at=None)
+        now = timezone.now()
+        history = [
+            (AuditLog.ACTION_MARK_PROCESSED, self.bob, 4),
+            (AuditLog.ACTION_MARK_PENDING, self.alice, 3),
+            (AuditLog.ACTION_MARK_PROCESSED, self.alice, 2),
+            # A duplicate, e.g. a bulk action over the already processed row.
+            (AuditLog.ACTION_MARK_PROCESSED, self.bob, 1),
+        ]
+        entries = AuditLog.bulk_append([
+            AuditLog(action=action, ref_code=req.reference_code, admin=admin, timestamp=now - timedelta(days=days))
+            for action, admin, days in reversed(history)
+        ])
+        return req, entries[1]
+
+    def test_backfill_uses_the_first_mark_processed_after_the_last_revert(self):
+        req, completed = self.status_history()
+        self.assertEqual(analytics.backfill_processed_at(), 1)
+        req.refresh_from_db()
+        self.assertEqual((req.processed_at, req.processed_by), (completed.timestamp, self.alice))
+        self.assertEqual(analytics.backfill_processed_at(), 0)
+
+    def test_migration_backfill_ignores_duplicate_mark_processed_entries(self):
+        req, completed = self.status_history()
+        migration = importlib.import_module('core.migrations.0013_processed_at_turnaroundrollup')
+        migration.backfill_processed_at(django_apps, None)
+        req.refresh_from_db()
+        self.assertEqual((req.processed_at, req.processed_by), (completed.timestamp, self.alice))
+
+
+class ExportTests(TestCase):
+
+    def setUp(self):
+        self.client.force_login(staff_user())
+        for i, name in enumerate(['Alice', 'Bob', '=HYPERLINK("http://evil")']):
+            IFMISResetRequest.objects.create(full_name=name, department='Finance', email=f'user{i}@example.com',
+                                             uploaded_file='uploads/form.pdf')
+
+    def export(self, **params):
+        response = self.client.get('/staff/export/', params)
+        self.assertTrue(response.streaming)
+        chunks = [chunk if isinstance(chunk, bytes) else chunk.encode() for chunk in response.streaming_content]
+        return response, chunks
+
+    def test_csv_streams_one_chunk_per_row(self):
+        response, chunks = self.export(format='csv')
+        self.assertEqual(response['Content-Type'], export.CSV_CONTENT_TYPE)
+        self.assertEqual(len(chunks), 4)
+        rows = list(csv.reader(b''.join(chunks).decode('utf-8-sig').splitlines()))
+        self.assertEqual(rows[0], [title for _, title in export.COLUMNS])
+        self.assertEqual([row[1] for row in rows[1:]], ['\'=HYPERLINK("http://evil")', 'Bob', 'Alice'])
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.ACTION_EXPORT).count(), 1)
+
+    def test_csv_applies_the_dashboard_filters(self):
+        _, chunks = self.export(format='csv', q='Bob')
+        rows = list(csv.reader(b''.join(chunks).decode('utf-8-sig').splitlines()))
+        self.assertEqual([row[1] for row in rows[1:]], ['Bob'])
+
+    def test_xlsx_is_a_valid_workbook_written_in_pieces(self):
+        # Random cell values, so the compressor cannot hold everything back.
+        rows = ([f'REF{i}', os.urandom(32).hex()] for i in range(2000))
+        chunks = list(export.stream_xlsx(rows, flush_every=100))
+        self.assertGreater(len(chunks), 5)
+        with zipfile.ZipFile(BytesIO(b''.join(chunks))) as archive:
+            self.assertIsNone(archive.testzip())
+            sheet = archive.read('xl/worksheets/sheet1.xml').decode()
+        self.assertEqual(sheet.count('<row>'), 2001)
+        self.assertIn('REF1999', sheet)
+
+        response, chunks = self.export(format='xlsx')
+        self.assertEqual(response['Content-Type'], export.XLSX_CONTENT_TYPE)
+        with zipfile.ZipFile(BytesIO(b''.join(chunks))) as archive:
+            self.assertIn('Alice', archive.read('xl/worksheets/sheet1.xml').decode())
+
+    def test_unknown_format_is_404(self):
+        self.assertEqual(self.client.get('/staff/export/', {'format': 'pdf'}).status_code, 404)
+
+
+class BulkDeleteTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+        self.user = staff_user()
+        self.requests = [make_request(i) for i in range(4)]
+        self.names = [req.uploaded_file.name for req in self.requests]
+
+    def test_job_and_audit_entry_share_one_snapshot(self):
+        self.client.force_login(self.user)
+        keep = self.requests[:2]
+        self.client.post('/staff/bulk-delete/', {
+            'selected_ids': [str(req.pk) for req in keep] + ['abc', '999999'],
+        })
+        job = BulkDeleteJob.objects.get()
+        self.assertEqual(job.request_ids, sorted(req.pk for req in keep))
+        detail = AuditLog.objects.get(action=AuditLog.ACTION_BULK_DELETE).detail
+        self.assertEqual(detail, f"Bulk deleted 2 request(s): {keep[0].reference_code}, {keep[1].reference_code}")
+
+    def test_rerun_resumes_from_the_pending_files_journal(self):
+        job = create_job(self.user, [req.pk for req in self.requests])
+        with mock.patch.object(upload_storage(), 'collect', side_effect=OSError('disk unavailable')), \
+                self.assertLogs('core.bulkdelete', 'ERROR'):
+            job = run_job(job.pk, chunk_size=2)
+        self.assertEqual((job.status, job.position, job.deleted), (BulkDeleteJob.STATUS_FAILED, 2, 2))
+        self.assertEqual(sorted(job.pending_files), sorted(self.names[:2]))
+        self.assertTrue(all(upload_storage().exists(name) for name in self.names))
+
+        job = run_job(job.pk, chunk_size=2)
+        self.assertEqual((job.status, job.deleted, job.files_removed), (BulkDeleteJob.STATUS_DONE, 4, 4))
+        self.assertEqual(job.pending_files, [])
+        self.assertFalse(IFMISResetRequest.objects.exists())
+        self.assertFalse(any(upload_storage().exists(name) for name in self.names))
+        self.assertFalse(UploadBlob.objects.exists())
+
+
+class PurgeTests(TestCase):
+
+    def setUp(self):
+        use_temp_media(self)
+
+        def make(i, processed_days_ago=None):
+            req = make_request(i)
+            if processed_days_ago is not None:
+                IFMISResetRequest.objects.filter(pk=req.pk).update(
+                    processed=True, processed_at=timezone.now() - timedelta(days=processed_days_ago))
+            return req
+
+        self.old = [make(i, 400) for i in range(3)]
+        self.recent = make(3, 10)
+        self.pending = make(4)
+        counters.rebuild()
+
+    def test_dry_run_changes_nothing(self):
+        found = retention.estimate(retention.cutoff_for(365))
+        self.assertEqual((found['requests'], found['files']), (3, 3))
+        self.assertGreater(found['bytes'], 0)
+        self.assertEqual(IFMISResetRequest.objects.count(), 5)
+
+    def test_purge_removes_expired_requests_and_files(self):
+        names = [req.uploaded_file.name for req in self.old]
+        result = retention.purge(365, chunk_size=2)
+        self.assertEqual((result['requests'], result['files']), (3, 3))
+        self.assertEqual(set(IFMISResetRequest.objects.values_list('pk', flat=True)),
+                         {self.recent.pk, self.pending.pk})
+        self.assertFalse(any(upload_storage().exists(name) for name in names))
+        self.assertEqual(counters.kpis()['total'], 2)
+        self.assertEqual(AuditLog.objects.filter(action=AuditLog.ACTION_PURGE_REQUESTS).count(), 1)
+
+    def test_skips_requests_reverted_after_the_snapshot(self):
+        job = BulkDeleteJob.objects.create(request_ids=[req.pk for req in self.old],
+                                           purge_before=retention.cutoff_for(365))
+        reverted = IFMISResetRequest.objects.get(pk=self.old[0].pk)
+        reverted.mark_pending()
+        run_job(job.pk)
+        job.refresh_from_db()
+        self.assertEqual(job.deleted, 2)
+        self.assertTrue(IFMISResetRequest.objects.filter(pk=reverted.pk).exists())
+        self.assertTrue(upload_storage().exists(reverted.uploaded_file.name))
+
+    def test_resumes_failed_purge(self):
+        job = BulkDeleteJob.objects.create(request_ids=[self.old[0].pk], purge_before=timezone.now(),
+                                           status=BulkDeleteJob.STATUS_FAILED)
+        result = retention.purge(365)
+        self.assertEqual(result['requests'], 3)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.deleted), (BulkDeleteJob.STATUS_DONE, 1))
+
+
+class DateFilterTests(TestCase):
+
+    def setUp(self):
+        for ref, when in [('A', '2025-03-14 10:00'), ('B', '2026-03-14 23:59'),
+                          ('C', '2026-03-15 00:00'), ('D', '2026-04-14 08:00')]:
+            req = IFMISResetRequest.objects.create(full_name=ref, department='Finance', email='user@example.com',
+                                                   uploaded_file='uploads/form.pdf', reference_code=ref)
+            IFMISResetRequest.objects.filter(pk=req.pk).update(submitted_at=f'{when}Z')
+
+    def refs(self, **params):
+        request = RequestFactory().get('/staff/dashboard/', params)
+        return sorted(filter_requests(request)[0].values_list('reference_code', flat=True))
+
+    def test_ranges_match_calendar_parts(self):
+        self.assertEqual(self.refs(year='2026'), ['B', 'C', 'D'])
+        self.assertEqual(self.refs(month='3'), ['A', 'B', 'C'])
+        self.assertEqual(self.refs(day='14'), ['A', 'B', 'D'])
+        self.assertEqual(self.refs(day='14', month='3', year='2026'), ['B'])
+        self.assertEqual(self.refs(day='31', month='2'), [])
+        self.assertEqual(self.refs(month='13'), [])
+
+
+@skipIf(connection.vendor == 'sqlite' and connection.is_in_memory_db(),
+        'Needs a database file that several connections can share.')
+class UploadContentionTests(TransactionTestCase):
+    """
+    Many submissions at once, from separate connections, all get through:
+    no "database is locked", no lost reference counts or counter updates.
+    """
+    THREADS = 8
+    UPLOADS_PER_THREAD = 5
+
+    def setUp(self):
+        self.media = tempfile.TemporaryDirectory()
+        self.settings_override = override_settings(
+            MEDIA_ROOT=self.media.name,
+            PREVIEW_CACHE_DIR=f'{self.media.name}/previews',
+            METRICS_ENABLED=False,
+        )
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        self.media.cleanup()
+
+    def submit_many(self, thread_no, statuses, errors):
+        client = Client()
+        try:
+            for i in range(self.UPLOADS_PER_THREAD):
+                # A few distinct files, so threads race on the same blobs.
+                upload = SimpleUploadedFile('IFMIS_FORM.pdf', f'%PDF-1.4 form {i % 3}'.encode(), 'application/pdf')
+                response = client.post('/', {
+                    'full_name': f'User {thread_no}-{i}',
+                    'department': 'Finance',
+                    'email': 'user@example.com',
+                    'uploaded_file': upload,
+                }, REMOTE_ADDR=f'10.0.{thread_no}.{i}')
+                statuses.append(response.status_code)
+        except Exception as exc:
+            errors.append(exc)
+        finally:
+            connections.close_all()
+
+    def test_concurrent_uploads(self):
+        statuses, errors = [], []
+        threads = [
+            threading.Thread(target=self.submit_many, args=(n, statuses, errors))
+            for n in range(self.THREADS)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        expected = self.THREADS * self.UPLOADS_PER_THREAD
+        self.assertEqual(errors, [])
+        self.assertEqual(statuses, [200] * expected)
+        self.assertEqual(IFMISResetRequest.objects.count(), expected)
+        self.assertEqual(UploadBlob.objects.aggregate(n=Sum('refcount'))['n'], expected)
+        for name in UploadBlob.objects.values_list('name', flat=True):
+            self.assertTrue(upload_storage().exists(name))
+        self.assertEqual(counters.kpis()['total'], expected)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite only.')
+    def test_sqlite_connection_tuning(self):
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+            cursor.execute('PRAGMA busy_timeout')
+            self.assertGreater(cursor.fetchone()[0], 0)
 
-# Create your tests here.
@@ -0,0 +1,102 @@
+"""
+Response cache for the public track page.
+
+Each reference code has a version number in the cache. The rendered page is
+stored under ``(reference code, version)`` and the version doubles as the
+ETag, so a refresh that sees no change is a cache lookup plus either a 304 or
+the stored HTML: no database query, no template render. ``core.signals``
+bumps the version once a save of the request (e.g. ``processed`` flips) or a
+new message has committed; code that changes requests with
+``QuerySet.update()`` must call ``invalidate`` itself, also after commit.
+Versions are only created for reference codes that exist, so mistyped codes
+do not fill the cache.
+
+The cached HTML is rendered with a placeholder instead of the CSRF token; the
+visitor's own token is substituted on the way out.
+
+With a per-process cache (LocMemCache) a change made in one worker is only
+seen by the others after ``TRACK_CACHE_TTL`` seconds; with a shared cache
+invalidation is immediate.
+"""
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.template.loader import render_to_string
+from django.utils.cache import get_conditional_response
+
+from . import metrics
+
+
+CSRF_PLACEHOLDER = '__ifmis_track_csrf_token__'
+
+
+def _version_key(ref_code):
+    return f'track_version:{ref_code}'
+
+
+def _page_key(ref_code, version):
+    return f'track_page:{ref_code}:{version}'
+
+
+def current_version(ref_code):
+    """The cached version of ``ref_code``'s page, or ``None`` if there is none."""
+    return cache.get(_version_key(ref_code))
+
+
+def get_version(ref_code):
+    """Current version of ``ref_code``'s page, created if needed. Existing requests only."""
+    key = _version_key(ref_code)
+    cache.add(key, time.time_ns(), timeout=settings.TRACK_CACHE_TTL)
+    return cache.get(key)
+
+
+def invalidate(*ref_codes):
+    cache.set_many(
+        {_version_key(ref): time.time_ns() for ref in ref_codes if ref},
+        timeout=settings.TRACK_CACHE_TTL,
+    )
+
+
+def etag_for(ref_code, version):
+    return f'"track-{ref_code}-{version}"'
+
+
+def _finalize(request, html, etag):
+    response = HttpResponse(html.replace(CSRF_PLACEHOLDER, get_token(request)))
+    response['ETag'] = etag
+    # Always revalidate; never let a shared proxy keep a requester's page.
+    response['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+def cached_response(request, ref_code):
+    """
+    Return a 304 or the stored page for ``ref_code``, or ``None`` on a miss.
+    Also returns the version to render against on a miss, which is ``None``
+    when no version exists yet (see ``get_version``).
+    """
+    version = current_version(ref_code)
+    if version is None:
+        metrics.inc('ifmis_track_cache_total', result='miss')
+        return None, None
+    etag = etag_for(ref_code, version)
+    not_modified = get_conditional_response(request, etag=etag)
+    if not_modified is not None:
+        metrics.inc('ifmis_track_cache_total', result='not_modified')
+        return not_modified, version
+    html = cache.get(_page_key(ref_code, version))
+    if html is None:
+        metrics.inc('ifmis_track_cache_total', result='miss')
+        return None, version
+    metrics.inc('ifmis_track_cache_total', result='hit')
+    return _finalize(request, html, etag), version
+
+
+def render_and_store(request, ref_code, version, template_name, context):
+    """Render the page once, cache it under ``version`` and return it."""
+    html = render_to_string(template_name, {**context, 'csrf_token': CSRF_PLACEHOLDER}, request=request)
+    cache.set(_page_key(ref_code, version), html, timeout=settings.TRACK_CACHE_TTL)
+    return _finalize(request, html, etag_for(ref_code, version))
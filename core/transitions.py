@@ -0,0 +1,68 @@
+"""
+Bulk status changes for requests.
+
+``set_status`` moves many requests to processed or back to pending with a
+single ``UPDATE ... WHERE id IN (...) AND processed = <old>``, instead of one
+``save()`` per row. Because ``QuerySet.update()`` sends no signals, the work
+``core.signals`` does for a single save is done here explicitly, in the same
+transaction: the dashboard counters are moved, one audit entry per request
+is written with one bulk INSERT, and the track page caches and live status
+streams are refreshed once the transaction commits.
+"""
+from django.db import transaction
+from django.utils import timezone
+
+from . import audit, counters, live, trackcache
+from .models import AuditLog, IFMISResetRequest
+
+
+def set_status(pks, processed, user, ip_address=None):
+    """
+    Set ``processed`` on the requests in ``pks`` that are not already in
+    that state. Returns those requests, as they were before the change.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        # Locks the rows (PostgreSQL) or the database (SQLite, BEGIN
+        # IMMEDIATE), so the rows read here are exactly the ones updated.
+        changed = list(
+            IFMISResetRequest.objects.select_for_update()
+            .filter(pk__in=pks, processed=not processed)
+            .only('pk', 'reference_code', 'full_name', 'email', 'department', 'submitted_at', 'processed')
+            .order_by('pk')
+        )
+        if not changed:
+            return []
+
+        IFMISResetRequest.objects.filter(
+            pk__in=[req.pk for req in changed], processed=not processed,
+        ).update(
+            processed=processed,
+            processed_at=now if processed else None,
+            processed_by=user if processed else None,
+            updated_at=now,
+        )
+        counters.move_status(changed, processed)
+
+        if processed:
+            action, detail = AuditLog.ACTION_MARK_PROCESSED, "Marked {}'s request as processed (bulk)"
+        else:
+            action, detail = AuditLog.ACTION_MARK_PENDING, "Reverted {}'s request to pending (bulk)"
+        # Buffered entries belong to other requests; they are written after
+        # commit so a rollback here cannot take them with it.
+        audit.flush()
+        AuditLog.bulk_append([
+            AuditLog(admin=user, action=action, ref_code=req.reference_code,
+                     detail=detail.format(req.full_name), ip_address=ip_address, timestamp=now)
+            for req in changed
+        ])
+
+        refs = [req.reference_code for req in changed]
+        transaction.on_commit(lambda: _after_commit(refs, processed))
+    return changed
+
+
+def _after_commit(refs, processed):
+    trackcache.invalidate(*refs)
+    for ref in refs:
+        live.publish_status(ref, processed)
@@ -0,0 +1,144 @@
+"""
+Single-pass validation of uploaded documents.
+
+``ValidatingUploadHandler`` replaces Django's memory/temporary-file handlers
+for the submission form. As the multipart parser hands it each chunk it
+
+* counts bytes and stops the upload as soon as it passes ``max_size``;
+* sniffs the first bytes for a PDF, JPEG or PNG signature, ignoring the
+  client's filename and ``Content-Type``;
+* feeds a SHA-256 digest.
+
+The file is spooled to a ``TemporaryUploadedFile``, which
+``FileSystemStorage`` moves into ``MEDIA_ROOT`` rather than copying, so the
+content is never read a second time. Once a file is rejected the handler
+raises ``StopUpload()``: nothing more is written to disk or hashed, the parser
+reads and discards the rest of the request body, and the reason is left in
+``request.upload_error`` for the form to show. The body has to be drained:
+a server that answers before the client has finished sending makes most
+browsers report a reset connection instead of showing the response.
+"""
+import hashlib
+
+from django.core.files.uploadhandler import StopFutureHandlers, StopUpload, TemporaryFileUploadHandler
+
+
+# (content type, magic bytes at offset 0)
+SIGNATURES = [
+    ('application/pdf', b'%PDF-'),
+    ('image/jpeg', b'\xff\xd8\xff'),
+    ('image/png', b'\x89PNG\r\n\x1a\n'),
+]
+SNIFF_LENGTH = max(len(magic) for _, magic in SIGNATURES)
+
+EXTENSIONS = {
+    'application/pdf': {'.pdf'},
+    'image/jpeg': {'.jpg', '.jpeg'},
+    'image/png': {'.png'},
+}
+
+
+def sniff(head):
+    """Content type for the leading bytes ``head``, or ``None``."""
+    for content_type, magic in SIGNATURES:
+        if head.startswith(magic):
+            return content_type
+    return None
+
+
+class UploadInspector:
+    """Incremental size/type/digest check over a stream of chunks."""
+
+    def __init__(self, max_size):
+        self.max_size = max_size
+        self.size = 0
+        self.head = b''
+        self.detected_type = None
+        self.error = None
+        self._sha256 = hashlib.sha256()
+
+    def feed(self, chunk):
+        """Account for ``chunk``; returns False once the file is rejected."""
+        if self.error:
+            return False
+        self.size += len(chunk)
+        if self.size > self.max_size:
+            self.error = f"File size must be {self.max_size // (1024 * 1024)}MB or less."
+            return False
+        if len(self.head) < SNIFF_LENGTH:
+            self.head += chunk[:SNIFF_LENGTH - len(self.head)]
+            if len(self.head) >= SNIFF_LENGTH:
+                self._check_type()
+                if self.error:
+                    return False
+        self._sha256.update(chunk)
+        return True
+
+    def finish(self):
+        if not self.error and self.detected_type is None:
+            self._check_type()
+        return self.error is None
+
+    def _check_type(self):
+        self.detected_type = sniff(self.head)
+        if self.detected_type is None:
+            self.error = "Unsupported file type. Please upload PDF, JPG, or PNG."
+
+    @property
+    def sha256(self):
+        return self._sha256.hexdigest()
+
+
+def inspect_file(uploaded_file, max_size):
+    """
+    Run an ``UploadInspector`` over a file that did not come through
+    ``ValidatingUploadHandler`` (e.g. admin or test uploads).
+    """
+    inspector = UploadInspector(max_size)
+    for chunk in uploaded_file.chunks():
+        if not inspector.feed(chunk):
+            break
+    inspector.finish()
+    uploaded_file.seek(0)
+    return inspector
+
+
+class ValidatingUploadHandler(TemporaryFileUploadHandler):
+    """
+    Upload handler that validates and hashes while it spools to disk. It must
+    be installed before ``request.POST``/``FILES`` are first read.
+    """
+
+    def __init__(self, request=None, max_size=5 * 1024 * 1024):
+        super().__init__(request)
+        self.max_size = max_size
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.inspector = UploadInspector(self.max_size)
+        # This handler stores the file itself; later handlers get nothing.
+        raise StopFutureHandlers()
+
+    def receive_data_chunk(self, raw_data, start):
+        if not self.inspector.feed(raw_data):
+            if self.request is not None:
+                self.request.upload_error = self.inspector.error
+            # Fields after the file are lost, but the form is shown again
+            # anyway; the temporary file is closed (and removed) by the parser.
+            raise StopUpload()
+        self.file.write(raw_data)
+        # Returning None keeps the chunk from reaching any other handler.
+        return None
+
+    def file_complete(self, file_size):
+        # Only files shorter than a signature can still be rejected here.
+        inspector = self.inspector
+        inspector.finish()
+        if inspector.error:
+            self.file.seek(0)
+            self.file.truncate()
+        uploaded_file = super().file_complete(file_size)
+        uploaded_file.upload_error = inspector.error
+        uploaded_file.detected_type = inspector.detected_type
+        uploaded_file.sha256 = None if inspector.error else inspector.sha256
+        return uploaded_file
@@ -0,0 +1,57 @@
+import calendar
+from datetime import date, datetime, time, timedelta
+
+from django.db.models import Q
+from django.utils import timezone
+
+
+def get_client_ip(request):
+    x_forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
+    if x_forwarded:
+        return x_forwarded.split(',')[0].strip()
+    return request.META.get('REMOTE_ADDR', '0.0.0.0')
+
+
+def local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, time.min), timezone.get_current_timezone())
+
+
+def day_range(day):
+    """Half-open ``[start, end)`` datetimes covering the local ``day``."""
+    return local_midnight(day), local_midnight(day + timedelta(days=1))
+
+
+def calendar_ranges(years, month=None, day=None):
+    """
+    Half-open datetime ranges matching a day/month/year filter in which any
+    part may be missing (e.g. "the 5th of every month" or "every March").
+    Compares the raw column against constants, so the database can use an
+    index instead of evaluating EXTRACT() on every row. Impossible dates
+    such as 30 February are skipped.
+    """
+    if (month is not None and not 1 <= month <= 12) or (day is not None and not 1 <= day <= 31):
+        return []
+    ranges = []
+    for y in years:
+        if not 1 <= y <= 9998:
+            continue
+        if not month and not day:
+            ranges.append((local_midnight(date(y, 1, 1)), local_midnight(date(y + 1, 1, 1))))
+            continue
+        for m in ([month] if month else range(1, 13)):
+            if not day:
+                end = date(y + 1, 1, 1) if m == 12 else date(y, m + 1, 1)
+                ranges.append((local_midnight(date(y, m, 1)), local_midnight(end)))
+            elif day <= calendar.monthrange(y, m)[1]:
+                ranges.append(day_range(date(y, m, day)))
+    return ranges
+
+
+def range_q(field, ranges):
+    """``Q`` matching ``field`` in any of ``ranges``; matches nothing if empty."""
+    if not ranges:
+        return Q(pk__in=[])
+    q = Q()
+    for start, end in ranges:
+        q |= Q(**{f'{field}__gte': start, f'{field}__lt': end})
+    return q
@@ -1,94 +1,93 @@
+import json
 import os
-import mimetypes
-from datetime import date
+from datetime import date, timedelta
 
+from asgiref.sync import sync_to_async
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
 from django.contrib.auth import logout
-from django.contrib.auth.decorators import login_required, user_passes_test
-from django.core.cache import cache
 from django.core.paginator import Paginator
-from django.http import HttpResponse, Http404
+from django.core.handlers.asgi import ASGIRequest
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.conf import settings
-from django.core.mail import send_mail
-from django.db.models import Q
-
+from django.db import transaction
+from django.utils import timezone
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.decorators.http import require_POST
+
+from . import (
+    analytics, audit, audit_archive, bulkdelete, counters, export, live, metrics, previews, trackcache, transitions,
+)
+from .fileserve import serve_file
 from .forms import IFMISResetForm, IFMISRequestMessageForm
-from .models import IFMISResetRequest, IFMISRequestMessage, AuditLog
-
-
-# ── Helpers ──────────────────────────────────────────────────────────────────
-
-def is_ifmis_admin(user):
-    return user.is_authenticated and user.groups.filter(name='IFMIS_ADMIN').exists()
-
+from .models import (
+    REFERENCE_CODE_LENGTH, IFMISResetRequest, IFMISRequestMessage, AuditLog, BulkDeleteJob, TurnaroundRollup,
+)
+from .outbox import queue_email, queue_emails
+from .pagination import KeysetPaginator
+from .ratelimit import rate_limit
+from .roles import has_admin_role, ifmis_admin_required
+from .search import search_requests
+from .uploads import ValidatingUploadHandler
+from .utils import calendar_ranges, day_range, get_client_ip, range_q
 
-def get_client_ip(request):
-    x_forwarded = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded:
-        return x_forwarded.split(',')[0].strip()
-    return request.META.get('REMOTE_ADDR', '0.0.0.0')
 
+DASHBOARD_PAGE_SIZE = 15
 
-def is_rate_limited(ip, limit=5, window=3600):
-    cache_key = f'ifmis_submit_{ip}'
-    count = cache.get(cache_key, 0)
-    if count >= limit:
-        return True
-    cache.set(cache_key, count + 1, timeout=window)
-    return False
 
+# ── Helpers ──────────────────────────────────────────────────────────────────
 
-def log_action(request, action, ref_code=None, detail=''):
-    """Create an immutable AuditLog entry."""
-    AuditLog(
+def log_action(request, action, ref_code=None, detail='', strict=False):
+    """
+    Create an immutable AuditLog entry. Entries are buffered and written in
+    bulk (see core.audit); ``strict`` writes this one immediately.
+    """
+    audit.record(AuditLog(
         admin=request.user if request.user.is_authenticated else None,
         action=action,
         ref_code=ref_code,
         detail=detail,
         ip_address=get_client_ip(request),
-    ).save()
+    ), strict=strict)
 
 
 # ── Email helpers ─────────────────────────────────────────────────────────────
+# Emails are queued in the outbox and delivered by the send_queued_mail worker,
+# so a slow SMTP server never holds up the request.
 
 def send_submission_email(req):
-    try:
-        send_mail(
-            subject='IFMIS Help Desk — Your Password Reset Request Has Been Received',
-            message=(
-                f"Dear {req.full_name},\n\n"
-                f"Your IFMIS password reset request has been received.\n\n"
-                f"Your Reference Code: {req.reference_code}\n\n"
-                f"Track your request at: {settings.SITE_URL}/track/?ref={req.reference_code}\n\n"
-                f"— IFMIS Help Desk, DFMST, Ministry of Finance, Sierra Leone"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[req.email],
-            fail_silently=True,
-        )
-    except Exception:
-        pass
+    queue_email(
+        subject='IFMIS Help Desk — Your Password Reset Request Has Been Received',
+        body=(
+            f"Dear {req.full_name},\n\n"
+            f"Your IFMIS password reset request has been received.\n\n"
+            f"Your Reference Code: {req.reference_code}\n\n"
+            f"Track your request at: {settings.SITE_URL}/track/?ref={req.reference_code}\n\n"
+            f"— IFMIS Help Desk, DFMST, Ministry of Finance, Sierra Leone"
+        ),
+        recipients=[req.email],
+    )
+
+
+def processed_email(req):
+    """``(subject, body, recipient)`` telling the requester it was processed."""
+    return (
+        'IFMIS Help Desk — Your Password Reset Request Has Been Processed',
+        (
+            f"Dear {req.full_name},\n\n"
+            f"Your IFMIS password reset request (Ref: {req.reference_code}) "
+            f"has been processed by the Help Desk.\n\n"
+            f"If you have not received your new password, contact us at:\n"
+            f"📧 ifmis.support@mof.gov.sl  |  📞 +232 31 399 020\n\n"
+            f"— IFMIS Help Desk, DFMST, Ministry of Finance, Sierra Leone"
+        ),
+        req.email,
+    )
 
 
 def send_processed_email(req):
-    try:
-        send_mail(
-            subject='IFMIS Help Desk — Your Password Reset Request Has Been Processed',
-            message=(
-                f"Dear {req.full_name},\n\n"
-                f"Your IFMIS password reset request (Ref: {req.reference_code}) "
-                f"has been processed by the Help Desk.\n\n"
-                f"If you have not received your new password, contact us at:\n"
-                f"📧 ifmis.support@mof.gov.sl  |  📞 +232 31 399 020\n\n"
-                f"— IFMIS Help Desk, DFMST, Ministry of Finance, Sierra Leone"
-            ),
-            from_email=settings.DEFAULT_FROM_EMAIL,
-            recipient_list=[req.email],
-            fail_silently=True,
-        )
-    except Exception:
-        pass
+    subject, body, recipient = processed_email(req)
+    queue_email(subject=subject, body=body, recipients=[recipient])
 
 
 # ── Logout ────────────────────────────────────────────────────────────────────
@@ -102,32 +101,50 @@ def staff_logout(request):
 
 # ── PUBLIC: Submit Request ────────────────────────────────────────────────────
 
+def submission_rate_limited(request):
+    # Rendered by RateLimitMiddleware before the upload body is parsed.
+    return render(request, 'upload.html', {
+        'form': IFMISResetForm(),
+        'reference_code': None,
+        'rate_limited': True,
+    }, status=429)
+
+
+@rate_limit('submit', on_limit=submission_rate_limited)
+@csrf_exempt
 def upload_request(request):
+    # The streaming handler has to be in place before anything (including
+    # the CSRF check) reads request.POST, hence the exempt/protect split.
+    request.upload_handlers = [
+        ValidatingUploadHandler(request, max_size=IFMISResetForm.MAX_UPLOAD_SIZE)
+    ]
+    return _upload_request(request)
+
+
+@csrf_protect
+def _upload_request(request):
     reference_code = None
     form = IFMISResetForm()
-    rate_limited = False
 
     if request.method == 'POST':
-        ip = get_client_ip(request)
-        if is_rate_limited(ip):
-            rate_limited = True
-        else:
-            form = IFMISResetForm(request.POST, request.FILES)
-            if form.is_valid():
-                new_request = form.save()
-                reference_code = new_request.reference_code
-                form = IFMISResetForm()
-                send_submission_email(new_request)
+        # Reading request.POST runs the upload handler, which may set upload_error.
+        form = IFMISResetForm(request.POST, request.FILES, upload_error=getattr(request, 'upload_error', None))
+        if form.is_valid():
+            new_request = form.save()
+            reference_code = new_request.reference_code
+            form = IFMISResetForm()
+            send_submission_email(new_request)
 
     return render(request, 'upload.html', {
         'form': form,
         'reference_code': reference_code,
-        'rate_limited': rate_limited,
+        'rate_limited': False,
     })
 
 
 # ── PUBLIC: Track Request ─────────────────────────────────────────────────────
 
+@rate_limit('track')
 def track_request(request):
     request_obj = None
     chat_messages = []
@@ -135,6 +152,13 @@ def track_request(request):
     form = None
     ref_code = request.GET.get('ref', '').strip().upper()
 
+    # Unchanged requests are answered from the per-reference page cache.
+    cache_version = None
+    if request.method == 'GET' and ref_code:
+        cached, cache_version = trackcache.cached_response(request, ref_code)
+        if cached is not None:
+            return cached
+
     if ref_code:
         try:
             request_obj = IFMISResetRequest.objects.get(reference_code=ref_code)
@@ -143,6 +167,13 @@ def track_request(request):
         except IFMISResetRequest.DoesNotExist:
             error = f'No request found with reference code "{ref_code}". Please check and try again.'
 
+    if request.method == 'GET' and request_obj is not None and cache_version is None:
+        # First visit since the entry expired. The version is read before the
+        # row everywhere else, so reread it: a change committed in between
+        # must not be cached under this version.
+        cache_version = trackcache.get_version(ref_code)
+        request_obj.refresh_from_db()
+
     if request.method == 'POST':
         ref_code = request.POST.get('ref_code', '').strip().upper()
         try:
@@ -158,22 +189,63 @@ def track_request(request):
         except IFMISResetRequest.DoesNotExist:
             error = f'No request found with reference code "{ref_code}".'
 
-    return render(request, 'track_request.html', {
+    context = {
         'request_obj': request_obj,
         'chat_messages': chat_messages,
         'form': form,
         'ref_code': ref_code,
         'error': error,
+    }
+    if cache_version is not None and request_obj is not None:
+        return trackcache.render_and_store(request, ref_code, cache_version, 'track_request.html', context)
+    return render(request, 'track_request.html', context)
+
+
+# ── PUBLIC/ADMIN: Live conversation updates ───────────────────────────────────
+# Knowing the reference code is what grants access, as on the track page.
+
+def _message_cursor(value):
+    return int(value) if value and value.isdigit() else 0
+
+
+async def live_events(request, ref_code):
+    """Server-Sent Events stream of new messages and status changes."""
+    req = await IFMISResetRequest.objects.filter(
+        reference_code=ref_code.upper()
+    ).only('pk', 'reference_code', 'processed').afirst()
+    if req is None:
+        raise Http404("Request not found.")
+
+    after = _message_cursor(request.headers.get('Last-Event-ID') or request.GET.get('after'))
+    if isinstance(request, ASGIRequest):
+        stream = live.event_stream(req.pk, req.reference_code, req.processed, after)
+    else:
+        # A WSGI worker cannot park on a stream: send the catch-up and let the
+        # client reconnect after the polling interval.
+        stream = await sync_to_async(lambda: list(live.snapshot_events(req.pk, req.processed, after)))()
+
+    response = StreamingHttpResponse(stream, content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
+def live_poll(request, ref_code):
+    """Polling fallback: messages newer than ``?after=<message id>``."""
+    req = IFMISResetRequest.objects.filter(reference_code=ref_code.upper()).only('pk', 'processed').first()
+    if req is None:
+        raise Http404("Request not found.")
+    after = _message_cursor(request.GET.get('after'))
+    new = live.new_messages(req.pk, after)
+    return JsonResponse({
+        'processed': req.processed,
+        'messages': new,
+        'cursor': new[-1]['id'] if new else after,
     })
 
 
 # ── #2: Protected file serving ────────────────────────────────────────────────
 
-import os
-import mimetypes
-from django.conf import settings
-from django.http import Http404, HttpResponse
-
 def serve_uploaded_file(request, filename):
     # Always load from media/uploads/
     file_path = os.path.join(settings.MEDIA_ROOT, "uploads", filename)
@@ -182,7 +254,7 @@ def serve_uploaded_file(request, filename):
         raise Http404("File not found.")
 
     # 🔐 Permission logic
-    if not is_ifmis_admin(request.user):
+    if not has_admin_role(request):
         ref_code = request.GET.get('ref', '').strip().upper()
         if not ref_code:
             raise Http404("Access denied.")
@@ -193,26 +265,41 @@ def serve_uploaded_file(request, filename):
         except IFMISResetRequest.DoesNotExist:
             raise Http404("Access denied.")
 
-    # 📦 Serve file
-    content_type, _ = mimetypes.guess_type(file_path)
-    content_type = content_type or 'application/octet-stream'
-
-    with open(file_path, 'rb') as f:
-        response = HttpResponse(f.read(), content_type=content_type)
-
+    # 📦 Stream file (conditional GET, byte ranges, optional web-server offload)
     # 👀 or ⬇ switch
-    if request.GET.get("download") == "1":
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    else:
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-
+    return serve_file(
+        request,
+        file_path,
+        filename,
+        as_attachment=request.GET.get("download") == "1",
+        internal_url=f"{settings.PROTECTED_MEDIA_INTERNAL_URL}uploads/{filename}",
+    )
+
+
+@ifmis_admin_required
+def serve_upload_preview(request, filename):
+    upload_name = f"uploads/{filename}"
+    path = previews.cached_preview(upload_name)
+    if path is None:
+        # Rendered off the request path; the page shows the plain link meanwhile.
+        if os.path.exists(os.path.join(settings.MEDIA_ROOT, upload_name)):
+            previews.schedule(upload_name)
+        raise Http404("Preview not available.")
+
+    response = serve_file(request, path, previews.preview_name(upload_name))
+    # Upload names are content hashes, so a preview never changes.
+    response['Cache-Control'] = 'private, max-age=86400'
     return response
+
+
 # ── ADMIN: Dashboard ──────────────────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
-def dashboard_requests(request):
-    qs = IFMISResetRequest.objects.all().order_by('-submitted_at')
+def filter_requests(request):
+    """
+    Apply the dashboard's ``q``/``day``/``month``/``year`` filters. Returns
+    the queryset and the cleaned filter values.
+    """
+    qs = IFMISResetRequest.objects.all()
 
     search = request.GET.get('q', '').strip()
     day    = request.GET.get('day', '').strip()
@@ -220,32 +307,55 @@ def dashboard_requests(request):
     year   = request.GET.get('year', '').strip()
 
     if search:
-        qs = qs.filter(
-            Q(full_name__icontains=search) |
-            Q(department__icontains=search) |
-            Q(email__icontains=search) |
-            Q(reference_code__icontains=search)
-        )
-    if day.isdigit():
-        qs = qs.filter(submitted_at__day=int(day))
-    if month.isdigit():
-        qs = qs.filter(submitted_at__month=int(month))
-    if year.isdigit():
-        qs = qs.filter(submitted_at__year=int(year))
+        qs = search_requests(qs, search)
+
+    # Turn day/month/year into half-open submitted_at ranges so the index on
+    # submitted_at is used; a missing year means every year with requests.
+    day_n = int(day) if day.isdigit() else None
+    month_n = int(month) if month.isdigit() else None
+    year_n = int(year) if year.isdigit() else None
+    if day_n is not None or month_n is not None or year_n is not None:
+        if year_n is not None:
+            years = [year_n]
+        else:
+            first = IFMISResetRequest.objects.order_by('submitted_at').values_list('submitted_at', flat=True).first()
+            years = range(timezone.localtime(first).year, timezone.localdate().year + 1) if first else []
+        qs = qs.filter(range_q('submitted_at', calendar_ranges(years, month_n, day_n)))
+    return qs, search, day, month, year
+
+
+def wants_fragment(request):
+    """Requests from the dashboard's fetch() calls want a partial response."""
+    return request.headers.get('X-Requested-With') == 'XMLHttpRequest'
 
-    today = date.today()
-    for req in qs:
-        req.days_open = (today - req.submitted_at.date()).days
 
-    paginator = Paginator(qs, 15)
-    page_number = request.GET.get('page', 1)
-    page_obj = paginator.get_page(page_number)
+def dashboard_page(request):
+    """The filtered page of requests and the table/pager template context."""
+    qs, search, day, month, year = filter_requests(request)
 
     query_params = request.GET.copy()
     query_params.pop('page', None)
+    query_params.pop('cursor', None)
     filter_qs = query_params.urlencode()
 
-    return render(request, 'staff/dashboard_requests.html', {
+    # Keyset mode seeks on (submitted_at, id) so deep pages cost the same as
+    # page 1 and no COUNT(*) is issued; numbered mode keeps the classic pager.
+    cursor_mode = 'cursor' in request.GET or settings.DASHBOARD_KEYSET_PAGINATION
+    if cursor_mode:
+        page_obj = KeysetPaginator(qs, DASHBOARD_PAGE_SIZE).get_page(request.GET.get('cursor'))
+    else:
+        # Searches come back ranked best-first; otherwise newest first.
+        if not search:
+            qs = qs.order_by('-submitted_at', '-id')
+        paginator = Paginator(qs, DASHBOARD_PAGE_SIZE)
+        page_obj = paginator.get_page(request.GET.get('page', 1))
+
+    # Only the rows on this page are ever materialised.
+    today = date.today()
+    for req in page_obj:
+        req.days_open = (today - req.submitted_at.date()).days
+
+    return {
         'requests': page_obj,
         'page_obj': page_obj,
         'search': search,
@@ -253,14 +363,109 @@ def dashboard_requests(request):
         'month': month,
         'year': year,
         'filter_qs': filter_qs,
-        'total_count': IFMISResetRequest.objects.count(),
+        'cursor_mode': cursor_mode,
+    }
+
+
+@ifmis_admin_required
+def dashboard_requests(request):
+    return render(request, 'staff/dashboard_requests.html', {
+        **dashboard_page(request),
+        'active_jobs': BulkDeleteJob.objects.filter(
+            status__in=[BulkDeleteJob.STATUS_PENDING, BulkDeleteJob.STATUS_RUNNING],
+            purge_before__isnull=True,
+        ).only('pk', 'status', 'request_ids', 'position'),
+        'kpis': counters.kpis(),
     })
 
 
+@ifmis_admin_required
+def dashboard_fragment(request):
+    """
+    Just the table rows and pager for the dashboard's filters and page or
+    cursor: an HTML fragment for the dashboard script, or JSON with
+    ``format=json``. Skips the KPIs, filter form and page chrome.
+    """
+    context = dashboard_page(request)
+    if request.GET.get('format') != 'json':
+        return render(request, 'staff/dashboard_fragment.html', context)
+
+    page_obj = context['page_obj']
+    payload = {
+        'results': [
+            {
+                'id': req.pk,
+                'reference_code': req.reference_code,
+                'full_name': req.full_name,
+                'department': req.department,
+                'email': req.email,
+                'submitted_at': req.submitted_at.isoformat(),
+                'processed': req.processed,
+                'days_open': req.days_open,
+            }
+            for req in page_obj
+        ],
+    }
+    if context['cursor_mode']:
+        payload['next_cursor'] = page_obj.next_cursor
+        payload['previous_cursor'] = page_obj.previous_cursor
+    else:
+        payload['page'] = page_obj.number
+        payload['num_pages'] = page_obj.paginator.num_pages
+        payload['count'] = page_obj.paginator.count
+    return JsonResponse(payload)
+
+
+def render_dashboard_row(request, req):
+    """One refreshed dashboard row, keeping the row number the page sent."""
+    req.days_open = (date.today() - req.submitted_at.date()).days
+    row_number = request.GET.get('n', '')
+    return with_kpis(render(request, 'staff/dashboard_row.html', {
+        'req': req,
+        'row_number': row_number if row_number.isdigit() else '',
+    }))
+
+
+def with_kpis(response):
+    """
+    Attach the current KPI counts to a row action's response, so the
+    dashboard shows what the server holds rather than guessing from the row
+    (which may not have changed at all, or changed in another tab).
+    """
+    response['X-Dashboard-KPIs'] = json.dumps(counters.kpis())
+    return response
+
+
+# ── ADMIN: Export ─────────────────────────────────────────────────────────────
+
+@ifmis_admin_required
+def export_requests(request):
+    fmt = request.GET.get('format', 'csv').lower()
+    if fmt not in ('csv', 'xlsx'):
+        raise Http404("Unknown export format.")
+
+    qs, search, day, month, year = filter_requests(request)
+    if not search:
+        qs = qs.order_by('-submitted_at', '-id')
+    filters = {k: v for k, v in (('q', search), ('day', day), ('month', month), ('year', year)) if v}
+    log_action(
+        request,
+        AuditLog.ACTION_EXPORT,
+        detail=f"Exported requests as {fmt.upper()} (filters: {filters or 'none'})",
+    )
+
+    rows = export.export_rows(qs)
+    if fmt == 'xlsx':
+        response = StreamingHttpResponse(export.stream_xlsx(rows), content_type=export.XLSX_CONTENT_TYPE)
+    else:
+        response = StreamingHttpResponse(export.stream_csv(rows), content_type=export.CSV_CONTENT_TYPE)
+    response['Content-Disposition'] = f'attachment; filename="ifmis-requests-{date.today():%Y%m%d}.{fmt}"'
+    return response
+
+
 # ── ADMIN: Delete single request ──────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
+@ifmis_admin_required
 def delete_request(request, pk):
     req = get_object_or_404(IFMISResetRequest, pk=pk)
     if request.method == 'POST':
@@ -274,6 +479,9 @@ def delete_request(request, pk):
         )
         req.uploaded_file.delete(save=False)  # remove file from disk
         req.delete()
+        if wants_fragment(request):
+            # The dashboard removes the row itself.
+            return with_kpis(HttpResponse(status=204))
         messages.success(request, f"Request {ref} ({name}) has been permanently deleted.")
         return redirect('dashboard_requests')
     # GET — show confirmation page
@@ -282,53 +490,97 @@ def delete_request(request, pk):
 
 # ── ADMIN: Bulk delete ────────────────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
+@ifmis_admin_required
 def bulk_delete_requests(request):
     if request.method == 'POST':
-        pks = request.POST.getlist('selected_ids')
+        pks = [pk for pk in request.POST.getlist('selected_ids') if pk.isdigit()]
         if not pks:
             messages.error(request, "No requests were selected.")
             return redirect('dashboard_requests')
 
-        reqs = IFMISResetRequest.objects.filter(pk__in=pks)
-        count = reqs.count()
-        refs = ', '.join(r.reference_code for r in reqs)
-
-        # Delete files from disk first
-        for r in reqs:
-            if r.uploaded_file:
-                r.uploaded_file.delete(save=False)
-
+        # One snapshot of the selection, which both the job and the audit
+        # entry use; rows, messages and files are then removed in chunks by
+        # a background job the dashboard can poll.
+        selected = sorted(IFMISResetRequest.objects.filter(pk__in=pks).values_list('pk', 'reference_code'))
+        job = bulkdelete.create_job(request.user, [pk for pk, _ in selected])
+        refs = ', '.join(ref for _, ref in selected)
         log_action(
             request,
             AuditLog.ACTION_BULK_DELETE,
-            detail=f"Bulk deleted {count} request(s): {refs}"
+            detail=f"Bulk deleted {job.total} request(s): {refs}"
         )
-        reqs.delete()
-        messages.success(request, f"{count} request(s) permanently deleted.")
+        bulkdelete.start_job(job)
+        messages.success(request, f"Deleting {job.total} request(s) in the background.")
+    return redirect('dashboard_requests')
+
+
+@ifmis_admin_required
+def bulk_delete_status(request, job_id):
+    job = get_object_or_404(BulkDeleteJob, pk=job_id)
+    return JsonResponse({
+        'id': job.pk,
+        'status': job.status,
+        'total': job.total,
+        'deleted': job.deleted,
+        'processed': job.position,
+        'files_removed': job.files_removed,
+        'bytes_removed': job.bytes_removed,
+        'error': job.error,
+    })
+
+
+# ── ADMIN: Bulk status change ─────────────────────────────────────────────────
+
+@ifmis_admin_required
+def bulk_status_requests(request):
+    if request.method == 'POST':
+        pks = [pk for pk in request.POST.getlist('selected_ids') if pk.isdigit()]
+        status = request.POST.get('status')
+        if not pks:
+            messages.error(request, "No requests were selected.")
+            return redirect('dashboard_requests')
+        if status not in ('processed', 'pending'):
+            messages.error(request, "Unknown status.")
+            return redirect('dashboard_requests')
+
+        processed = status == 'processed'
+        # One UPDATE for the whole selection; rows already in the target
+        # state are left alone and get no audit entry or email.
+        with transaction.atomic():
+            changed = transitions.set_status(pks, processed, request.user, get_client_ip(request))
+            if processed:
+                queue_emails([processed_email(req) for req in changed])
+        unchanged = len(set(pks)) - len(changed)
+        summary = f"Marked {len(changed)} request(s) as {status}."
+        if unchanged:
+            summary += f" {unchanged} already were, or no longer exist."
+        messages.success(request, summary)
     return redirect('dashboard_requests')
 
 
 # ── ADMIN: Mark as Processed ──────────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
+@ifmis_admin_required
+@require_POST
 def process_request(request, pk):
     req = get_object_or_404(IFMISResetRequest, pk=pk)
-    req.processed = True
-    req.save()
-    log_action(request, AuditLog.ACTION_MARK_PROCESSED, ref_code=req.reference_code,
-               detail=f"Marked {req.full_name}'s request as processed")
-    messages.success(request, f"{req.full_name}'s request has been marked as processed.")
-    send_processed_email(req)
+    changed = req.mark_processed(request.user)
+    if changed:
+        log_action(request, AuditLog.ACTION_MARK_PROCESSED, ref_code=req.reference_code,
+                   detail=f"Marked {req.full_name}'s request as processed")
+        send_processed_email(req)
+    if wants_fragment(request):
+        return render_dashboard_row(request, req)
+    if changed:
+        messages.success(request, f"{req.full_name}'s request has been marked as processed.")
+    else:
+        messages.info(request, f"{req.full_name}'s request was already processed.")
     return redirect('dashboard_requests')
 
 
 # ── ADMIN: Request Detail ─────────────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
+@ifmis_admin_required
 def admin_request_detail(request, ref_code):
     request_obj = get_object_or_404(IFMISResetRequest, reference_code=ref_code)
     form = IFMISRequestMessageForm()
@@ -352,20 +604,22 @@ def admin_request_detail(request, ref_code):
                 return redirect('admin_request_detail', ref_code=ref_code)
 
         elif action == 'mark_processed':
-            request_obj.processed = True
-            request_obj.save()
-            log_action(request, AuditLog.ACTION_MARK_PROCESSED, ref_code=ref_code,
-                       detail=f"Marked {request_obj.full_name}'s request as processed")
-            messages.success(request, f"{request_obj.full_name}'s request marked as processed.")
-            send_processed_email(request_obj)
+            if request_obj.mark_processed(request.user):
+                log_action(request, AuditLog.ACTION_MARK_PROCESSED, ref_code=ref_code,
+                           detail=f"Marked {request_obj.full_name}'s request as processed")
+                messages.success(request, f"{request_obj.full_name}'s request marked as processed.")
+                send_processed_email(request_obj)
+            else:
+                messages.info(request, f"{request_obj.full_name}'s request was already processed.")
             return redirect('dashboard_requests')
 
         elif action == 'mark_pending':
-            request_obj.processed = False
-            request_obj.save()
-            log_action(request, AuditLog.ACTION_MARK_PENDING, ref_code=ref_code,
-                       detail=f"Reverted {request_obj.full_name}'s request to pending")
-            messages.success(request, f"{request_obj.full_name}'s request reverted to pending.")
+            if request_obj.mark_pending():
+                log_action(request, AuditLog.ACTION_MARK_PENDING, ref_code=ref_code,
+                           detail=f"Reverted {request_obj.full_name}'s request to pending")
+                messages.success(request, f"{request_obj.full_name}'s request reverted to pending.")
+            else:
+                messages.info(request, f"{request_obj.full_name}'s request was already pending.")
             return redirect('admin_request_detail', ref_code=ref_code)
 
         elif action == 'delete':
@@ -389,8 +643,7 @@ def admin_request_detail(request, ref_code):
 
 # ── ADMIN: Audit Log ──────────────────────────────────────────────────────────
 
-@login_required(login_url='/staff/login/')
-@user_passes_test(is_ifmis_admin, login_url='/staff/login/')
+@ifmis_admin_required
 def audit_log_view(request):
     qs = AuditLog.objects.select_related('admin').all()
 
@@ -399,21 +652,34 @@ def audit_log_view(request):
     action_filter = request.GET.get('action', '').strip()
     ref_filter    = request.GET.get('ref', '').strip().upper()
     date_filter   = request.GET.get('date', '').strip()
+    source        = 'archive' if request.GET.get('source') == 'archive' else 'live'
 
-    if admin_filter:
-        qs = qs.filter(admin__username__icontains=admin_filter)
-    if action_filter:
-        qs = qs.filter(action=action_filter)
-    if ref_filter:
-        qs = qs.filter(ref_code__icontains=ref_filter)
+    day = None
     if date_filter:
         try:
             from datetime import datetime
-            d = datetime.strptime(date_filter, '%Y-%m-%d').date()
-            qs = qs.filter(timestamp__date=d)
+            day = datetime.strptime(date_filter, '%Y-%m-%d').date()
         except ValueError:
             pass
 
+    if source == 'archive':
+        # Archived segments are only read when explicitly asked for.
+        qs = audit_archive.search(admin=admin_filter, action=action_filter, ref=ref_filter, date=day)
+    else:
+        if admin_filter:
+            qs = qs.filter(admin__username__icontains=admin_filter)
+        if action_filter:
+            qs = qs.filter(action=action_filter)
+        if ref_filter:
+            if len(ref_filter) == REFERENCE_CODE_LENGTH:
+                # A full code: exact, so core_audit_ref_ts_idx serves it.
+                qs = qs.filter(ref_code=ref_filter)
+            else:
+                qs = qs.filter(ref_code__istartswith=ref_filter)
+        if day:
+            start, end = day_range(day)
+            qs = qs.filter(timestamp__gte=start, timestamp__lt=end)
+
     paginator = Paginator(qs, 25)
     page_obj = paginator.get_page(request.GET.get('page', 1))
 
@@ -428,6 +694,48 @@ def audit_log_view(request):
         'action_filter': action_filter,
         'ref_filter': ref_filter,
         'date_filter': date_filter,
+        'source': source,
         'filter_qs': query_params.urlencode(),
         'total_count': AuditLog.objects.count(),
-    })
\ No newline at end of file
+        'archived_count': audit_archive.archived_count(),
+    })
+
+
+# ── ADMIN: Metrics ────────────────────────────────────────────────────────────
+
+@ifmis_admin_required
+def metrics_view(request):
+    # Prometheus text exposition format, summed over every worker process.
+    if not settings.METRICS_ENABLED:
+        raise Http404("Metrics are disabled.")
+    return HttpResponse(metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+
+# ── ADMIN: Turnaround analytics ───────────────────────────────────────────────
+
+ANALYTICS_PERIODS = (7, 30, 90, 365)
+
+
+@ifmis_admin_required
+def analytics_view(request):
+    period = request.GET.get('days', '30')
+    days = int(period) if period.isdigit() and int(period) in ANALYTICS_PERIODS else 30
+    end = date.today()
+    start = end - timedelta(days=days - 1)
+
+    # Reads only the nightly rollups, never the requests table.
+    summary = analytics.summary(start, end)
+    for rows in summary.values():
+        for row in rows:
+            for q in ('p50', 'p90', 'p99'):
+                row[f'{q}_display'] = analytics.format_duration(row[q])
+
+    return render(request, 'staff/analytics.html', {
+        'days': days,
+        'periods': ANALYTICS_PERIODS,
+        'start': start,
+        'end': end,
+        'departments': summary[TurnaroundRollup.DIMENSION_DEPARTMENT],
+        'admins': summary[TurnaroundRollup.DIMENSION_ADMIN],
+        'last_rollup': TurnaroundRollup.objects.order_by('-day').values_list('day', flat=True).first(),
+    })